@@ -9,79 +9,401 @@
 from safeGPIO import safeGPIO as GPIO
 import time
 
+# Imported by the first numpy_buffer driver, so that other drivers start quickly without it (sudo pip install numpy)
+numpy = None
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Data levels of each byte value, MSB first (indexed by byte value)
+BYTE_BITS = tuple(tuple((b >> (7 - i)) & 1 for i in range(8)) for b in range(256))
+
+# Checksum contribution of each colour byte, format "1 1 B7 B6 G7 G6 R7 R6" (OR the three together with 0xC0)
+CHECKSUM_R = tuple((v >> 6 & 3)      for v in range(256))
+CHECKSUM_G = tuple((v >> 6 & 3) << 2 for v in range(256))
+CHECKSUM_B = tuple((v >> 6 & 3) << 4 for v in range(256))
+
+# Default hardware SPI clock speed in Hz
+SPI_SPEED_HZ = 4000000
+
+# Temporal dithering cycles through this many lookup tables, in an order that spreads the raised frames out
+DITHER_PHASES = 8
+DITHER_ORDER  = (0, 4, 2, 6, 1, 5, 3, 7)
+
 #########################################################################
 #  CLASSES
 #########################################################################
 
+class SPITransport:
+	''' Send whole P9813 frames through the hardware SPI peripheral using spidev. Wire CLK to SCLK and DATA to MOSI. '''
+
+	def __init__(self, bus = 0, device = 0, speed_hz = SPI_SPEED_HZ, spi = None):
+		# Open the SPI device unless one was supplied (any object with writebytes2 or xfer3, such as a fake for testing)
+		if (spi is None):
+			import spidev                 #sudo pip install spidev
+			spi = spidev.SpiDev()
+			spi.open(bus, device)
+
+		# Clock is idle high and data latches on the rising edge (SPI mode 3)
+		spi.mode         = 3
+		spi.max_speed_hz = speed_hz
+		self.spi         = spi
+
+		# writebytes2 takes the frame as-is and splits large frames, xfer3 is the fallback for older spidev
+		if (hasattr(spi, 'writebytes2')): self._send = spi.writebytes2
+		else                            : self._send = spi.xfer3
+
+	def send(self, frame):
+		''' Send a frame (bytes) in a single call '''
+		self._send(frame)
+
+	def close(self):
+		''' Close the SPI device '''
+		self.spi.close()
+
 class P9813:
 
-	def __init__(self, pin_clk, pin_data, num_leds = 1, sleepEnabled = False):
+	def __init__(self, pin_clk, pin_data, num_leds = 1, sleepEnabled = False, transport = None, numpy_buffer = False, gpio_backend = None, gamma = 1.0, brightness = 255, dither = False):
 		self.pin_clk      = pin_clk
 		self.pin_data     = pin_data
 		self.num_leds     = num_leds
 		self.sleepEnabled = sleepEnabled
+		self.transport    = transport
+		self.numpy_buffer = numpy_buffer
+		self.gpio         = None
+		self.gamma        = None
+		self.brightness   = None
+		self.dither       = None
 
 		# Enforce boolean
 		if (self.sleepEnabled != True):
 			self.sleepEnabled = False
+		if (self.numpy_buffer != True):
+			self.numpy_buffer = False
+
+		# The (num_leds, 3) buffer needs numpy
+		if (self.numpy_buffer):
+			_import_numpy()
 
-		# Configure the port pins
-		self.gpio = GPIO()
+		# Build the colour lookup tables
+		self.set_color_correction(gamma, brightness, dither)
+
+		# A transport (such as SPITransport) sends whole frames, so the port pins are not used
+		if (self.transport is not None):
+			self.reset()
+			return
+
+		# Otherwise bit-bang the port pins (on the configured safeGPIO backend unless another backend, or backend name, is given)
+		self.gpio = GPIO(gpio_backend)
 		self.gpio.setmode(GPIO.BOARD)
 		self.gpio.setwarnings(False)
-		self.gpio.setup(self.pin_clk , GPIO.OUT)
-		self.gpio.setup(self.pin_data, GPIO.OUT)
-		self.gpio.output(self.pin_clk , 1)
-		self.gpio.output(self.pin_data, 1)
+
+		# Claim both pins in one call, starting idle high
+		self.gpio.claim([self.pin_clk, self.pin_data], GPIO.OUT, initial = 1)
+
+		# Build the frame encoder tables for these pins
+		self._build_byte_ops()
 
 		# Reset all LEDs and create space for the data
 		self.reset()
 
 	def __del__(self):
-		self.gpio.cleanup()
+		if (self.gpio is not None):
+			self.gpio.cleanup()
+		if (self.transport is not None):
+			self.transport.close()
 
 	def __setitem__(self, index, val):
+		# A numpy buffer takes an led index or slice, and a colour or an array of colours
+		if (self.numpy_buffer):
+			self._set_array(index, val)
+			return
+
+		if (isinstance(index, slice)):
+			raise TypeError("Led slices need numpy_buffer, set the leds one at a time or use load()")
+
+		# Count a negative index from the end, so the dirty mark covers it
+		if (index < 0):
+			index += self.num_leds
+		if ((index < 0) or (index >= self.num_leds)):
+			raise IndexError("Led index out of range")
+
 		offset = index * 3
 		for i in range(3):
-			self.buf[offset + i] = val[i]
+			if (self.buf[offset + i] != val[i]):
+				self.buf[offset + i] = val[i]
+
+				# Keep track of the highest led that needs to be sent
+				if (index > self.dirty):
+					self.dirty = index
 
 	def __getitem__(self, index):
+		if (self.numpy_buffer):
+			if (isinstance(index, slice)): return self.buf[index].copy()
+			else                         : return tuple(int(c) for c in self.buf[index])
+
+		if (isinstance(index, slice)):
+			raise TypeError("Led slices need numpy_buffer, read the leds one at a time")
+
 		offset = index * 3
 		return tuple(self.buf[offset + i] for i in range(3))
 
 	def fill(self, color):
+		# One array operation for a numpy buffer
+		if (self.numpy_buffer):
+			self._set_array(slice(None), color)
+			return
+
 		for i in range(self.num_leds):
 			self[i] = color
 
+	def load(self, data, start = 0):
+		''' Load consecutive R, G, B bytes into the leds from start onwards, from any buffer-protocol object (bytes, bytearray, array, numpy array) '''
+
+		if (self.numpy_buffer):
+			colors = numpy.frombuffer(data, numpy.uint8)
+			self._check_load(start, colors.size)
+			colors = colors.reshape(-1, 3)
+			self._set_array(slice(start, start + len(colors)), colors)
+			return
+
+		colors = bytearray(data)
+		self._check_load(start, len(colors))
+		offset = start * 3
+		end    = offset + len(colors)
+
+		# Find the highest led that changed by scanning back from the end
+		for i in range(len(colors) // 3 - 1, -1, -1):
+			if (self.buf[offset + i * 3 : offset + i * 3 + 3] != colors[i * 3 : i * 3 + 3]):
+				self.buf[offset:end] = colors
+				if (start + i > self.dirty):
+					self.dirty = start + i
+				break
+
+	def _check_load(self, start, size):
+		''' Refuse data that is not whole leds, or would not fit in the leds from start onwards (rather than growing the chain) '''
+		if (size % 3 != 0):
+			raise ValueError("Loading " + str(size) + " bytes, which is not a whole number of R, G, B leds")
+		if ((start < 0) or (start * 3 + size > self.num_leds * 3)):
+			raise ValueError("Loading " + str(size) + " bytes at led " + str(start) + " does not fit in " + str(self.num_leds) + " leds")
+
+	def set_color_correction(self, gamma = None, brightness = None, dither = None):
+		''' Set the gamma (a number, or one per channel R, G, B), brightness (0 - 255, or one per channel) and temporal dithering applied to the colours sent.
+		    The lookup tables are only rebuilt if a setting changed (None keeps the current one). '''
+
+		if (gamma      is None): gamma      = self.gamma
+		if (brightness is None): brightness = self.brightness
+		if (dither     is None): dither     = self.dither
+
+		# One value per channel
+		if (not isinstance(gamma     , (tuple, list))): gamma      = (gamma, gamma, gamma)
+		if (not isinstance(brightness, (tuple, list))): brightness = (brightness, brightness, brightness)
+		gamma      = tuple(float(g) for g in gamma)
+		brightness = tuple(int(b)   for b in brightness)
+		dither     = (dither == True)
+
+		if ((gamma == self.gamma) and (brightness == self.brightness) and (dither == self.dither)):
+			return
+
+		self.gamma      = gamma
+		self.brightness = brightness
+		self.dither     = dither
+		self._build_color_lut()
+
+		# Every led needs sending through the new tables
+		if (hasattr(self, 'buf')):
+			self.dirty = self.num_leds - 1
+
 	def reset(self):
-		# Allocate space for LED data
-		self.buf = bytearray(self.num_leds * 3)
+		# Allocate space for LED data, nothing is dirty
+		if (self.numpy_buffer): self.buf = numpy.zeros((self.num_leds, 3), numpy.uint8)
+		else                  : self.buf = bytearray(self.num_leds * 3)
+		self.dirty = -1
 
-		# Begin data frame 4 bytes
-		self._frame()
+		# Send the blank buffer (checksum 0xC0 and zero colour for each led)
+		self.write(force = True)
 
-		# 4 bytes for each led (checksum, blue, green, red)
-		for i in range(self.num_leds):
-			self._write_byte(0xC0)
-			for i in range(3):
-				self._write_byte(0)
+	def write(self, force = False):
+		''' Send leds 0 through the highest changed led (downstream leds keep their latched colour). Skipped if nothing changed, unless force resends the whole chain.
+		    While dithering every write sends the whole chain with the next dither phase. '''
 
-		# End data frame 4 bytes
-		self._frame()
+		if ((force) or (self.dither)):
+			num_leds = self.num_leds
+		else:
+			num_leds = self.dirty + 1
+			if (num_leds == 0):
+				return
+		self.dirty = -1
+
+		# Send the whole frame in one call through the transport
+		if (self.transport is not None): self.transport.send(self.frame_bytes(num_leds))
+		# Otherwise compile the whole frame and replay it on the pins
+		else                           : self._transmit(self.encode(num_leds))
+
+		# Move on to the next dither phase
+		self._color_phase = (self._color_phase + 1) % len(self._color_lut)
+
+	def frame_bytes(self, num_leds = None):
+		''' Build the whole frame as bytes: 4 zero bytes, 4 bytes for each of the first num_leds leds (checksum, blue, green, red) and 4 zero bytes '''
+
+		if (num_leds is None):
+			num_leds = self.num_leds
+
+		buf = self._corrected(num_leds)
+
+		# Checksums for the whole chain in one vectorized pass
+		if (self.numpy_buffer):
+			frame = numpy.zeros((num_leds + 2, 4), numpy.uint8)
+			frame[1:-1, 0] = 0xC0 | ((buf[:, 2] >> 6) << 4) | ((buf[:, 1] >> 6) << 2) | (buf[:, 0] >> 6)
+			frame[1:-1, 1] = buf[:, 2]
+			frame[1:-1, 2] = buf[:, 1]
+			frame[1:-1, 3] = buf[:, 0]
+			return frame.tobytes()
+
+		end   = 4 + num_leds * 4
+		frame = bytearray(end + 4)
+
+		# Colours are stored R, G, B but sent B, G, R after the checksum
+		frame[4:end:4] = bytearray(0xC0 | CHECKSUM_B[b] | CHECKSUM_G[g] | CHECKSUM_R[r] for r, g, b in zip(buf[0::3], buf[1::3], buf[2::3]))
+		frame[5:end:4] = buf[2::3]
+		frame[6:end:4] = buf[1::3]
+		frame[7:end:4] = buf[0::3]
+
+		return bytes(frame)
+
+	def write_legacy(self):
+		''' Send the buffer one bit at a time through _write_color (reference implementation for the frame encoder) '''
+
+		# Flat R, G, B copy of the corrected colours
+		if (self.numpy_buffer): buf = bytearray(self._corrected(self.num_leds).tobytes())
+		else                  : buf = self._corrected(self.num_leds)
 
-	def write(self):
 		# Begin data frame 4 bytes
 		self._frame()
 
 		# 4 bytes for each led (checksum, blue, green, red)
 		for i in range(self.num_leds):
-			self._write_color(self.buf[i * 3], self.buf[i * 3 + 1], self.buf[i * 3 + 2])
+			self._write_color(buf[i * 3], buf[i * 3 + 1], buf[i * 3 + 2])
 
 		# End data frame 4 bytes
 		self._frame()
 
+	def encode(self, num_leds = None):
+		''' Compile the start frame, each of the first num_leds leds (checksum, blue, green, red) and the end frame into a flat list of (pin(s), value(s)) outputs '''
+
+		if (num_leds is None):
+			num_leds = self.num_leds
+
+		byte_ops = self._byte_ops
+		ops      = []
+
+		# Look up each byte of the frame, tracking the level the data line is left at
+		# (start as if high so the first bit always drives the data line low)
+		level = 1
+		for b in bytearray(self.frame_bytes(num_leds)):
+			ops.extend(byte_ops[level][b])
+			level = b & 1
+
+		return ops
+
+	def _build_color_lut(self):
+		''' Precompute a 256 entry table per channel for each dither phase (a single phase without dithering), or None when colours are sent unchanged '''
+
+		self._color_phase = 0
+
+		if ((self.gamma == (1.0, 1.0, 1.0)) and (self.brightness == (255, 255, 255)) and (self.dither == False)):
+			self._color_lut = [None]
+			return
+
+		# Each phase rounds the corrected value at a different threshold, so over the phases leds average out to the fractional level
+		if (self.dither): offsets = [(DITHER_ORDER[k] + 0.5) / DITHER_PHASES for k in range(DITHER_PHASES)]
+		else            : offsets = [0.5]
+
+		self._color_lut = []
+		for offset in offsets:
+			tables = []
+			for gamma, brightness in zip(self.gamma, self.brightness):
+				table = bytes(bytearray(min(255, int(255.0 * (v / 255.0) ** gamma * brightness / 255.0 + offset)) for v in range(256)))
+
+				# A numpy buffer looks up with an index array instead of translate
+				if (self.numpy_buffer): tables.append(numpy.frombuffer(table, numpy.uint8))
+				else                  : tables.append(table)
+			self._color_lut.append(tables)
+
+	def _corrected(self, num_leds):
+		''' Return the colours of the first num_leds leds through the lookup tables of the current dither phase (R, G, B flat bytearray, or (num_leds, 3) numpy array) '''
+
+		lut = self._color_lut[self._color_phase]
+
+		if (self.numpy_buffer):
+			buf = self.buf[:num_leds]
+			if (lut is None):
+				return buf
+			out = numpy.empty_like(buf)
+			for c in range(3):
+				out[:, c] = lut[c][buf[:, c]]
+			return out
+
+		buf = self.buf[:num_leds * 3]
+		if (lut is None):
+			return buf
+		out = bytearray(len(buf))
+		for c in range(3):
+			out[c::3] = buf[c::3].translate(lut[c])
+		return out
+
+	def _build_byte_ops(self):
+		''' Precompute the (pin(s), value(s)) outputs for every byte value, given the level the data line was left at '''
+
+		clk_low  = (self.pin_clk, 0)
+		clk_high = (self.pin_clk, 1)
+
+		# Setting the data line and pulling the clock low is a single batched output of both pins
+		data_clk_low = (((self.pin_data, self.pin_clk), (0, 0)),
+		                ((self.pin_data, self.pin_clk), (1, 0)))
+
+		self._byte_ops = ([], [])
+		for level in (0, 1):
+			for b in range(256):
+				ops  = []
+				prev = level
+				for bit in BYTE_BITS[b]:
+					# Only drive the data line when it changes
+					if (bit != prev):
+						ops.append(data_clk_low[bit])
+						prev = bit
+					else:
+						ops.append(clk_low)
+					ops.append(clk_high)
+				self._byte_ops[level].append(tuple(ops))
+
+	def _transmit(self, ops):
+		''' Replay a compiled list of (pin(s), value(s)) outputs, each one a single backend call '''
+
+		output = self.gpio.output_batch
+
+		if (self.sleepEnabled):
+			for pins, values in ops:
+				output(pins, values)
+				self._sleep_us(1) # works without it (3.6 us)
+		else:
+			for pins, values in ops:
+				output(pins, values)
+
+	def _set_array(self, index, val):
+		''' Assign a colour or array of colours to an led index or slice of the numpy buffer, tracking the highest led that changed '''
+
+		rows    = numpy.arange(self.num_leds)[index]
+		new     = numpy.asarray(val, numpy.uint8)
+		changed = numpy.any(self.buf[index] != new, axis = -1)
+
+		if (numpy.any(changed)):
+			self.buf[index] = new
+			self.dirty      = max(self.dirty, int(numpy.max(numpy.where(changed, rows, -1))))
+
 	def _sleep_us(self, microseconds):
-		time.sleep(x/1000000.0)
+		time.sleep(microseconds/1000000.0)
 
 	def _frame(self):
 		# Send 32x zeros
@@ -132,6 +454,79 @@ class P9813:
 		self._write_byte(g)
 		self._write_byte(r)
 
+#########################################################################
+#  Functions
+#########################################################################
+
+def _import_numpy():
+	''' Import numpy into the module the first time it is needed '''
+	global numpy
+	if (numpy is None):
+		try:
+			import numpy
+		except ImportError:
+			raise ImportError("numpy is required for numpy_buffer")
+
+def edges_to_bits(edges, pin_clk, pin_data, data_level = 1):
+	''' Sample the data line on every rising clock edge of a list of (timestamp, pin, value) edges, such as simGPIO records '''
+
+	bits = []
+	for timestamp, pin, value in edges:
+		if (pin == pin_data):
+			data_level = value
+		elif ((pin == pin_clk) and (value == 1)):
+			bits.append(data_level)
+
+	return bits
+
+def bytes_to_bits(frame):
+	''' Expand bytes (such as an SPI frame) into bits, MSB first '''
+
+	bits = []
+	for b in bytearray(frame):
+		bits.extend(BYTE_BITS[b])
+
+	return bits
+
+def decode_frames(bits):
+	''' Decode a P9813 bit stream into frames, each a list of (r, g, b) tuples. Raises ValueError on a malformed stream. '''
+
+	if (len(bits) % 32 != 0):
+		raise ValueError("Bit stream is not a whole number of 32 bit words")
+
+	frames  = []
+	current = None
+
+	for i in range(0, len(bits), 32):
+		word = 0
+		for bit in bits[i:i + 32]:
+			word = (word << 1) | bit
+
+		# 32 zeros is a start frame or an end frame
+		if (word == 0):
+			if (current):
+				frames.append(current)
+			current = []
+			continue
+
+		if (current is None):
+			raise ValueError("Led data before the start frame at bit " + str(i))
+
+		# 4 bytes for each led (checksum, blue, green, red)
+		checksum = word >> 24
+		b        = word >> 16 & 0xFF
+		g        = word >>  8 & 0xFF
+		r        = word       & 0xFF
+		if (checksum != 0xC0 | CHECKSUM_B[b] | CHECKSUM_G[g] | CHECKSUM_R[r]):
+			raise ValueError("Bad checksum " + hex(checksum) + " at bit " + str(i))
+
+		current.append((r, g, b))
+
+	if (current):
+		raise ValueError("Missing end frame")
+
+	return frames
+
 #########################################################################
 # MAIN
 #########################################################################
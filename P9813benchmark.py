@@ -0,0 +1,211 @@
+import P9813
+import mmapGPIO
+import os
+import sys
+import tempfile
+from argparse import ArgumentParser
+from mmapGPIO import MmapGPIO
+from simGPIO import SimGPIO
+from timeit import default_timer
+
+#########################################################################
+#  Usage Examples
+#########################################################################
+
+# 1. Benchmark the default chain lengths (runs anywhere, no hardware needed)
+  #python P9813benchmark.py
+
+# 2. Benchmark chosen chain lengths for 2 seconds each
+  #python P9813benchmark.py -n 1 60 300 1000 -t 2
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# GPIO pins used for the simulated chain
+PIN_CLK  = 11
+PIN_DATA = 15
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class FakeSpiDev():
+	''' Stand-in for spidev.SpiDev that keeps the frames written to it '''
+
+	def __init__(self, record = True):
+		self.record = record
+		self.frames = []
+		self.calls  = 0
+
+	def writebytes2(self, frame):
+		self.calls += 1
+		if (self.record):
+			self.frames.append(bytes(frame))
+
+	def close(self):
+		pass
+
+class RegisterLog():
+	''' Stand-in for the GPIO register block that turns writes to the set and clear registers into simGPIO style (timestamp, pin, value) edges of the given board pins '''
+
+	def __init__(self, pins, record = True):
+		self.pins   = dict((mmapGPIO.BOARD_TO_BCM[pin], pin) for pin in pins)
+		self.record = record
+		self.words  = [0] * (mmapGPIO.BLOCK_SIZE // 4)
+		self.levels = {}
+		self.edges  = []
+		self.calls  = 0
+
+	def __getitem__(self, index):
+		return self.words[index]
+
+	def __setitem__(self, index, value):
+		self.calls       += 1
+		self.words[index] = value
+
+		if ((self.record) and (index in (mmapGPIO.GPSET0, mmapGPIO.GPCLR0))):
+			level = int(index == mmapGPIO.GPSET0)
+			for bcm, pin in self.pins.items():
+				if (((value >> bcm) & 1) and (self.levels.get(pin) != level)):
+					self.levels[pin] = level
+					self.edges.append((0, pin, level))
+
+	def take_edges(self):
+		''' Return the edges recorded so far and start a new recording '''
+		edges      = self.edges
+		self.edges = []
+		return edges
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def random_frames(num_leds, count):
+	''' Return count random R, G, B buffers for a chain of num_leds '''
+	return [bytearray(os.urandom(num_leds * 3)) for i in range(count)]
+
+def make_driver(mode, num_leds, record):
+	''' Construct a driver for the given mode, returning the driver and the backend that counts its calls '''
+
+	if (mode == 'spi'):
+		backend = FakeSpiDev(record)
+		driver  = P9813.P9813(PIN_CLK, PIN_DATA, num_leds, transport = P9813.SPITransport(spi = backend))
+	elif ((mode == 'mmap') and (record)):
+		backend = RegisterLog([PIN_CLK, PIN_DATA])
+		driver  = P9813.P9813(PIN_CLK, PIN_DATA, num_leds, gpio_backend = MmapGPIO(registers = backend))
+	elif (mode == 'mmap'):
+		# Time real memory stores, to a temporary file standing in for /dev/gpiomem
+		scratch = tempfile.NamedTemporaryFile()
+		scratch.write(b'\0' * mmapGPIO.BLOCK_SIZE)
+		scratch.flush()
+		backend = MmapGPIO(scratch.name)
+		driver  = P9813.P9813(PIN_CLK, PIN_DATA, num_leds, gpio_backend = backend)
+	else:
+		backend = SimGPIO(record)
+		driver  = P9813.P9813(PIN_CLK, PIN_DATA, num_leds, gpio_backend = backend)
+
+	return driver, backend
+
+def send(driver, mode):
+	''' Send the whole chain using the given mode '''
+	if (mode == 'legacy'): driver.write_legacy()
+	else                 : driver.write(force = True)
+
+def captured_frames(backend, mode, data_level):
+	''' Decode everything the backend has captured since it was last cleared, given the data level before the capture '''
+	if (mode == 'spi'):
+		bits = []
+		for frame in backend.frames:
+			bits.extend(P9813.bytes_to_bits(frame))
+		backend.frames = []
+	else:
+		bits = P9813.edges_to_bits(backend.take_edges(), PIN_CLK, PIN_DATA, data_level)
+
+	return P9813.decode_frames(bits)
+
+def verify(mode, num_leds, count = 3):
+	''' Send random buffers through a recording backend and check the decoded frames match. Returns an error string or None. '''
+
+	driver, backend = make_driver(mode, num_leds, True)
+
+	# Skip the pin setup and reset frame
+	backend.edges  = []
+	backend.frames = []
+
+	for buf in random_frames(num_leds, count):
+		# Only edges are recorded, so remember where the data line starts
+		if (mode == 'spi'): data_level = None
+		else              : data_level = backend.levels[PIN_DATA]
+
+		driver.load(buf)
+		send(driver, mode)
+
+		expected = [tuple(buf[i * 3 : i * 3 + 3]) for i in range(num_leds)]
+		try:
+			frames = captured_frames(backend, mode, data_level)
+		except ValueError as exc:
+			return str(exc)
+
+		if (frames != [expected]):
+			return "Decoded frame does not match the buffer"
+
+	return None
+
+def measure(mode, num_leds, seconds):
+	''' Send random buffers for the given time. Returns frames/sec, bits/sec and backend calls/frame (None if the backend does not count them). '''
+
+	driver, backend = make_driver(mode, num_leds, False)
+	bufs            = random_frames(num_leds, 16)
+	calls           = hasattr(backend, 'calls')
+	if (calls):
+		backend.calls = 0
+
+	frames = 0
+	start  = default_timer()
+	while ((default_timer() - start) < seconds):
+		driver.load(bufs[frames % len(bufs)])
+		send(driver, mode)
+		frames += 1
+	elapsed = default_timer() - start
+
+	bits = 64 + 32 * num_leds
+	if (calls): return frames / elapsed, frames * bits / elapsed, float(backend.calls) / frames
+	else      : return frames / elapsed, frames * bits / elapsed, None
+
+#########################################################################
+#  MAIN
+#########################################################################
+def main():
+	''' Benchmark the P9813 driver on simulated backends and check every mode sends the buffer contents '''
+
+	# Declare input arguments
+	parser = ArgumentParser()
+	parser.add_argument("-n", "--leds"   , dest = "leds"   , type = int  , nargs = "+", default = [1, 10, 60, 300]            , help = "Chain lengths to benchmark.")
+	parser.add_argument("-m", "--modes"  , dest = "modes"  , nargs = "+" , default = ['legacy', 'bitbang', 'mmap', 'spi']       , help = "Modes to benchmark: legacy, bitbang, mmap and/or spi.")
+	parser.add_argument("-t", "--time"   , dest = "seconds", type = float, default = 1.0                                       , help = "Seconds to run each benchmark.")
+
+	# Parse the arguments
+	args = parser.parse_args()
+
+	failures = 0
+
+	print("%-8s %6s %12s %14s %12s  %s" % ("mode", "leds", "frames/sec", "bits/sec", "calls/frame", "decoded"))
+	for num_leds in args.leds:
+		for mode in args.modes:
+			error = verify(mode, num_leds)
+			if (error is not None):
+				failures += 1
+
+			framesPerSec, bitsPerSec, callsPerFrame = measure(mode, num_leds, args.seconds)
+			if (callsPerFrame is None): callsPerFrame = "-"
+			else                      : callsPerFrame = "%.1f" % callsPerFrame
+			print("%-8s %6d %12.1f %14.0f %12s  %s" % (mode, num_leds, framesPerSec, bitsPerSec, callsPerFrame, error or "ok"))
+
+	# Fail if any decoded frame differed from the buffer
+	if (failures != 0):
+		print(str(failures) + " benchmark(s) sent frames that do not match the buffer")
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
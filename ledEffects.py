@@ -0,0 +1,235 @@
+import math
+import threading
+import time
+from timeit import default_timer
+
+#########################################################################
+#  Usage Example
+#########################################################################
+
+# from P9813 import P9813
+# import ledEffects
+
+# ledDriver = P9813(11, 15, 10)
+# engine    = ledEffects.EffectEngine(ledDriver, 60)
+# engine.start()
+# engine.setEffect(ledEffects.Breathing([0, 100, 0]))
+# time.sleep(10)
+# engine.stop()
+# print(engine.getStatistics())
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Default target frame rate
+EFFECT_FPS = 30
+
+# SCALE[level][value] is value * level / 255 rounded, so scaling a colour channel is two lookups and no math
+SCALE = tuple(bytearray((value * level + 127) // 255 for value in range(256)) for level in range(256))
+
+# One breath (0 -> 255 -> 0 brightness), 256 steps on a raised cosine
+BREATH = bytearray(int(round(127.5 - 127.5 * math.cos(2.0 * math.pi * i / 256))) for i in range(256))
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def scaleColor(color, level):
+	''' Scale an [R, G, B] colour by level (0 - 255) '''
+	table = SCALE[level]
+	return [table[color[0]], table[color[1]], table[color[2]]]
+
+def blendColor(colorA, colorB, level):
+	''' Blend from colorA (level 0) to colorB (level 255) '''
+	tableA = SCALE[255 - level]
+	tableB = SCALE[level]
+	return [tableA[colorA[0]] + tableB[colorB[0]],
+	        tableA[colorA[1]] + tableB[colorB[1]],
+	        tableA[colorA[2]] + tableB[colorB[2]]]
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class Solid:
+	''' Every led the same colour '''
+
+	def __init__(self, color):
+		self.color = color
+
+	def render(self, driver, t):
+		driver.fill(self.color)
+
+class Breathing:
+	''' Fade every led up and down, one breath per period seconds '''
+
+	def __init__(self, color, period = 4.0):
+		self.color  = color
+		self.period = period
+
+	def render(self, driver, t):
+		driver.fill(scaleColor(self.color, BREATH[int(t * 256 / self.period) & 255]))
+
+class Crossfade:
+	''' Fade every led from one colour to another over duration seconds, then hold '''
+
+	def __init__(self, colorFrom, colorTo, duration = 1.0):
+		self.colorFrom = colorFrom
+		self.colorTo   = colorTo
+		self.duration  = duration
+
+	def render(self, driver, t):
+		level = int(t * 255 / self.duration)
+		if (level > 255):
+			level = 255
+		driver.fill(blendColor(self.colorFrom, self.colorTo, level))
+
+class ProgressBar:
+	''' Light the chain in proportion to a percentage (such as PrinterStatus.getCompletionPercentage), with the boundary led partly lit '''
+
+	def __init__(self, getPercentage, color, background = (0, 0, 0)):
+		self.getPercentage = getPercentage
+		self.color         = color
+		self.background    = background
+
+	def render(self, driver, t):
+		percentage = self.getPercentage()
+		if (percentage is None):
+			percentage = 0
+
+		# Position of the end of the bar in 1/256ths of an led
+		position = int(min(max(percentage, 0), 100) * driver.num_leds * 256 / 100)
+		full     = position >> 8
+
+		for i in range(driver.num_leds):
+			if   (i <  full): driver[i] = self.color
+			elif (i == full): driver[i] = blendColor(self.background, self.color, position & 255)
+			else            : driver[i] = self.background
+
+class Blink:
+	''' Blink every led on and off while a condition holds (such as PrinterStatus.getErrorState), otherwise show the fallback effect '''
+
+	def __init__(self, color, isActive = None, period = 1.0, fallback = None):
+		self.color    = color
+		self.isActive = isActive
+		self.period   = period
+		self.fallback = fallback
+
+	def render(self, driver, t):
+		if ((self.isActive is not None) and (not self.isActive())):
+			if (self.fallback is not None): self.fallback.render(driver, t)
+			else                          : driver.fill((0, 0, 0))
+			return
+
+		if ((t % self.period) < (self.period / 2.0)): driver.fill(self.color)
+		else                                        : driver.fill((0, 0, 0))
+
+class EffectEngine:
+	''' Render an effect into a P9813 driver at a fixed frame rate, keeping frame time and dropped frame statistics '''
+
+	def __init__(self, driver, fps = EFFECT_FPS):
+		self.driver  = driver
+		self.fps     = fps
+		self.effect  = None
+		self.started = default_timer()
+		self.running = False
+		self.thread  = None
+		self.metrics = None
+		self.resetStatistics()
+
+	def setEffect(self, effect):
+		''' Switch to a new effect, whose time starts now '''
+		self.started = default_timer()
+		self.effect  = effect
+
+	def getEffect(self):
+		''' Return the effect being shown '''
+		return self.effect
+
+	def resetStatistics(self):
+		''' Clear the frame statistics '''
+		self.frames       = 0
+		self.dropped      = 0
+		self.frameTimeSum = 0.0
+		self.frameTimeMax = 0.0
+
+	def getStatistics(self):
+		''' Return frames rendered, frames dropped, mean and max frame time (render and write) in seconds, and the frame rate that frame time could sustain '''
+
+		if (self.frames == 0): mean = 0.0
+		else                 : mean = self.frameTimeSum / self.frames
+
+		if (mean == 0.0): sustainable = None
+		else            : sustainable = 1.0 / mean
+
+		return {'frames': self.frames, 'dropped': self.dropped, 'meanFrameTime': mean, 'maxFrameTime': self.frameTimeMax, 'sustainableFps': sustainable}
+
+	def renderFrame(self):
+		''' Render the effect at the current time and write the changed leds '''
+
+		start  = default_timer()
+		effect = self.effect
+		if (effect is not None):
+			effect.render(self.driver, start - self.started)
+
+			# Optionally record the transmit time in a loopMetrics.Metrics
+			written = default_timer()
+			self.driver.write()
+			if (self.metrics is not None):
+				self.metrics.histogram('ledstrip_led_write_seconds', 'Time to send a frame to the LEDs').observe(default_timer() - written)
+
+		# Keep track of how long each frame takes
+		frameTime = default_timer() - start
+		self.frames       += 1
+		self.frameTimeSum += frameTime
+		if (frameTime > self.frameTimeMax):
+			self.frameTimeMax = frameTime
+
+	def run(self, duration = None):
+		''' Render frames on a fixed schedule until stopped (or for duration seconds). Late frames are dropped rather than letting the schedule drift. '''
+
+		self.running = True
+		self._run(duration)
+
+	def start(self):
+		''' Run in a background thread '''
+		self.running = True
+		self.thread  = threading.Thread(target = self._run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def stop(self):
+		''' Stop the background thread '''
+		self.running = False
+		if (self.thread is not None):
+			self.thread.join()
+			self.thread = None
+
+	def _run(self, duration = None):
+		''' Frame loop, runs while self.running is set '''
+
+		period   = 1.0 / self.fps
+		start    = default_timer()
+		deadline = start
+
+		while (self.running):
+			now = default_timer()
+			if ((duration is not None) and ((now - start) >= duration)):
+				break
+
+			# Sleep until the next frame is due, measured from the start so errors do not add up
+			if (now < deadline):
+				time.sleep(deadline - now)
+				now = default_timer()
+
+			# If we are a whole frame or more behind, skip the missed frames
+			late = int((now - deadline) / period)
+			if (late > 0):
+				self.dropped += late
+				deadline     += late * period
+
+			self.renderFrame()
+			deadline += period
+
+		self.running = False
@@ -0,0 +1,156 @@
+import BaseHTTPServer
+import os
+import threading
+from bisect import bisect_left
+
+#########################################################################
+#  Usage Example
+#########################################################################
+
+# import loopMetrics
+# from timeit import default_timer
+
+# metrics = loopMetrics.Metrics()
+# write   = metrics.histogram('ledstrip_led_write_seconds', 'Time to send a frame to the LEDs')
+
+# start = default_timer()
+# ledDriver.write()
+# write.observe(default_timer() - start)
+
+# metrics.writeFile('/var/lib/node_exporter/textfile_collector/ledstrip.prom')   # for the node exporter textfile collector
+# metrics.serve(9101)                                                            # or scrape http://localhost:9101/metrics
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Upper bounds of the latency histogram buckets in seconds (100 us to 5 s)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Address the metrics endpoint listens on
+METRICS_ADDRESS = '127.0.0.1'
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class Histogram:
+	''' Prometheus style histogram. Observing is one bisect and two additions, the cumulative bucket counts are only worked out when exported. '''
+
+	def __init__(self, name, help, labels = None, buckets = LATENCY_BUCKETS):
+		self.name    = name
+		self.help    = help
+		self.labels  = tuple(sorted((labels or {}).items()))
+		self.buckets = tuple(buckets)
+		self.counts  = [0] * (len(self.buckets) + 1)
+		self.sum     = 0.0
+
+	def observe(self, value):
+		''' Count a value (in seconds) '''
+		self.counts[bisect_left(self.buckets, value)] += 1
+		self.sum += value
+
+	def lines(self):
+		''' Return the bucket, sum and count lines in Prometheus text format '''
+
+		labels = ''.join(name + '="' + escape(value) + '",' for name, value in self.labels)
+		lines  = []
+
+		total = 0
+		for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+			total += count
+			if (bound != '+Inf'): bound = repr(float(bound))
+			lines.append('%s_bucket{%sle="%s"} %d' % (self.name, labels, bound, total))
+
+		labels = labels.rstrip(',')
+		if (labels != ''):
+			labels = '{' + labels + '}'
+		lines.append('%s_sum%s %r'  % (self.name, labels, self.sum))
+		lines.append('%s_count%s %d' % (self.name, labels, total))
+
+		return lines
+
+class Metrics:
+	''' A set of histograms exported together as a Prometheus text file or HTTP endpoint '''
+
+	def __init__(self):
+		self.histograms = {}
+		self.server     = None
+
+		# Histograms are added from the threads that observe them (such as the http client of each poller) while render runs in the endpoint's thread
+		self.lock = threading.Lock()
+
+	def histogram(self, name, help, labels = None, buckets = LATENCY_BUCKETS):
+		''' Return the histogram with this name and labels, creating it the first time. Keep the returned histogram to observe without the lookup. '''
+
+		key = (name, tuple(sorted((labels or {}).items())))
+		with self.lock:
+			if (key not in self.histograms):
+				self.histograms[key] = Histogram(name, help, labels, buckets)
+			return self.histograms[key]
+
+	def render(self):
+		''' Return every histogram in Prometheus text format, grouped by name '''
+
+		with self.lock:
+			histograms = sorted(self.histograms.items())
+
+		lines = []
+		shown = set()
+		for key, histogram in histograms:
+			if (histogram.name not in shown):
+				shown.add(histogram.name)
+				lines.append('# HELP ' + histogram.name + ' ' + histogram.help)
+				lines.append('# TYPE ' + histogram.name + ' histogram')
+			lines.extend(histogram.lines())
+
+		return '\n'.join(lines) + '\n'
+
+	def writeFile(self, path):
+		''' Write the metrics to a text file, replacing it in one rename so a collector never reads half a file '''
+
+		temporary = path + '.' + str(os.getpid()) + '.tmp'
+		with open(temporary, 'w') as f:
+			f.write(self.render())
+		os.rename(temporary, path)
+
+	def serve(self, port, address = METRICS_ADDRESS):
+		''' Serve the metrics at http://address:port/metrics from a background thread '''
+
+		metrics = self
+
+		class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+			def do_GET(self):
+				if (self.path.split('?')[0] not in ('/', '/metrics')):
+					self.send_error(404)
+					return
+
+				body = metrics.render()
+				self.send_response(200)
+				self.send_header('Content-Type', 'text/plain; version=0.0.4')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, format, *args):
+				pass
+
+		self.server = BaseHTTPServer.HTTPServer((address, port), Handler)
+		thread = threading.Thread(target = self.server.serve_forever)
+		thread.daemon = True
+		thread.start()
+
+	def close(self):
+		''' Stop serving the metrics '''
+		if (self.server is not None):
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def escape(value):
+	''' Escape a label value for the Prometheus text format '''
+	return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
@@ -0,0 +1,341 @@
+import ctypes
+import mmap
+import os
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+#########################################################################
+#  Usage Example
+#########################################################################
+
+# from safeGPIO import safeGPIO as GPIO
+# from mmapGPIO import MmapGPIO
+# from P9813 import P9813
+
+# ledDriver = P9813(11, 15, 10, gpio_backend = MmapGPIO())
+
+# Check the register writes without hardware (against a temporary file standing in for /dev/gpiomem)
+  #python mmapGPIO.py
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# GPIO register block (no root needed) and its size in bytes
+GPIOMEM_PATH = '/dev/gpiomem'
+BLOCK_SIZE   = 4096
+
+# Register offsets in 32 bit words: function select (3 bits per pin, 10 pins per register), set, clear and level (one bit per pin, 32 pins per register)
+GPFSEL0 = 0x00 // 4
+GPSET0  = 0x1C // 4
+GPCLR0  = 0x28 // 4
+GPLEV0  = 0x34 // 4
+
+# Function select values
+FSEL_INPUT  = 0
+FSEL_OUTPUT = 1
+
+# Broadcom GPIO number of each GPIO pin on the 40 pin header
+BOARD_TO_BCM = { 3:  2,  5:  3,  7:  4,  8: 14, 10: 15, 11: 17, 12: 18, 13: 27, 15: 22, 16: 23, 18: 24, 19: 10, 21:  9, 22: 25,
+                23: 11, 24:  8, 26:  7, 27:  0, 28:  1, 29:  5, 31:  6, 32: 12, 33: 13, 35: 19, 36: 16, 37: 26, 38: 20, 40: 21}
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class MmapGPIO():
+	''' RPi.GPIO backend that drives the BCM283x GPIO registers through a memory map of /dev/gpiomem. Each output is one or two stores of precomputed masks to the set and clear registers.
+	    Pull resistors are left as they are (the P9813 lines have their own pullups) and edge detection is not supported. '''
+
+	# Class variables (same values as RPi.GPIO)
+	HIGH     = 1
+	LOW      = 0
+	OUT      = 0
+	IN       = 1
+	HARD_PWM = 43
+	SERIAL   = 40
+	I2C      = 42
+	SPI      = 41
+	UNKNOWN  = -1
+	BOARD    = 10
+	BCM      = 11
+	PUD_OFF  = 20
+	PUD_UP   = 22
+	PUD_DOWN = 21
+	RISING   = 31
+	FALLING  = 32
+	BOTH     = 33
+	VERSION  = 'mmap'
+
+	def __init__(self, path = GPIOMEM_PATH, registers = None):
+		''' Map the register block at path (a file of at least BLOCK_SIZE bytes works without hardware), or use registers, any sequence of 32 bit words such as a recording stand-in '''
+
+		self.mode   = None
+		self.file   = None
+		self.map    = None
+		self.stores = {}
+
+		# Broadcom GPIO number -> function select before setup, restored by cleanup
+		self.configured = {}
+
+		if (registers is None):
+			self.file = os.open(path, os.O_RDWR | os.O_SYNC)
+			self.map  = mmap.mmap(self.file, BLOCK_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+			registers = (ctypes.c_uint32 * (BLOCK_SIZE // 4)).from_buffer(self.map)
+		self.registers = registers
+
+	def close(self):
+		''' Unmap the register block, dropping the view of it first (Python 3 refuses to close a map a view still points into) '''
+		self.registers = None
+		if (self.map is not None):
+			self.map.close()
+			os.close(self.file)
+			self.map  = None
+			self.file = None
+
+	# python function cleanup(channel=None)
+	def cleanup(self, channel = None):
+		if (channel is None): channels = list(self.configured)
+		else                : channels = [self._bcm(ch) for ch in self._channels(channel)]
+
+		# Put the pins back to the function they had before setup
+		for bcm in channels:
+			if (bcm in self.configured):
+				self._select(bcm, self.configured.pop(bcm))
+		self.stores.clear()
+
+	# python function setup(channel(s), direction, pull_up_down=PUD_OFF, initial=None)
+	def setup(self, channel, direction, pull_up_down = PUD_OFF, initial = None):
+		for ch in self._channels(channel):
+			bcm = self._bcm(ch)
+			if (bcm not in self.configured):
+				self.configured[bcm] = self._function(bcm)
+
+			# Like RPi.GPIO, drive the initial level before the pin becomes an output
+			if ((direction == self.OUT) and (initial is not None)):
+				for index, mask in self._masks([bcm], [initial]):
+					self.registers[index] = mask
+
+			if (direction == self.OUT): self._select(bcm, FSEL_OUTPUT)
+			else                      : self._select(bcm, FSEL_INPUT)
+		self.stores.clear()
+
+	# python function output(channel(s), value(s))
+	def output(self, channel, value):
+		# The stores for each (channel(s), value(s)) are worked out once
+		try:
+			stores = self.stores[(channel, value)]
+		except KeyError:
+			stores = self._output_stores(channel, value)
+			self.stores[(channel, value)] = stores
+		except TypeError:
+			# Lists cannot be cached
+			stores = self._output_stores(channel, value)
+
+		registers = self.registers
+		for index, mask in stores:
+			registers[index] = mask
+
+	# python function value = input(channel)
+	def input(self, channel):
+		bcm = self._bcm(channel)
+		return (self.registers[GPLEV0 + (bcm >> 5)] >> (bcm & 31)) & 1
+
+	# python function setmode(mode)
+	def setmode(self, mode):
+		if (mode != self.mode):
+			self.stores.clear()
+		self.mode = mode
+
+	# python function getmode()
+	def getmode(self):
+		return self.mode
+
+	# python function add_event_callback(gpio, callback)
+	def add_event_callback(self, channel, callback):
+		raise RuntimeError("Edge detection is not supported by MmapGPIO")
+
+	# python function add_event_detect(gpio, edge, callback=None, bouncetime=None)
+	def add_event_detect(self, channel, edge, callback = None, bouncetime = None):
+		raise RuntimeError("Edge detection is not supported by MmapGPIO")
+
+	# python function remove_event_detect(gpio)
+	def remove_event_detect(self, channel):
+		pass
+
+	# python function value = event_detected(channel)
+	def event_detected(self, channel):
+		return False
+
+	# python function channel = wait_for_edge(channel, edge, bouncetime=None, timeout=None)
+	def wait_for_edge(self, channel, edge, bouncetime = None, timeout = None):
+		raise RuntimeError("Edge detection is not supported by MmapGPIO")
+
+	# python function value = gpio_function(channel)
+	def gpio_function(self, channel):
+		function = self._function(self._bcm(channel))
+		if   (function == FSEL_INPUT) : return self.IN
+		elif (function == FSEL_OUTPUT): return self.OUT
+		else                          : return self.UNKNOWN
+
+	# python function setwarnings(state)
+	def setwarnings(self, state):
+		pass
+
+	def _output_stores(self, channel, value):
+		''' Work out the register stores for an output call, checking the pins are outputs '''
+
+		channels = self._channels(channel)
+		if (isinstance(value, (list, tuple))): values = value
+		else                                 : values = [value] * len(channels)
+
+		if (len(channels) != len(values)):
+			raise RuntimeError("Number of channels != number of values")
+
+		pins = [self._bcm(ch) for ch in channels]
+		for bcm in pins:
+			if (bcm not in self.configured):
+				raise RuntimeError("The GPIO channel has not been set up as an OUTPUT")
+
+		return self._masks(pins, values)
+
+	def _masks(self, pins, values):
+		''' Return the (register, mask) stores that set the given Broadcom GPIOs to the given levels, clears first '''
+
+		setMasks   = [0, 0]
+		clearMasks = [0, 0]
+		for bcm, val in zip(pins, values):
+			if (val): setMasks  [bcm >> 5] |= 1 << (bcm & 31)
+			else    : clearMasks[bcm >> 5] |= 1 << (bcm & 31)
+
+		stores = []
+		for bank in (0, 1):
+			if (clearMasks[bank] != 0): stores.append((GPCLR0 + bank, clearMasks[bank]))
+		for bank in (0, 1):
+			if (setMasks[bank]   != 0): stores.append((GPSET0 + bank, setMasks[bank]))
+
+		return tuple(stores)
+
+	def _function(self, bcm):
+		''' Return the function select of a Broadcom GPIO '''
+		return (self.registers[GPFSEL0 + bcm // 10] >> ((bcm % 10) * 3)) & 7
+
+	def _select(self, bcm, function):
+		''' Set the function select of a Broadcom GPIO (read, modify, write) '''
+		index = GPFSEL0 + bcm // 10
+		shift = (bcm % 10) * 3
+		self.registers[index] = (self.registers[index] & ~(7 << shift)) | (function << shift)
+
+	def _bcm(self, channel):
+		''' Translate a channel in the current numbering mode to its Broadcom GPIO number '''
+
+		if (self.mode == self.BCM):
+			if ((channel < 0) or (channel > 53)):
+				raise ValueError("The channel sent is invalid on a Raspberry Pi")
+			return channel
+
+		if (self.mode == self.BOARD):
+			if (channel not in BOARD_TO_BCM):
+				raise ValueError("The channel sent is invalid on a Raspberry Pi")
+			return BOARD_TO_BCM[channel]
+
+		raise RuntimeError("Please set pin numbering mode using GPIO.setmode(GPIO.BOARD) or GPIO.setmode(GPIO.BCM)")
+
+	def _channels(self, channel):
+		if (isinstance(channel, (list, tuple))): return list(channel)
+		else                                   : return [channel]
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def check_registers(path):
+	''' Drive pins through the register file at path and check each register write. Returns a list of failure strings. '''
+
+	failures = []
+	def check(name, actual, expected):
+		if (actual != expected):
+			failures.append(name + ": " + hex(actual) + " != " + hex(expected))
+
+	gpio = MmapGPIO(path)
+	regs = gpio.registers
+	gpio.setmode(gpio.BOARD)
+
+	# Output before setup is refused, like RPi.GPIO
+	try:
+		gpio.output(11, 1)
+		failures.append("output before setup was accepted")
+	except RuntimeError:
+		pass
+
+	# Pins 11 and 15 are GPIO17 (GPFSEL1 bits 21-23) and GPIO22 (GPFSEL2 bits 6-8)
+	gpio.setup(11, gpio.OUT)
+	gpio.setup(15, gpio.OUT, initial = 1)
+	check("GPFSEL1", regs[GPFSEL0 + 1], 1 << 21)
+	check("GPFSEL2", regs[GPFSEL0 + 2], 1 << 6)
+	check("initial GPSET0", regs[GPSET0], 1 << 22)
+	check("gpio_function", gpio.gpio_function(11), gpio.OUT)
+
+	# Single pin writes go to the set or clear register
+	gpio.output(11, 1)
+	check("GPSET0", regs[GPSET0], 1 << 17)
+	gpio.output(11, 0)
+	check("GPCLR0", regs[GPCLR0], 1 << 17)
+
+	# A batch is one store per register
+	regs[GPSET0] = 0
+	regs[GPCLR0] = 0
+	gpio.output((15, 11), (1, 0))
+	check("batch GPSET0", regs[GPSET0], 1 << 22)
+	check("batch GPCLR0", regs[GPCLR0], 1 << 17)
+	gpio.output([15, 11], [0, 0])
+	check("list GPCLR0", regs[GPCLR0], (1 << 17) | (1 << 22))
+
+	# Inputs read the level register
+	regs[GPLEV0] = 1 << 22
+	check("input high", gpio.input(15), 1)
+	check("input low" , gpio.input(11), 0)
+
+	# Cleanup restores the functions from before setup
+	gpio.cleanup()
+	check("cleanup GPFSEL1", regs[GPFSEL0 + 1], 0)
+	check("cleanup GPFSEL2", regs[GPFSEL0 + 2], 0)
+
+	# The map cannot be closed while a view of it is still held (Python 3 raises BufferError)
+	del regs
+	gpio.close()
+	return failures
+
+#########################################################################
+#  MAIN
+#########################################################################
+def main():
+	''' Check the register writes against a register file (a temporary file standing in for /dev/gpiomem unless a path is given) '''
+
+	# Declare input arguments
+	parser = ArgumentParser()
+	parser.add_argument("-p", "--path", dest = "path", default = None, help = "Register file to check against (only use a scratch file, not /dev/gpiomem).")
+
+	# Parse the arguments
+	args = parser.parse_args()
+
+	# A zeroed temporary file stands in for the register page
+	if (args.path is None):
+		scratch = tempfile.NamedTemporaryFile()
+		scratch.write(b'\0' * BLOCK_SIZE)
+		scratch.flush()
+		path = scratch.name
+	else:
+		path = args.path
+
+	failures = check_registers(path)
+	for failure in failures:
+		print(failure)
+
+	if (len(failures) != 0):
+		sys.exit(1)
+	print("Register writes ok")
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,112 @@
+import octoprint_LED_PWM_displayPrinterStatus as display
+import octoprint_printerStatus
+import octoprint_restapi
+import time
+from argparse import ArgumentParser
+from P9813 import P9813
+
+#########################################################################
+#  Usage Example
+#########################################################################
+
+# One line per printer in the fleet file, address then API key (lines starting with # are skipped):
+#   http://192.168.1.234:80/ XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+#   http://192.168.1.235:80/ YYYYYYYYYYYYYYYYYYYYYYYYYYYYYYYY
+
+# Show every printer on its own 3 LED segment of one chain
+# sudo python octoprint_LED_PWM_displayFleetStatus.py -f fleet.txt -n 3
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def readFleet(path):
+	''' Read the (address, api_key) of each printer from a fleet file '''
+
+	printers = []
+	with open(path) as f:
+		for line in f:
+			line = line.strip()
+			if ((len(line) == 0) or (line.startswith('#'))):
+				continue
+
+			address, api_key = line.split()[:2]
+			printers.append((address, api_key))
+
+	return printers
+
+#########################################################################
+# MAIN
+#########################################################################
+def main():
+	''' Poll a fleet of printers from one process and light one LED segment per printer '''
+
+	# Declare input arguments
+	parser = ArgumentParser()
+	parser.add_argument("-f", "--fleet"          , dest   = "fleet"         , required = True                                                   , help = "File with the address and API key of each printer, one printer per line.")
+	parser.add_argument("-n", "--leds"           , dest   = "leds"          , type = int  , default = 1                                         , help = "Number of LEDs in each printer's segment of the chain.")
+	parser.add_argument("-j", "--max-active"     , dest   = "maxActive"     , type = int  , default = octoprint_printerStatus.FLEET_MAX_ACTIVE  , help = "Most HTTP requests in flight at once.")
+	parser.add_argument("-i", "--interval"       , dest   = "interval"      , type = float, default = octoprint_printerStatus.POLL_INTERVAL     , help = "Seconds from the start of one poll cycle to the next.")
+	parser.add_argument("--connect-timeout"      , dest   = "connectTimeout", type = float, default = octoprint_restapi.CONNECT_TIMEOUT         , help = "Seconds allowed to connect to a printer.")
+	parser.add_argument("-t", "--timeout"        , dest   = "timeout"       , type = float, default = octoprint_restapi.TOTAL_TIMEOUT           , help = "Seconds allowed for a whole status request.")
+	parser.add_argument("-b", "--brightness"     , dest   = "brightness"    , type = int  , default = display.LED_BRIGHTNESS                    , help = "LED brightness from 0 - 255.")
+	parser.add_argument("-g", "--gamma"          , dest   = "gamma"         , type = float, default = display.LED_GAMMA                         , help = "LED gamma.")
+	parser.add_argument("-v", "--verbose"        , action = "store_true"                                                                        , help = "Enable HTTP verbose option.")
+
+	# Parse the arguments
+	args         = parser.parse_args()
+	args.options = None
+
+	# Bound every request so one hung printer cannot hold up the cycle for long
+	octoprint_restapi.CLIENT.connectTimeout = args.connectTimeout
+	octoprint_restapi.CLIENT.timeout        = args.timeout
+
+	# Poll the whole fleet
+	printers = readFleet(args.fleet)
+	fleet    = octoprint_printerStatus.FleetStatus(printers, args.options, args.verbose, args.maxActive)
+
+	# One chain, with a segment of args.leds LEDs per printer in the order of the fleet file
+	ledDriver = P9813(11, 15, len(printers) * args.leds, gamma = args.gamma, brightness = args.brightness)
+	ledDriver.fill(display.LEDS_OFF)
+	ledDriver.write()
+
+	previouslyConnected = [False] * len(printers)
+
+	try:
+		while (True):
+			start = time.time()
+
+			# Set each segment from its printer's state, only the changed LEDs are written
+			for i, status in enumerate(fleet.getSnapshots()):
+				name, color = display.statusColor(status, status.connected, previouslyConnected[i])
+				for led in range(i * args.leds, (i + 1) * args.leds):
+					ledDriver[led] = color
+
+				if (fleet.latency[i] is None): latency = "-"
+				else                         : latency = "%.1f ms" % (fleet.latency[i] * 1000)
+
+				print("%-32s %-7s %-6s %s" % (printers[i][0], name, str(status.completion), latency))
+
+				# Keep track of connection status
+				if (status.connected):
+					previouslyConnected[i] = True
+
+			ledDriver.write()
+			print("Poll cycle: %.1f ms" % (fleet.cycleTime * 1000))
+			print("\r")
+
+			# Sleep for the rest of the interval before polling again
+			time.sleep(max(0, args.interval - (time.time() - start)))
+			fleet.update()
+	except KeyboardInterrupt:
+		print("\r")
+
+	statistics = fleet.getStatistics()
+	print("Poll cycles: " + str(statistics['cycles']) + ", mean cycle: %.1f ms, max cycle: %.1f ms" % (statistics['meanCycleTime'] * 1000, statistics['maxCycleTime'] * 1000))
+
+	# Turn off LEDs before we quit
+	ledDriver.fill(display.LEDS_OFF)
+	ledDriver.write()
+
+if __name__ == '__main__':
+	main()
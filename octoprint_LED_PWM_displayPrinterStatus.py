@@ -1,6 +1,10 @@
+import ledEffects
+import loopMetrics
 import octoprint_printerStatus
+import octoprint_restapi
 import time
 from argparse import ArgumentParser
+from timeit import default_timer
 from P9813 import P9813
 
 #########################################################################
@@ -9,6 +13,52 @@ from P9813 import P9813
 
 # sudo python octoprint_LED_PWM_displayPrinterStatus.py -a 'http://192.168.1.234:80/' -k 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX'
 
+#########################################################################
+#  Globals
+#########################################################################
+
+# Define color constants at full strength (the driver's brightness table scales them down)
+#              [           R,            G,            B]
+LED_STRENGTH = 255
+LEDS_OFF     = [           0,            0,            0]
+LEDS_RED     = [LED_STRENGTH,            0,            0]
+LEDS_GREEN   = [           0, LED_STRENGTH,            0]
+LEDS_BLUE    = [           0,            0, LED_STRENGTH]
+LEDS_YELLOW  = [LED_STRENGTH, LED_STRENGTH,            0]
+LEDS_MAGENTA = [LED_STRENGTH,            0, LED_STRENGTH]
+LEDS_CYAN    = [           0, LED_STRENGTH, LED_STRENGTH]
+LEDS_WHITE   = [LED_STRENGTH, LED_STRENGTH, LED_STRENGTH]
+
+# Default brightness (0 - 255) and gamma of the driver's colour tables
+LED_BRIGHTNESS = 100
+LED_GAMMA      = 1.0
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def statusColor(status, connected, previouslyConnected):
+	''' Return the (name, colour) to show for a status snapshot '''
+
+	# Only turn yellow if we lose connection unexpectedly
+	if ((connected == False) and (previouslyConnected == True)):
+		return "YELLOW", LEDS_YELLOW
+	# If connected but we have an error, then turn red
+	elif (status.error is not None):
+		return "RED", LEDS_RED
+	# If not complete then turn off LEDS
+	elif (status.completion != 100):
+		return "OFF1", LEDS_OFF
+	# If connected, complete and below target bed temp, then turn blue
+	elif ((status.completion == 100) and (status.bedDegC <= octoprint_printerStatus.COOLDOWN_DEGC)):
+		return "BLUE", LEDS_BLUE
+	# If connected and complete, then turn green
+	elif (status.completion == 100):
+		return "GREEN", LEDS_GREEN
+	# Catchall (should be invalid state)
+	else:
+		return "OFF2", LEDS_OFF
+
 #########################################################################
 # MAIN
 #########################################################################
@@ -20,96 +70,171 @@ def main():
 	parser.add_argument("-a", "--address", dest   = "address"   , help = "OctoPrint IP address if running GET/POST from another device on your network.")
 	parser.add_argument("-k", "--key"    , dest   = "api_key"   , help = "API KEY for HTTP GET or POST request.")
 	parser.add_argument("-v", "--verbose", action = "store_true", help = "Enable HTTP verbose option.")
+	parser.add_argument("-p", "--push"   , action = "store_true", help = "Follow the OctoPrint push API instead of polling.")
+	parser.add_argument("-n", "--leds"   , dest   = "leds"      , type = int  , default = 1   , help = "Number of LEDs in the chain.")
+	parser.add_argument("-f", "--fps"    , dest   = "fps"       , type = float, default = None, help = "Animate the LEDs (fades, blinking on error, progress bar on multi-LED chains) at this frame rate.")
+	parser.add_argument("-i", "--interval"       , dest = "interval"      , type = float, default = octoprint_printerStatus.POLL_INTERVAL, help = "Seconds between printer status polls.")
+	parser.add_argument("--connect-timeout"      , dest = "connectTimeout", type = float, default = octoprint_restapi.CONNECT_TIMEOUT    , help = "Seconds allowed to connect to OctoPrint.")
+	parser.add_argument("-t", "--timeout"        , dest = "timeout"       , type = float, default = octoprint_restapi.TOTAL_TIMEOUT      , help = "Seconds allowed for a whole status request.")
+	parser.add_argument("-s", "--stale"          , dest = "stale"         , type = float, default = 5.0                                  , help = "Treat the printer as disconnected when the next poll is overdue by more than this many seconds.")
+	parser.add_argument("-A", "--adaptive"       , action = "store_true"                                                                     , help = "Choose each poll interval from the printer state.")
+	parser.add_argument("-b", "--brightness"     , dest = "brightness"    , type = int  , default = LED_BRIGHTNESS                       , help = "LED brightness from 0 - 255.")
+	parser.add_argument("-g", "--gamma"          , dest = "gamma"         , type = float, default = LED_GAMMA                            , help = "LED gamma, such as 2.2 for even looking fades.")
+	parser.add_argument("-d", "--dither"         , action = "store_true"                                                                     , help = "Temporally dither dim levels (use with --fps).")
+	parser.add_argument("--min-interval"         , dest = "minInterval"   , type = float, default = octoprint_printerStatus.POLL_INTERVAL_MIN, help = "Shortest adaptive poll interval in seconds.")
+	parser.add_argument("--max-interval"         , dest = "maxInterval"   , type = float, default = octoprint_printerStatus.POLL_INTERVAL_MAX, help = "Longest adaptive poll interval in seconds.")
+	parser.add_argument("-m", "--max-body"       , dest = "maxBody"       , type = int  , default = None                                 , help = "Stream responses into reused buffers, refusing bodies over this many bytes or that are not JSON.")
+	parser.add_argument("--metrics-file"         , dest = "metricsFile"   , default = None                                               , help = "Write per-phase latency histograms to this Prometheus text file every loop.")
+	parser.add_argument("--metrics-port"         , dest = "metricsPort"   , type = int  , default = None                                 , help = "Serve per-phase latency histograms at http://localhost:PORT/metrics.")
 
 	# Parse the arguments
 	args         = parser.parse_args()
 	args.options = None
 
+	# Bound every request so a hung OctoPrint cannot stall the poller
+	octoprint_restapi.CLIENT.connectTimeout = args.connectTimeout
+	octoprint_restapi.CLIENT.timeout        = args.timeout
+
+	# Optionally bound the response size so a misbehaving server cannot exhaust memory
+	if (args.maxBody is not None):
+		octoprint_restapi.CLIENT.streaming = True
+		octoprint_restapi.CLIENT.maxBody   = args.maxBody
+
+	# Optionally record how long each phase of the loop takes
+	if ((args.metricsFile is not None) or (args.metricsPort is not None)):
+		metrics         = loopMetrics.Metrics()
+		decisionMetrics = metrics.histogram('ledstrip_decision_seconds'  , 'Time to choose the LED colour or effect from the status')
+		writeMetrics    = metrics.histogram('ledstrip_led_write_seconds' , 'Time to send a frame to the LEDs')
+		jitterMetrics   = metrics.histogram('ledstrip_loop_jitter_seconds', 'Difference between the render loop period and its 1 second target')
+		octoprint_restapi.CLIENT.metrics = metrics
+		if (args.metricsPort is not None):
+			metrics.serve(args.metricsPort)
+	else:
+		metrics = None
+
 	# Pass the data into the printer status class
-	printer = octoprint_printerStatus.PrinterStatus(args.address, args.api_key, args.options, args.verbose)
+	if (args.push): printer = octoprint_printerStatus.PushPrinterStatus(args.address, args.api_key, args.options, args.verbose)
+	else          : printer = octoprint_printerStatus.PrinterStatus    (args.address, args.api_key, args.options, args.verbose)
+	printer.metrics = metrics
 
 	# Construct the object
-	ledDriver = P9813(11, 15)
+	ledDriver = P9813(11, 15, args.leds, gamma = args.gamma, brightness = args.brightness, dither = args.dither)
 
         # Turn off LEDs at start
 	leds         = [ [0,0,0] ]
         ledDriver[0] = leds[0]
         ledDriver.write()
 
-	# Define color constants
-	#              [           R,            G,            B]
-	LED_STRENGTH = 100
-	LEDS_OFF     = [           0,            0,            0]
-	LEDS_RED     = [LED_STRENGTH,            0,            0]
-	LEDS_GREEN   = [           0, LED_STRENGTH,            0]
-	LEDS_BLUE    = [           0,            0, LED_STRENGTH]
-	LEDS_YELLOW  = [LED_STRENGTH, LED_STRENGTH,            0]
-	LEDS_MAGENTA = [LED_STRENGTH,            0, LED_STRENGTH]
-	LEDS_CYAN    = [           0, LED_STRENGTH, LED_STRENGTH]
-	LEDS_WHITE   = [LED_STRENGTH, LED_STRENGTH, LED_STRENGTH]
-
 	previouslyConnected = False
 
-	# Poll the printer for status
+	# Poll in a background thread, this loop only renders the latest status it published
+	if (args.adaptive): scheduler = octoprint_printerStatus.AdaptiveInterval(args.minInterval, args.maxInterval, args.interval)
+	else              : scheduler = None
+	poller = octoprint_printerStatus.StatusPoller(printer, args.interval, scheduler)
+	poller.start()
+
+	# Optionally animate the LEDs at a fixed frame rate, independent of the polling
+	engine      = None
+	shownEffect = None
+	shownColor  = LEDS_OFF
+	if (args.fps is not None):
+		engine = ledEffects.EffectEngine(ledDriver, args.fps)
+		engine.metrics = metrics
+		engine.start()
+
+	# Render the printer status
+	lastLoop = None
 	try:
 
 		while (True):
 
+			# Keep track of how far each loop strays from its period
+			loopStart = default_timer()
+			if ((metrics is not None) and (lastLoop is not None)):
+				jitterMetrics.observe(abs(loopStart - lastLoop - 1))
+			lastLoop = loopStart
+
+			# Take the latest status, a status the poller has not refreshed in time counts as a lost connection
+			taken, status = poller.getLatest()
+			age           = default_timer() - taken
+			connected     = ((status.connected) and (age <= poller.interval + args.stale))
+
+			if (len(status.toolDegC) > 0): tool0DegC = status.toolDegC[0]
+			else                         : tool0DegC = None
+
+			if (status.bedTrend is None): bedTrend = "-"
+			else                        : bedTrend = "%+.1f" % status.bedTrend
+
+			if (status.bedCooldownEta is None): cooldown = "-"
+			else                              : cooldown = "%.0f" % status.bedCooldownEta
+
 			# Print out status for debug
-			print("Is printer connected? "  + str(printer.isPrinterConnected()     )                                 )
-			print("Is print active? "       + str(printer.isPrintActive()          )                                 )
-			print("Error state: "           + str(printer.getErrorState()          )                                 )
-			print("Completion Percentage: " + str(printer.getCompletionPercentage())                                 )
-			print("Bed Temperature: "       + str(printer.getBedTemperatureDegC()  ) + " " + u'\N{DEGREE SIGN}' + "C")
-			print("Tool 0 Temperature: "    + str(printer.getTool0TemperatureDegC()) + " " + u'\N{DEGREE SIGN}' + "C")
-			print("LEDS: "                  + str(leds[0]                          )                                 )
+			print("Is printer connected? "  + str(connected        )                                 )
+			print("Is print active? "       + str(status.printing  )                                 )
+			print("Error state: "           + str(status.error     )                                 )
+			print("Completion Percentage: " + str(status.completion)                                 )
+			print("Bed Temperature: "       + str(status.bedDegC   ) + " " + u'\N{DEGREE SIGN}' + "C")
+			print("Tool 0 Temperature: "    + str(tool0DegC        ) + " " + u'\N{DEGREE SIGN}' + "C")
+			print("Bed Trend: "             + bedTrend                 + " " + u'\N{DEGREE SIGN}' + "C/min")
+			print("Bed Cooled Down In: "    + cooldown                 + " s"                          )
+			print("Status age: "            + ("%.1f" % age        ) + " s"                          )
+			print("LEDS: "                  + str(leds[0]          )                                 )
 			print("\r")
 
 			# Set led state based on printer state
+			decided       = default_timer()
+			name, leds[0] = statusColor(status, connected, previouslyConnected)
+			print(name)
 
-			# Only turn yellow if we lose connection unexpectedly
-			if ((printer.isPrinterConnected() == False) and (previouslyConnected == True)):
-				print("YELLOW")
-				leds[0] = LEDS_YELLOW
-			# If connected but we have an error, then turn red
-			elif (printer.getErrorState() is not None):
-				print("RED")
-				leds[0] = LEDS_RED
-			# If not complete then turn off LEDS
-			elif (printer.getCompletionPercentage() != 100):
-				print("OFF1")
-				leds[0] = LEDS_OFF
-			# If connected, complete and below target bed temp, then turn blue
-			elif ((printer.getCompletionPercentage() == 100) and (printer.getBedTemperatureDegC() <= 35.0)):
-				print("BLUE")
-				leds[0] = LEDS_BLUE
-			# If connected and complete, then turn green
-			elif (printer.getCompletionPercentage() == 100):
-				print("GREEN")
-				leds[0] = LEDS_GREEN
-                        # Catchall (should be invalid state)
-                        else:
-				print("OFF2")
-                                leds[0] = LEDS_OFF
-
-			# Update LEDs
-			ledDriver[0] = leds[0]
-			ledDriver.write()
+			# Update LEDs directly
+			if (engine is None):
+				ledDriver.fill(leds[0])
+				if (metrics is not None):
+					decisionMetrics.observe(default_timer() - decided)
+
+				written = default_timer()
+				ledDriver.write()
+				if (metrics is not None):
+					writeMetrics.observe(default_timer() - written)
+			# Or pick the effect for the state, fading between plain colours
+			else:
+				if   (leds[0] == LEDS_RED)                          : effect = 'blink'
+				elif ((status.printing) and (args.leds > 1))        : effect = 'progress'
+				else                                                : effect = tuple(leds[0])
+
+				if (effect != shownEffect):
+					if   (effect == 'blink')   : engine.setEffect(ledEffects.Blink(LEDS_RED))
+					elif (effect == 'progress'): engine.setEffect(ledEffects.ProgressBar(printer.getCompletionPercentage, LEDS_WHITE))
+					else:
+						engine.setEffect(ledEffects.Crossfade(shownColor, leds[0]))
+						shownColor = leds[0]
+					shownEffect = effect
+
+				if (metrics is not None):
+					decisionMetrics.observe(default_timer() - decided)
 
 			# Keep track of connection status
-			if (printer.isPrinterConnected()):
+			if (connected):
 				previouslyConnected = True
 
-			# Sleep for a while before trying again
-			time.sleep(1)
+			if (args.metricsFile is not None):
+				metrics.writeFile(args.metricsFile)
 
-			# Update the printer status
-			printer.update()
+			# Sleep for a while before rendering again
+			time.sleep(1)
 	except KeyboardInterrupt:
 		print("\r")
 	except:
 		pass
 
+	# Stop polling (bounded by the request timeout) and serving metrics
+	poller.stop()
+	if (metrics is not None):
+		metrics.close()
+	print("Failed polls: " + str(poller.errors))
+	if (scheduler is not None):
+		print("Polls: " + str(scheduler.polls) + ", requests saved per hour: " + ("%.0f" % scheduler.getRequestsSavedPerHour()))
+
 	print("Printing contents of previous result...")
 	print("Job Response Code: "     + `printer.getApiJobResponseCode()`)
 	print("Printer Response Code: " + `printer.getApiPrinterResponseCode()`)
@@ -118,9 +243,14 @@ def main():
 	print("Printer result string:")
 	print(printer.getApiPrinterResultString())
 
+	# Stop the animation and report the frame rate it managed
+	if (engine is not None):
+		engine.stop()
+		print("Effect statistics: " + str(engine.getStatistics()))
+
 	# Turn off LEDs before we quit
 	leds[0]      = LEDS_OFF
-	ledDriver[0] = leds[0]
+	ledDriver.fill(leds[0])
 	ledDriver.write()
 
 if __name__ == '__main__':
@@ -0,0 +1,232 @@
+import json
+import os
+import socket
+import struct
+import sys
+import time
+from StringIO import StringIO
+from argparse import ArgumentParser
+
+#########################################################################
+#  Usage Examples
+#########################################################################
+
+# Run the existing commands through octoprint_daemon.py when it is running (no pycurl or yaml import, warm connections, cached api key),
+# or in this process when it is not
+  #sudo python octoprint_client.py restapi get -c 'api/job'
+  #sudo python octoprint_client.py restapi post -c 'api/printer/sd' -d '{ "command": "init" }'
+  #sudo python octoprint_client.py restartSD -a 'http://192.168.1.234:80/' -k 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX'
+  #sudo python octoprint_client.py printerStatus -a 'http://192.168.1.234:80/' -k 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX'
+
+# Talk to the daemon itself
+  #sudo python octoprint_client.py ping
+  #sudo python octoprint_client.py leds 0 255 0      # hold the LEDs at a colour
+  #sudo python octoprint_client.py leds off          # show the printer status again
+  #sudo python octoprint_client.py shutdown
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Unix domain socket the daemon listens on, unless the environment variable names another. It is kept in a directory only the daemon's user can write,
+# so no other user can listen there first and collect the api keys sent along with the commands.
+DAEMON_SOCKET             = '/run/octoprint_ledstrip/daemon.sock'
+DAEMON_SOCKET_ENVIRONMENT = 'OCTOPRINT_DAEMON_SOCKET'
+
+# getsockopt option giving the pid, uid and gid of the process at the other end of a Unix socket (Linux, missing from the Python 2 socket module)
+SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17)
+
+# Scripts whose main() the daemon runs, by the name given on the command line
+SCRIPTS = {'restapi': 'octoprint_restapi', 'restartSD': 'octoprint_restartSD', 'printerStatus': 'octoprint_printerStatus'}
+
+# Seconds between status printouts when following the printer status
+STATUS_INTERVAL = 1
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class DaemonError(Exception):
+	''' The daemon accepted a request but did not answer it. The request may have run, so it is not run again in process. '''
+
+class UntrustedDaemonError(DaemonError):
+	''' The socket is served by another user, so nothing was sent to it '''
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def socketPath():
+	''' Return the daemon socket path '''
+	return os.environ.get(DAEMON_SOCKET_ENVIRONMENT, DAEMON_SOCKET)
+
+def peerUid(sock, path):
+	''' Return the user id of the process listening on a connected Unix socket, or of the socket file's owner where the kernel cannot say '''
+
+	if (sys.platform.startswith('linux')):
+		pid, uid, gid = struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, SO_PEERCRED, struct.calcsize('3i')))
+		return uid
+
+	return os.stat(path).st_uid
+
+def sendRequest(message, path = None):
+	''' Send one request (a dictionary with a function and its arguments) to the daemon and return its reply.
+	    Raises socket.error if no daemon is listening, UntrustedDaemonError if another user is listening, and DaemonError if the daemon stops answering after taking the request. '''
+
+	path = path or socketPath()
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		sock.connect(path)
+
+		# The arguments can hold an api key, so only talk to a daemon running as this user
+		uid = peerUid(sock, path)
+		if (uid != os.geteuid()):
+			raise UntrustedDaemonError(path + " is served by user " + str(uid) + ", not " + str(os.geteuid()) + ", so nothing was sent")
+
+		try:
+			sock.sendall(json.dumps(message) + '\n')
+			line = sock.makefile('r').readline()
+		except socket.error as exc:
+			raise DaemonError(str(exc))
+	finally:
+		sock.close()
+
+	if (line == ''):
+		raise DaemonError("The daemon closed the connection")
+	return json.loads(line)
+
+def exitCode(exc):
+	''' Return the exit status of a SystemExit, like the interpreter would (a message is printed to stderr and counts as 1) '''
+
+	if (exc.code is None):
+		return 0
+	if (isinstance(exc.code, int)):
+		return exc.code
+
+	sys.stderr.write(str(exc.code) + '\n')
+	return 1
+
+def forward(script, argv, path = None):
+	''' Run a script's main() with these arguments in the daemon and pass on its output. Returns the exit status. '''
+
+	# A batch read from stdin has to be sent along
+	stdin = None
+	if ((script == 'restapi') and ('batch' in argv) and ('-f' not in argv) and ('--file' not in argv)):
+		stdin = sys.stdin.read()
+
+	try:
+		reply = sendRequest({'function': 'run', 'script': script, 'argv': argv, 'stdin': stdin}, path)
+	except socket.error:
+		# Leave the batch for the fallback to read
+		if (stdin is not None):
+			sys.stdin = StringIO(stdin)
+		raise
+	if (reply['ok'] == False):
+		sys.stderr.write(reply['error'] + '\n')
+		return 1
+
+	sys.stdout.write(reply['stdout'])
+	sys.stderr.write(reply['stderr'])
+	return reply['code']
+
+def followStatus(argv, path = None):
+	''' Print the printer status kept by the daemon every STATUS_INTERVAL seconds, like octoprint_printerStatus.py, until interrupted. Returns the exit status. '''
+
+	# Only the printer is needed, the daemon chooses how to poll it
+	parser = ArgumentParser()
+	parser.add_argument("-a", "--address", dest = "address", help = "OctoPrint IP address if running GET/POST from another device on your network.")
+	parser.add_argument("-k", "--key"    , dest = "api_key", help = "API KEY for HTTP GET or POST request.")
+	args, ignored = parser.parse_known_args(argv)
+
+	status = None
+	try:
+		while (True):
+			reply = sendRequest({'function': 'status', 'address': args.address, 'api_key': args.api_key}, path)
+			if (reply['ok'] == False):
+				sys.stderr.write(reply['error'] + '\n')
+				return 1
+			status = reply['status']
+
+			if (len(status['toolDegC']) > 0): tool0DegC = status['toolDegC'][0]
+			else                            : tool0DegC = None
+
+			print("Is printer connected? "  + str(status['connected']     )                                 )
+			print("Is print active? "       + str(status['printing']      )                                 )
+			print("Error state: "           + str(status['error']         )                                 )
+			print("Completion Percentage: " + str(status['completion']    )                                 )
+			print("Bed Temperature: "       + str(status['bedDegC']       ) + " " + u'\N{DEGREE SIGN}' + "C")
+			print("Tool 0 Temperature: "    + str(tool0DegC               ) + " " + u'\N{DEGREE SIGN}' + "C")
+			print("Bed Trend: "             + str(status['bedTrend']      ) + " " + u'\N{DEGREE SIGN}' + "C/min")
+			print("Bed Cooled Down In: "    + str(status['bedCooldownEta']) + " s"                          )
+			print("Status age: "            + ("%.1f" % status['age']     ) + " s"                          )
+			print("\r")
+
+			time.sleep(STATUS_INTERVAL)
+	except KeyboardInterrupt:
+		print("\r")
+		if (status is not None):
+			print("Printing contents of previous result...")
+			print("Job Response Code: "     + repr(status['apiJobResponseCode'])    )
+			print("Printer Response Code: " + repr(status['apiPrinterResponseCode']))
+
+	return 0
+
+def runInProcess(script, argv):
+	''' Run a script's main() in this process, as if it had been started directly. Returns the exit status. '''
+
+	module   = __import__(SCRIPTS[script])
+	sys.argv = [module.__file__] + list(argv)
+	try:
+		module.main()
+	except SystemExit as exc:
+		return exitCode(exc)
+
+	return 0
+
+#########################################################################
+#  MAIN
+#########################################################################
+def main():
+	''' Forward a command to the daemon, falling back to running it in this process when no daemon is running '''
+
+	if ((len(sys.argv) < 2) or (sys.argv[1] not in list(SCRIPTS) + ['ping', 'leds', 'shutdown'])):
+		print("Usage: octoprint_client.py {" + ",".join(sorted(SCRIPTS)) + "} [script arguments]")
+		print("       octoprint_client.py {ping,shutdown} | leds (R G B | off)")
+		sys.exit(2)
+
+	command, argv = sys.argv[1], sys.argv[2:]
+
+	# Requests only the daemon can answer
+	if (command in ('ping', 'leds', 'shutdown')):
+		message = {'function': command}
+		if (command == 'leds'):
+			if (argv == ['off']): message['color'] = None
+			else                : message['color'] = [int(value) for value in argv]
+		try:
+			reply = sendRequest(message)
+		except socket.error as exc:
+			print("No daemon is listening on " + socketPath() + ": " + str(exc))
+			sys.exit(1)
+		except DaemonError as exc:
+			print(str(exc))
+			sys.exit(1)
+		print(json.dumps(reply))
+		sys.exit(int(reply['ok'] == False))
+
+	# Everything else falls back to this process when no daemon is listening
+	try:
+		if (command == 'printerStatus'): code = followStatus(argv)
+		else                           : code = forward(command, argv)
+	except socket.error:
+		code = runInProcess(command, argv)
+	except UntrustedDaemonError as exc:
+		sys.stderr.write(str(exc) + '\n')
+		code = 1
+	except DaemonError as exc:
+		sys.stderr.write("The daemon did not answer: " + str(exc) + '\n')
+		code = 1
+
+	sys.exit(code)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,333 @@
+import octoprint_LED_PWM_displayPrinterStatus as display
+import octoprint_client
+import octoprint_printerStatus
+import octoprint_restapi
+import SocketServer
+import json
+import os
+import socket
+import sys
+import threading
+import traceback
+from StringIO import StringIO
+from argparse import ArgumentParser
+from timeit import default_timer
+from P9813 import P9813
+
+#########################################################################
+#  Usage Examples
+#########################################################################
+
+# 1. Keep the connections, api key and printer status warm, and show the status on a 1 LED chain
+  #sudo python octoprint_daemon.py -a 'http://192.168.1.234:80/' -k 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX' -n 1
+
+# 2. Then run the usual commands through it (see octoprint_client.py)
+  #sudo python octoprint_client.py restapi get -c 'api/job'
+
+# Protocol: one json object per line each way over the Unix domain socket (octoprint_client.DAEMON_SOCKET)
+  #{"function": "ping"}                                                  -> {"ok": true, "pid": ..., "requests": ..., "printers": [...]}
+  #{"function": "run", "script": "restapi", "argv": [...], "stdin": ...} -> {"ok": true, "code": 0, "stdout": "...", "stderr": "..."}
+  #{"function": "status", "address": ..., "api_key": ...}                -> {"ok": true, "status": {snapshot fields..., "age": seconds}}
+  #{"function": "leds", "color": [r, g, b]}                              -> {"ok": true} (null shows the printer status again)
+  #{"function": "shutdown"}                                              -> {"ok": true}
+  # A request that fails is answered with {"ok": false, "error": "..."}
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Scripts the run request may execute
+RUN_SCRIPTS = ('restapi', 'restartSD')
+
+# Treat the printer as disconnected on the LEDs when its status is this many seconds older than the poll interval
+STALE_SECONDS = 5.0
+
+# Stop polling a printer that has not been asked about for this many seconds, and poll at most this many printers (the least recently asked about is stopped first)
+POLLER_IDLE_SECONDS = 600.0
+MAX_POLLERS         = 16
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class DaemonServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+	''' Unix domain socket server with a thread per connection, so a client following the status does not hold up others '''
+	daemon_threads = True
+
+	def handle_error(self, request, client_address):
+		''' Report a failed connection on the daemon's own stderr, as sys.stdout and sys.stderr may be collecting a script's output for a reply (see Daemon.run) '''
+		traceback.print_exc(file = sys.__stderr__)
+
+class DaemonHandler(SocketServer.StreamRequestHandler):
+	''' Answer each json request line of a connection with a json reply line '''
+
+	def handle(self):
+		while (True):
+			line = self.rfile.readline()
+			if (line == ''):
+				break
+
+			self.wfile.write(json.dumps(self.server.daemon.handle(line)) + '\n')
+			self.wfile.flush()
+
+class Daemon:
+	''' Long running owner of the warm HTTP connections (octoprint_restapi.CLIENT), the cached api keys, a status poller per printer asked about and optionally
+	    the P9813 driver, serving octoprint_client requests on a Unix domain socket '''
+
+	def __init__(self, path = None, ledDriver = None, interval = octoprint_printerStatus.POLL_INTERVAL):
+		self.path      = path or octoprint_client.socketPath()
+		self.ledDriver = ledDriver
+		self.interval  = interval
+		self.server    = None
+		self.requests  = 0
+
+		# Scripts run in this process swap sys.argv, sys.stdin and sys.stdout, so only one runs at a time
+		self.runLock = threading.Lock()
+
+		# (address, api_key) -> StatusPoller, created by the first status request for a printer, and the time each was last asked about (see evictPollers)
+		self.pollers     = {}
+		self.asked       = {}
+		self.pollersLock = threading.Lock()
+
+		# Colour held on the LEDs by a leds request, None to show the printer status
+		self.color   = None
+		self.stopped = threading.Event()
+
+	def start(self):
+		''' Listen on the socket, in a directory only this user may write (created if missing). A socket file left in the way by a daemon that is no longer
+		    running, or bound by another user, is replaced. '''
+
+		# Commands carry api keys, so no other user may create the socket first
+		directory = os.path.dirname(os.path.abspath(self.path))
+		if (os.path.isdir(directory) == False):
+			os.makedirs(directory, 0o700)
+		info = os.stat(directory)
+		if ((info.st_uid != os.geteuid()) or (info.st_mode & 0o022)):
+			raise RuntimeError(directory + " must belong to this user and not be writable by others")
+
+		# Only a daemon of this user answering counts as running (the client refuses to talk to any other)
+		if (os.path.lexists(self.path)):
+			try:
+				octoprint_client.sendRequest({'function': 'ping'}, self.path)
+				raise RuntimeError("A daemon is already listening on " + self.path)
+			except (socket.error, octoprint_client.DaemonError):
+				os.unlink(self.path)
+
+		# Only the owner (root when run with sudo) may send commands, from the moment the socket exists
+		umask = os.umask(0o177)
+		try:
+			self.server = DaemonServer(self.path, DaemonHandler)
+		finally:
+			os.umask(umask)
+		self.server.daemon = self
+
+		thread = threading.Thread(target = self.server.serve_forever)
+		thread.daemon = True
+		thread.start()
+
+	def stop(self):
+		''' Stop listening and polling '''
+
+		self.stopped.set()
+		if (self.server is not None):
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+			if (os.path.exists(self.path)):
+				os.unlink(self.path)
+
+		for poller in self.pollers.values():
+			poller.stop()
+
+	def handle(self, line):
+		''' Answer one request line, returning the reply dictionary '''
+
+		self.requests += 1
+		try:
+			message  = json.loads(line)
+			function = message.get('function')
+
+			if   (function == 'ping')    : return {'ok': True, 'pid': os.getpid(), 'requests': self.requests, 'printers': [address for address, api_key in self.pollers.keys()]}
+			elif (function == 'run')     : return self.run(message.get('script'), message.get('argv') or [], message.get('stdin'))
+			elif (function == 'status')  : return self.status(message.get('address'), message.get('api_key'))
+			elif (function == 'leds')    : return self.setColor(message.get('color'))
+			elif (function == 'shutdown'):
+				self.stopped.set()
+				return {'ok': True}
+			else:
+				return {'ok': False, 'error': "Unknown function " + repr(function)}
+		except SystemExit as exc:
+			return {'ok': False, 'error': "Exited with " + repr(exc.code)}
+		except Exception as exc:
+			return {'ok': False, 'error': str(exc)}
+
+	def run(self, script, argv, stdin = None):
+		''' Run a script's main() with these arguments in this process, collecting its output and exit status.
+		    The scripts print to sys.stdout and sys.stderr, which are swapped for the whole process while one runs, so anything else printed meanwhile would land
+		    in its reply. The daemon's other threads therefore do not print: pollers keep their errors in a count and the server reports on sys.__stderr__. '''
+
+		if (script not in RUN_SCRIPTS):
+			return {'ok': False, 'error': "Only " + ", ".join(RUN_SCRIPTS) + " can be run"}
+		module = __import__(octoprint_client.SCRIPTS[script])
+
+		stdout = StringIO()
+		stderr = StringIO()
+		with self.runLock:
+			# Arguments such as --max-body change the shared client, so put it back afterwards
+			saved  = (sys.argv, sys.stdin, sys.stdout, sys.stderr, octoprint_restapi.CLIENT.streaming, octoprint_restapi.CLIENT.maxBody)
+			code   = 0
+			try:
+				sys.argv   = [module.__file__] + list(argv)
+				sys.stdin  = StringIO(stdin or '')
+				sys.stdout = stdout
+				sys.stderr = stderr
+				module.main()
+			except SystemExit as exc:
+				code = octoprint_client.exitCode(exc)
+			except Exception:
+				traceback.print_exc()
+				code = 1
+			finally:
+				sys.argv, sys.stdin, sys.stdout, sys.stderr, octoprint_restapi.CLIENT.streaming, octoprint_restapi.CLIENT.maxBody = saved
+
+		return {'ok': True, 'code': code, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+	def status(self, address = None, api_key = None):
+		''' Return the latest status of a printer, starting a poller for it the first time it is asked about '''
+
+		if (address is None): address = octoprint_restapi.OCTOPRINT_ADDRESS
+		if (api_key is None): api_key = octoprint_restapi.READ_API_KEY(octoprint_restapi.USERNAME)
+
+		taken, snapshot = self.poller(address, api_key).getLatest()
+
+		fields        = snapshot._asdict()
+		fields['age'] = default_timer() - taken
+		return {'ok': True, 'status': fields}
+
+	def poller(self, address, api_key):
+		''' Return the StatusPoller of a printer, creating it (and getting its first status) if needed '''
+
+		with self.pollersLock:
+			key = (address, api_key)
+			if (key not in self.pollers):
+				poller = octoprint_printerStatus.StatusPoller(octoprint_printerStatus.PrinterStatus(address, api_key), self.interval)
+				poller.start()
+				self.pollers[key] = poller
+			self.asked[key] = default_timer()
+			poller          = self.pollers[key]
+
+		# A new printer may take the place of the least recently asked about
+		self.evictPollers()
+		return poller
+
+	def evictPollers(self):
+		''' Stop the pollers of printers not asked about for POLLER_IDLE_SECONDS, and of the least recently asked about beyond MAX_POLLERS. Returns how many were stopped. '''
+
+		with self.pollersLock:
+			now     = default_timer()
+			byAge   = sorted(self.asked, key = self.asked.get)
+			evicted = [key for key in byAge if (now - self.asked[key] > POLLER_IDLE_SECONDS)]
+			kept    = [key for key in byAge if (key not in evicted)]
+			evicted = evicted + kept[:max(0, len(kept) - MAX_POLLERS)]
+
+			pollers = []
+			for key in evicted:
+				pollers.append(self.pollers.pop(key))
+				del self.asked[key]
+
+		# Do not hold up the caller for a request in progress, the poller's thread ends after it
+		for poller in pollers:
+			poller.stop(wait = False)
+
+		return len(pollers)
+
+	def setColor(self, color):
+		''' Hold the LEDs at a colour, or show the printer status again (None) '''
+
+		if (self.ledDriver is None):
+			return {'ok': False, 'error': "The daemon has no LEDs"}
+		if ((color is not None) and ((len(color) != 3) or (min(color) < 0) or (max(color) > 255))):
+			return {'ok': False, 'error': "A colour is 3 values from 0 - 255"}
+
+		self.color = color
+		return {'ok': True}
+
+	def serve(self, address = None, api_key = None):
+		''' Show the status of the given printer (or just a colour held by a leds request) on the LEDs until shut down '''
+
+		previouslyConnected = False
+		if (self.ledDriver is not None):
+			address = address or octoprint_restapi.OCTOPRINT_ADDRESS
+			api_key = api_key or octoprint_restapi.READ_API_KEY(octoprint_restapi.USERNAME)
+
+		while (self.stopped.is_set() == False):
+			if (self.ledDriver is not None):
+				# Asking for the poller every time keeps the printer shown on the LEDs from being evicted
+				poller        = self.poller(address, api_key)
+				taken, status = poller.getLatest()
+				connected     = ((status.connected) and (default_timer() - taken <= poller.interval + STALE_SECONDS))
+
+				if (self.color is not None): color = list(self.color)
+				else                       : name, color = display.statusColor(status, connected, previouslyConnected)
+
+				# Only changed LEDs are sent
+				self.ledDriver.fill(color)
+				self.ledDriver.write()
+
+				if (connected):
+					previouslyConnected = True
+			else:
+				self.evictPollers()
+
+			self.stopped.wait(self.interval)
+
+#########################################################################
+#  MAIN
+#########################################################################
+def main():
+	''' Run the daemon until a shutdown request or Ctrl-C '''
+
+	# Declare input arguments
+	parser = ArgumentParser()
+	parser.add_argument("-a", "--address"        , dest = "address"       , help = "OctoPrint IP address of the printer shown on the LEDs.")
+	parser.add_argument("-k", "--key"            , dest = "api_key"       , help = "API KEY of the printer shown on the LEDs.")
+	parser.add_argument("-s", "--socket"         , dest = "socket"        , default = None                                                , help = "Unix domain socket to listen on (default " + octoprint_client.DAEMON_SOCKET + " or $" + octoprint_client.DAEMON_SOCKET_ENVIRONMENT + ").")
+	parser.add_argument("-n", "--leds"           , dest = "leds"          , type = int  , default = None                                  , help = "Number of LEDs in the chain (no LEDs are driven without it).")
+	parser.add_argument("-i", "--interval"       , dest = "interval"      , type = float, default = octoprint_printerStatus.POLL_INTERVAL , help = "Seconds between printer status polls.")
+	parser.add_argument("--connect-timeout"      , dest = "connectTimeout", type = float, default = octoprint_restapi.CONNECT_TIMEOUT     , help = "Seconds allowed to connect to OctoPrint.")
+	parser.add_argument("-t", "--timeout"        , dest = "timeout"       , type = float, default = octoprint_restapi.TOTAL_TIMEOUT       , help = "Seconds allowed for a whole status request.")
+	parser.add_argument("-b", "--brightness"     , dest = "brightness"    , type = int  , default = display.LED_BRIGHTNESS                , help = "LED brightness from 0 - 255.")
+	parser.add_argument("-g", "--gamma"          , dest = "gamma"         , type = float, default = display.LED_GAMMA                     , help = "LED gamma.")
+
+	# Parse the arguments
+	args = parser.parse_args()
+
+	octoprint_restapi.CLIENT.connectTimeout = args.connectTimeout
+	octoprint_restapi.CLIENT.timeout        = args.timeout
+
+	# The LEDs are only driven when asked for, so the daemon also runs without them
+	if (args.leds is not None):
+		ledDriver = P9813(11, 15, args.leds, gamma = args.gamma, brightness = args.brightness)
+		ledDriver.fill(display.LEDS_OFF)
+		ledDriver.write()
+	else:
+		ledDriver = None
+
+	daemon = Daemon(args.socket, ledDriver, args.interval)
+	daemon.start()
+	print("Listening on " + daemon.path)
+
+	try:
+		daemon.serve(args.address, args.api_key)
+	except KeyboardInterrupt:
+		print("\r")
+
+	daemon.stop()
+
+	# Turn off LEDs before we quit
+	if (ledDriver is not None):
+		ledDriver.fill(display.LEDS_OFF)
+		ledDriver.write()
+
+if __name__ == '__main__':
+	main()
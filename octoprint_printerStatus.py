@@ -1,8 +1,12 @@
 import octoprint_restapi
-import copy
 import json
+import math
+import threading
 import time
 from argparse import ArgumentParser
+from array import array
+from collections import Mapping, Sequence, namedtuple
+from timeit import default_timer
 
 #########################################################################
 #  Usage Example
@@ -10,21 +14,329 @@ from argparse import ArgumentParser
 
 # sudo python octoprint_printerStatus.py -a 'http://192.168.1.234:80/' -k 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX'
 
+# Follow the push API instead of polling (sudo pip install websocket-client)
+# sudo python octoprint_printerStatus.py -a 'http://192.168.1.234:80/' -k 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX' -p
+
+# Check push mode against a stand-in OctoPrint replaying recorded push sessions (see octoprint_pushReplay.py)
+# python octoprint_pushReplay.py
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Seconds to wait before reconnecting the push websocket
+PUSH_RECONNECT_DELAY = 5
+
+# Seconds without a push message before the websocket is treated as dropped
+PUSH_TIMEOUT = 30
+
+# Seconds between polls of the status poller thread
+POLL_INTERVAL = 1
+
+# Most requests a FleetStatus keeps in flight at once
+FLEET_MAX_ACTIVE = 16
+
+# Bounds of the adaptive poll interval in seconds
+POLL_INTERVAL_MIN = 0.5
+POLL_INTERVAL_MAX = 60
+
+# Bed temperature at which a finished print counts as cooled down
+COOLDOWN_DEGC = 35.0
+
+# Temperature samples kept per heater for the trend and time to temperature estimates, the room temperature a heater cools towards,
+# and the least it counts as above it (the cooling fit takes the log of the difference)
+TEMPERATURE_HISTORY_SIZE = 120
+AMBIENT_DEGC             = 20.0
+AMBIENT_MARGIN_DEGC      = 0.5
+
+# Completion percentage from which a print counts as nearly finished
+NEAR_COMPLETE_PERCENT = 95
+
+# Seconds to keep polling quickly after an error appears
+ERROR_FAST_PERIOD = 30
+
 #########################################################################
 #  CLASSES
 #########################################################################
 
+class DictView(Mapping):
+	''' Read-only view of a (nested) result dictionary, so callers can look without copying '''
+
+	__slots__ = ('_data',)
+
+	def __init__(self, data):
+		self._data = data
+
+	def __getitem__(self, key):
+		return readOnlyView(self._data[key])
+
+	def __iter__(self):
+		return iter(self._data)
+
+	def __len__(self):
+		return len(self._data)
+
+	def __repr__(self):
+		return repr(self._data)
+
+class ListView(Sequence):
+	''' Read-only view of a list inside a result dictionary '''
+
+	__slots__ = ('_data',)
+
+	def __init__(self, data):
+		self._data = data
+
+	def __getitem__(self, index):
+		if (isinstance(index, slice)): return ListView(self._data[index])
+		else                         : return readOnlyView(self._data[index])
+
+	def __len__(self):
+		return len(self._data)
+
+	def __repr__(self):
+		return repr(self._data)
+
+class TemperatureRing:
+	''' Fixed-size ring buffer of the (time, temperature) samples of one heater, kept in two array('f') so its memory never grows.
+	    Running sums over the samples give a linear trend and an exponential (Newton's law of cooling) fit in O(1). '''
+
+	def __init__(self, size = TEMPERATURE_HISTORY_SIZE, ambient = AMBIENT_DEGC):
+		self.size    = size
+		self.ambient = ambient
+		self.times   = array('f', [0.0]) * size
+		self.temps   = array('f', [0.0]) * size
+		self.clear()
+
+	def clear(self):
+		''' Forget every sample '''
+
+		self.count  = 0
+		self.next   = 0
+		self.added  = 0
+		self.origin = None
+
+		# Running sums of t, y, t*t, t*y, l and t*l, where t is the time since origin, y the temperature and l = log(y - ambient)
+		self.st  = 0.0
+		self.sy  = 0.0
+		self.stt = 0.0
+		self.sty = 0.0
+		self.sl  = 0.0
+		self.stl = 0.0
+
+	def add(self, time, degC):
+		''' Add a sample, replacing the oldest once the ring is full. A missing temperature (None) starts the history again. '''
+
+		if (degC is None):
+			self.clear()
+			return
+
+		if (self.origin is None):
+			self.origin = time
+
+		# Take the sample about to be overwritten out of the sums
+		i = self.next
+		if (self.count == self.size): self._sum(self.times[i], self.temps[i], -1.0)
+		else                        : self.count += 1
+
+		# Store before summing, so the sums use the same single precision values that are taken out later
+		self.times[i] = time - self.origin
+		self.temps[i] = degC
+		self._sum(self.times[i], self.temps[i], 1.0)
+		self.next = (i + 1) % self.size
+
+		# Every size samples, move the origin up to the oldest sample and add the sums up again, so the times stay small and rounding errors do not build up
+		self.added += 1
+		if (self.added >= self.size):
+			self._rebase()
+
+	def latest(self):
+		''' Return the (time, temperature) of the newest sample, or None if there are none '''
+		if (self.count == 0):
+			return None
+		i = (self.next - 1) % self.size
+		return self.origin + self.times[i], self.temps[i]
+
+	def trend(self):
+		''' Return the temperature trend in degrees C per minute over the samples held, or None with fewer than 2 samples '''
+		slope = self._slope(self.sy, self.sty)
+		if (slope is None): return None
+		else              : return slope * 60
+
+	def timeTo(self, degC):
+		''' Return the estimated seconds from the newest sample until the heater reaches degC (the cooling fit when above it, the linear trend when below),
+		    or None if it is not heading there '''
+
+		if (self.count == 0):
+			return None
+
+		i = (self.next - 1) % self.size
+		t = self.times[i]
+		y = self.temps[i]
+		if (y == degC):
+			return 0.0
+
+		# Cooling: y - ambient = exp(a + b*t), which never gets down to the ambient temperature
+		if (y > degC):
+			b = self._slope(self.sl, self.stl)
+			if ((b is None) or (b >= 0) or (degC - self.ambient < AMBIENT_MARGIN_DEGC)):
+				return None
+			a   = (self.sl - b * self.st) / self.count
+			eta = (math.log(degC - self.ambient) - a) / b - t
+		# Heating: y = a + b*t
+		else:
+			b = self._slope(self.sy, self.sty)
+			if ((b is None) or (b <= 0)):
+				return None
+			a   = (self.sy - b * self.st) / self.count
+			eta = (degC - a) / b - t
+
+		return max(eta, 0.0)
+
+	def _slope(self, sv, stv):
+		''' Least squares slope of a value against time, from the sums of the value and of time * value '''
+		denominator = self.count * self.stt - self.st * self.st
+		if ((self.count < 2) or (denominator <= 0)):
+			return None
+		return (self.count * stv - self.st * sv) / denominator
+
+	def _sum(self, t, y, sign):
+		''' Add (sign 1) or take out (sign -1) a sample from the running sums '''
+		l = math.log(max(y - self.ambient, AMBIENT_MARGIN_DEGC))
+		self.st  += sign * t
+		self.sy  += sign * y
+		self.stt += sign * t * t
+		self.sty += sign * t * y
+		self.sl  += sign * l
+		self.stl += sign * t * l
+
+	def _rebase(self):
+		''' Make the oldest sample time zero and add the sums up again '''
+
+		first  = (self.next - self.count) % self.size
+		oldest = self.times[first]
+
+		self.st = self.sy = self.stt = self.sty = self.sl = self.stl = 0.0
+		for k in range(self.count):
+			i = (first + k) % self.size
+			self.times[i] -= oldest
+			self._sum(self.times[i], self.temps[i], 1.0)
+
+		self.origin += oldest
+		self.added   = 0
+
+class TemperatureHistory:
+	''' Temperature rings of the bed and each tool of one printer '''
+
+	def __init__(self, size = TEMPERATURE_HISTORY_SIZE, ambient = AMBIENT_DEGC):
+		self.size    = size
+		self.ambient = ambient
+		self.bed     = TemperatureRing(size, ambient)
+		self.tools   = []
+
+	def add(self, time, bedDegC, toolDegC):
+		''' Add the bed temperature and the tuple of tool temperatures taken at time '''
+
+		self.bed.add(time, bedDegC)
+
+		while (len(self.tools) < len(toolDegC)):
+			self.tools.append(TemperatureRing(self.size, self.ambient))
+		for i, ring in enumerate(self.tools):
+			if (i < len(toolDegC)): ring.add(time, toolDegC[i])
+			else                  : ring.clear()
+
+class StatusSnapshot(namedtuple('StatusSnapshot', ['apiJobResponseCode', 'apiJobResult', 'apiJobResultDictionary',
+                                                   'apiPrinterResponseCode', 'apiPrinterResult', 'apiPrinterResultDictionary',
+                                                   'connected', 'printing', 'error', 'completion', 'bedDegC', 'chamberDegC', 'toolDegC',
+                                                   'bedTrend', 'toolTrend', 'bedCooldownEta'])):
+	''' Immutable status with every field extracted once. toolDegC is a tuple of actual temperatures indexed by tool number (None if missing).
+	    bedTrend and toolTrend are in degrees C per minute and bedCooldownEta is the estimated seconds until the bed is down to COOLDOWN_DEGC (None without a history). '''
+
+	__slots__ = ()
+
+	@classmethod
+	def fromResults(cls, jobResponseCode, jobResult, jobDictionary, printerResponseCode, printerResult, printerDictionary, history = None, time = None, record = True):
+		''' Extract the status from the api/job and api/printer results. With a TemperatureHistory, the temperatures (taken at time, default now) are added to it and the trends come from it.
+		    Leave record False for temperatures already added, such as a cached response or a push message without a new sample. '''
+
+		connected   = False
+		printing    = False
+		error       = None
+		completion  = None
+		bedDegC     = None
+		chamberDegC = None
+		toolDegC    = ()
+
+		# Connection and error state come from the job state
+		if ((jobResponseCode == 200) and (jobDictionary is not None) and ('state' in jobDictionary)):
+			state     = jobDictionary['state']
+			connected = (state.startswith("Offline") == False)
+			if (state.startswith("Error")):
+				error = state.replace("Error: ", "")
+
+		if (connected):
+			# Completion comes from the job progress
+			progress = jobDictionary.get('progress')
+			if ((progress is not None) and ('completion' in progress)):
+				completion = progress['completion']
+
+			if ((printerResponseCode == 200) and (printerDictionary is not None)):
+				# Printing flag comes from the printer state
+				flags = (printerDictionary.get('state') or {}).get('flags')
+				if ((flags is not None) and ('printing' in flags)):
+					printing = flags['printing']
+
+				# After serial connection, octoprint returns an empty dictionary for temperature, so we must test that keys exist.
+				# A printer without a heated bed or chamber reports that section as null.
+				temperature = printerDictionary.get('temperature') or {}
+				bedDegC     = (temperature.get('bed'    ) or {}).get('actual')
+				chamberDegC = (temperature.get('chamber') or {}).get('actual')
+
+				tools = {}
+				for name in temperature:
+					if ((name.startswith('tool')) and (name[4:].isdigit())):
+						tools[int(name[4:])] = (temperature[name] or {}).get('actual')
+				if (len(tools) != 0):
+					toolDegC = tuple(tools.get(i) for i in range(max(tools) + 1))
+
+		bedTrend       = None
+		toolTrend      = ()
+		bedCooldownEta = None
+		if (history is not None):
+			if (time is None):
+				time = default_timer()
+			if (record):
+				history.add(time, bedDegC, toolDegC)
+
+			bedTrend  = history.bed.trend()
+			toolTrend = tuple(ring.trend() for ring in history.tools[:len(toolDegC)])
+			if ((bedDegC is not None) and (bedDegC <= COOLDOWN_DEGC)): bedCooldownEta = 0.0
+			else                                                     : bedCooldownEta = history.bed.timeTo(COOLDOWN_DEGC)
+
+		return cls(jobResponseCode, jobResult, jobDictionary, printerResponseCode, printerResult, printerDictionary,
+		           connected, printing, error, completion, bedDegC, chamberDegC, toolDegC, bedTrend, toolTrend, bedCooldownEta)
+
 class PrinterStatus:
 	''' Parse printer status from input data. '''
 
-	def __init__(self, address = None, api_key = None, options = None, verbose = None):
-		''' Save input options and call update routine '''
+	# Optional loopMetrics.Metrics to record the JSON parse time of each update in
+	metrics = None
+
+	def __init__(self, address = None, api_key = None, options = None, verbose = None, cache = None):
+		''' Save input options and call update routine. Optionally poll through an octoprint_restapi.ResponseCache (see statusCache). '''
 
 		# Save input options
 		self.address = address
 		self.api_key = api_key
 		self.options = options
 		self.verbose = verbose
+		self.cache   = cache
+
+		# Recent bed and tool temperatures, for the trends and cooldown estimate
+		self.history = TemperatureHistory()
+
+		# The api/printer result the latest temperatures were added from (see isNewSample)
+		self.sampledResult = None
 
 		# Update internal veriables by performing GET requests
 		self.update()
@@ -32,114 +344,545 @@ class PrinterStatus:
 	def update(self):
 		''' Update internal variables by performing GET requests '''
 
-		# Get the printer status
-		self.apiJobResponseCode    , self.apiJobResult     = octoprint_restapi.REST_API_GET('api/job'    , self.address, self.api_key, self.options, self.verbose)
-		self.apiPrinterResponseCode, self.apiPrinterResult = octoprint_restapi.REST_API_GET('api/printer', self.address, self.api_key, self.options, self.verbose)
+		# Get the job and printer status at the same time
+		(apiJobResponseCode, apiJobResult), (apiPrinterResponseCode, apiPrinterResult) = octoprint_restapi.REST_API_GET_MULTI(['api/job', 'api/printer'], self.address, self.api_key, self.options, self.verbose, self.cache)
+
+		# Create job and printer result dictionaries from result strings
+		start                      = default_timer()
+		apiJobResultDictionary     = parseResult(apiJobResult)
+		apiPrinterResultDictionary = parseResult(apiPrinterResult)
+		if (self.metrics is not None):
+			observeParseTime(self.metrics, default_timer() - start)
+
+		# Only commit the results once both requests have completed, so that they always match
+		self.snapshot = StatusSnapshot.fromResults(apiJobResponseCode, apiJobResult, apiJobResultDictionary, apiPrinterResponseCode, apiPrinterResult, apiPrinterResultDictionary, self.history,
+		                                           record = self.isNewSample(apiPrinterResult))
+
+	def isNewSample(self, apiPrinterResult):
+		''' Return False if the temperatures of this api/printer result were already added to the history. A ResponseCache hit or 304 hands back the very
+		    result string it stored, while every download is a new string (even with the same temperatures, which are then a new sample). '''
 
-		# Create job result dictionary from result string
-		if (self.apiJobResult[0] == '{'): self.apiJobResultDictionary = json.loads(self.apiJobResult)
-		else                            : self.apiJobResultDictionary = None
+		new                = (apiPrinterResult is not self.sampledResult)
+		self.sampledResult = apiPrinterResult
+		return new
 
-		# Create printer result dictionary from result string
-		if (self.apiPrinterResult[0] == '{'): self.apiPrinterResultDictionary = json.loads(self.apiPrinterResult)
-		else                                : self.apiPrinterResultDictionary = None
+	def getSnapshot(self):
+		''' Return the current (immutable) status snapshot '''
+		return self.snapshot
 
 	def getApiJobResponseCode(self):
 		''' Return apiJob response code '''
-		return self.apiJobResponseCode
+		return self.snapshot.apiJobResponseCode
 
 	def getApiJobResultString(self):
 		''' Return apiJob result string '''
-		return self.apiJobResult
+		return self.snapshot.apiJobResult
 
 	def getApiJobResultDictionary(self):
-		''' Return apiJob result dictionary '''
-		return copy.deepcopy(self.apiJobResultDictionary)
+		''' Return a read-only view of the apiJob result dictionary '''
+		return readOnlyView(self.snapshot.apiJobResultDictionary)
 
 	def getApiPrinterResponseCode(self):
 		''' Return apiPrinter response code '''
-		return self.apiPrinterResponseCode
+		return self.snapshot.apiPrinterResponseCode
 
 	def getApiPrinterResultString(self):
 		''' Return apiPrinter result string '''
-		return self.apiPrinterResult
+		return self.snapshot.apiPrinterResult
 
 	def getApiPrinterResultDictionary(self):
-		''' Return apiPrinter result dictionary '''
-		return copy.deepcopy(self.apiPrinterResultDictionary)
+		''' Return a read-only view of the apiPrinter result dictionary '''
+		return readOnlyView(self.snapshot.apiPrinterResultDictionary)
 
 	def getErrorState(self):
 		''' Get the error state string '''
+		return self.snapshot.error
 
-		if (self.apiJobResponseCode     !=  200): return None
-		if (self.apiJobResultDictionary is None): return None
+	def isPrinterConnected(self):
+		''' Return printerConnected? as True/False '''
+		return self.snapshot.connected
 
-		if (('state' in self.apiJobResultDictionary)                 == False): return None
-		if (self.apiJobResultDictionary['state'].startswith("Error") == False): return None
+	def isPrintActive(self):
+		''' Return printActive? as True/False '''
+		return self.snapshot.printing
 
-		return self.apiJobResultDictionary['state'].replace("Error: ", "")
+	def getCompletionPercentage(self):
+		''' Return completionPercentage or None on error '''
+		return self.snapshot.completion
 
-	def isPrinterConnected(self):
-		''' Return printerConnected? as True/False '''
+	def getBedTemperatureDegC(self):
+		''' Return bed temperature in degrees C, or None on error '''
+		return self.snapshot.bedDegC
 
-		if (self.apiJobResponseCode     !=  200): return False
-		if (self.apiJobResultDictionary is None): return False
+	def getChamberTemperatureDegC(self):
+		''' Return chamber temperature in degrees C, or None on error '''
+		return self.snapshot.chamberDegC
 
-		if (('state' in self.apiJobResultDictionary) == False): return False
+	def getToolTemperatureDegC(self, tool = 0):
+		''' Return the temperature of the given tool in degrees C, or None on error '''
+		if (tool >= len(self.snapshot.toolDegC)): return None
+		return self.snapshot.toolDegC[tool]
 
-		return (self.apiJobResultDictionary['state'].startswith("Offline") == False)
+	def getTool0TemperatureDegC(self):
+		''' Return tool0 temperature in degrees C, or None on error '''
+		return self.getToolTemperatureDegC(0)
 
-	def isPrintActive(self):
-		''' Return printActive? as True/False '''
+	def getBedTemperatureTrend(self):
+		''' Return the bed temperature trend in degrees C per minute, or None without enough history '''
+		return self.snapshot.bedTrend
 
-		if (self.isPrinterConnected()       == False): return False
-		if (self.apiPrinterResponseCode     !=   200): return False
-		if (self.apiPrinterResultDictionary is  None): return False
+	def getToolTemperatureTrend(self, tool = 0):
+		''' Return the temperature trend of the given tool in degrees C per minute, or None without enough history '''
+		if (tool >= len(self.snapshot.toolTrend)): return None
+		return self.snapshot.toolTrend[tool]
 
-		if (('state'    in self.apiPrinterResultDictionary                  ) == False): return False
-		if (('flags'    in self.apiPrinterResultDictionary['state']         ) == False): return False
-		if (('printing' in self.apiPrniterResultDictionary['state']['flags']) == False): return False
+	def getBedCooldownEta(self):
+		''' Return the estimated seconds until the bed is down to COOLDOWN_DEGC, or None if it is not cooling '''
+		return self.snapshot.bedCooldownEta
 
-		return self.apiPrinterResultDictionary['state']['flags']['printing']
+	def getTimeToBedTemperature(self, degC):
+		''' Return the estimated seconds until the bed reaches degC, or None if it is not heading there '''
+		return self.history.bed.timeTo(degC)
 
-	def getCompletionPercentage(self):
-		''' Return completionPercentage or None on error '''
+class PushPrinterStatus(PrinterStatus):
+	''' Printer status that follows OctoPrint's push API (/sockjs websocket) and only polls the REST API while the socket is down. '''
 
-		if (self.isPrinterConnected()   == False): return None
-		if (self.apiJobResultDictionary is  None): return None
+	def __init__(self, address = None, api_key = None, options = None, verbose = None, reconnectDelay = PUSH_RECONNECT_DELAY, timeout = PUSH_TIMEOUT, cache = None):
+		''' Get the initial status over REST and start following the websocket '''
 
-		if (('progress'   in self.apiJobResultDictionary            ) == False): return None
-		if (('completion' in self.apiJobResultDictionary['progress']) == False): return None
+		self.lock           = threading.Lock()
+		self.reconnectDelay = reconnectDelay
+		self.timeout        = timeout
+		self.pushConnected  = False
+		self.running        = True
+		self.socket         = None
 
-		return self.apiJobResultDictionary['progress']['completion']
+		# Time of the latest pushed temperature sample added to the history
+		self.sampledTime = None
 
-	def getBedTemperatureDegC(self):
-		''' Return bed temperature in degrees C, or None on error '''
+		PrinterStatus.__init__(self, address, api_key, options, verbose, cache)
 
-		if (self.isPrinterConnected()       == False): return None
-		if (self.apiPrinterResponseCode     !=   200): return None
-		if (self.apiPrinterResultDictionary is  None): return None
+		# Receive push messages in the background
+		self.thread = threading.Thread(target = self._run)
+		self.thread.daemon = True
+		self.thread.start()
 
-		# After serial connection, octoprint returns an empty dictionary for temperature, so we must test that keys exist
-		if (('temperature' in self.apiPrinterResultDictionary                      ) == False): return None
-		if (('bed'         in self.apiPrinterResultDictionary['temperature']       ) == False): return None
-		if (('actual'      in self.apiPrinterResultDictionary['temperature']['bed']) == False): return None
+	def close(self):
+		''' Stop following the websocket '''
+		self.running = False
+		if (self.socket is not None):
+			self.socket.close()
 
-		return self.apiPrinterResultDictionary['temperature']['bed']['actual']
+	def update(self):
+		''' Poll the REST API only while the websocket is down, otherwise the status is already current '''
+		if (self.pushConnected == False):
+			with self.lock:
+				PrinterStatus.update(self)
+
+	def apply(self, message):
+		''' Apply a decoded push message (current, history or event) to the status '''
+
+		with self.lock:
+			# Replace only the sections present in the message
+			job     = dict(self.snapshot.apiJobResultDictionary     or {})
+			printer = dict(self.snapshot.apiPrinterResultDictionary or {})
+
+			# Only a temperature sample that has not been seen yet goes into the history (events and repeated messages carry the previous one)
+			record = False
+
+			data = message.get('current') or message.get('history')
+			if (data is not None):
+				if ('state' in data):
+					job['state']     = data['state']['text']
+					printer['state'] = data['state']
+				if ('job' in data):
+					job['job'] = data['job']
+				if ('progress' in data):
+					job['progress'] = data['progress']
+
+				# Latest temperature sample, without its timestamp
+				if (data.get('temps')):
+					temperature = dict(data['temps'][-1])
+					sampleTime  = temperature.pop('time', None)
+					printer['temperature'] = temperature
+
+					record           = ((sampleTime is None) or (sampleTime != self.sampledTime))
+					self.sampledTime = sampleTime
+
+			event = message.get('event')
+			if (event is not None):
+				payload = event.get('payload') or {}
+				if (event.get('type') == 'Disconnected'):
+					job['state'] = 'Offline'
+				elif (event.get('type') == 'Error'):
+					job['state'] = 'Error: ' + str(payload.get('error', ''))
+
+			if ((data is None) and (event is None)):
+				return
+
+			# Commit the new status
+			self.snapshot = StatusSnapshot.fromResults(200, json.dumps(job), job, 200, json.dumps(printer), printer, self.history, record = record)
+
+	def _url(self):
+		''' Websocket address of the push API '''
+
+		address = self.address
+		if (address is None):
+			address = octoprint_restapi.OCTOPRINT_ADDRESS
+		if (address.endswith("/") == False):
+			address = address + "/"
+
+		if (address.startswith("https://")): return "wss://" + address[len("https://"):] + "sockjs/websocket"
+		else                               : return "ws://"  + address[len("http://" ):] + "sockjs/websocket"
+
+	def _connect(self):
+		''' Open the websocket and authenticate with a passive login session '''
+
+		import websocket                  #sudo pip install websocket-client
+
+		if (self.address is None): address = octoprint_restapi.OCTOPRINT_ADDRESS
+		else                     : address = self.address
+		if (self.api_key is None): api_key = octoprint_restapi.READ_API_KEY(octoprint_restapi.USERNAME)
+		else                     : api_key = self.api_key
+
+		# Log in with the api key to get a session for the socket, within the socket's timeout so a hung server does not stop the reconnects
+		address, header      = octoprint_restapi.CLIENT.prepare('api/login', address, api_key, post = True)
+		responseCode, result = octoprint_restapi.CLIENT.post(address, {'passive': True}, header, self.verbose, self.timeout)
+		login = json.loads(result)
+
+		self.socket = websocket.create_connection(self._url(), timeout = self.timeout)
+		self.socket.send(json.dumps({'auth': login['name'] + ':' + login['session']}))
+
+	def _run(self):
+		''' Receive and apply push messages, reconnecting when the socket drops '''
+
+		while (self.running):
+			try:
+				self._connect()
+				while (self.running):
+					message = self.socket.recv()
+					if (not message):
+						break
+					self.apply(json.loads(message))
+					self.pushConnected = True
+			except Exception as exc:
+				if (self.verbose):
+					print("Push connection lost: " + str(exc))
+
+			# Fall back to REST polling until the socket is back
+			self.pushConnected = False
+			if (self.socket is not None):
+				try:
+					self.socket.close()
+				except Exception:
+					pass
+				self.socket = None
+
+			if (self.running):
+				time.sleep(self.reconnectDelay)
+
+class AsyncPrinterStatus(PrinterStatus):
+	''' Printer status updated through an octoprint_restapiAsync.AsyncRestClient. startUpdate sends the api/job and api/printer requests without waiting and poll
+	    commits the snapshot once both have arrived, so one thread can render LEDs (or follow other printers on the same client) while the requests are out. '''
+
+	def __init__(self, address = None, api_key = None, options = None, verbose = None, client = None):
+		''' Use the shared async client unless one is given, and get the first status before returning '''
+
+		# Imported here, so that other users of this module do not load asyncore or build the shared async client
+		if (client is None):
+			import octoprint_restapiAsync
+			client = octoprint_restapiAsync.CLIENT
+
+		self.client   = client
+		self.inFlight = None
+		self.errors   = 0
+		self.updated  = None
+
+		PrinterStatus.__init__(self, address, api_key, options, verbose)
+
+	def startUpdate(self):
+		''' Send the status requests, unless an update is already in flight '''
+
+		if (self.inFlight is None):
+			self.inFlight = (self.client.getAsync('api/job'    , self.address, self.api_key, self.options, self.verbose),
+			                 self.client.getAsync('api/printer', self.address, self.api_key, self.options, self.verbose))
+
+	def poll(self, timeout = 0):
+		''' Move the client's requests along (waiting up to timeout seconds) and commit the snapshot if the update has arrived. Returns True if it has.
+		    A failed request counts as an error and commits a not connected snapshot, like FleetStatus. '''
+
+		self.client.poll(timeout)
+		if ((self.inFlight is None) or (not all(request.done for request in self.inFlight))):
+			return False
+
+		job, printer = self.inFlight
+		self.inFlight = None
+
+		if ((job.error is not None) or (printer.error is not None)):
+			self.errors += 1
+		self._commit(self._response(job), self._response(printer))
+		return True
 
-	def getTool0TemperatureDegC(self):
-		''' Return tool0 temperature in degrees C, or None on error '''
+	def update(self):
+		''' Send the status requests and wait for them, raising the error of a failed request like PrinterStatus.update '''
+
+		self.startUpdate()
+		job, printer = self.inFlight
+		self.client.wait(self.inFlight)
+		self.inFlight = None
+
+		self._commit(job.response(), printer.response())
+
+	def getAge(self):
+		''' Return the seconds since the last snapshot was committed '''
+		return default_timer() - self.updated
+
+	def _response(self, request):
+		''' (response code, result) of a done request, or (None, error message) if it failed '''
+		if (request.error is None): return request.responseCode, request.result
+		else                      : return None, request.error[1]
+
+	def _commit(self, job, printer):
+		''' Parse the results and commit them as one snapshot '''
+
+		(apiJobResponseCode, apiJobResult), (apiPrinterResponseCode, apiPrinterResult) = job, printer
+
+		start                      = default_timer()
+		apiJobResultDictionary     = parseResult(apiJobResult)
+		apiPrinterResultDictionary = parseResult(apiPrinterResult)
+		if (self.metrics is not None):
+			observeParseTime(self.metrics, default_timer() - start)
+
+		self.snapshot = StatusSnapshot.fromResults(apiJobResponseCode, apiJobResult, apiJobResultDictionary, apiPrinterResponseCode, apiPrinterResult, apiPrinterResultDictionary, self.history,
+		                                           record = self.isNewSample(apiPrinterResult))
+		self.updated  = default_timer()
+
+class StatusPoller:
+	''' Update a PrinterStatus in its own thread and publish each snapshot with the time it was taken, so readers never wait on the network '''
+
+	def __init__(self, printer, interval = POLL_INTERVAL, scheduler = None):
+		''' Optionally let an AdaptiveInterval choose the interval after each poll '''
+
+		self.printer   = printer
+		self.interval  = interval
+		self.scheduler = scheduler
+		self.errors    = 0
+		self.thread   = None
+		self.stopped  = threading.Event()
+
+		# Latest value slot: a (time taken, snapshot) tuple that is only ever replaced by a single assignment, so no lock is needed
+		self.latest = (default_timer(), printer.getSnapshot())
+
+	def getLatest(self):
+		''' Return the (time taken, snapshot) of the last successful update '''
+		return self.latest
+
+	def getAge(self):
+		''' Return the seconds since the last successful update '''
+		return default_timer() - self.latest[0]
+
+	def start(self):
+		''' Start polling in a background thread '''
+		self.stopped.clear()
+		self.thread = threading.Thread(target = self._run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def stop(self, wait = True):
+		''' Stop polling (waits for a request in progress, which is bounded by the http timeouts, unless wait is False) '''
+		self.stopped.set()
+		if ((wait) and (self.thread is not None)):
+			self.thread.join()
+			self.thread = None
+
+	def _run(self):
+		''' Poll every interval seconds until stopped '''
+
+		while (self.stopped.is_set() == False):
+			start = default_timer()
+
+			# A failed update leaves the last snapshot in place, which then goes stale
+			try:
+				self.printer.update()
+				self.latest = (default_timer(), self.printer.getSnapshot())
+				snapshot    = self.latest[1]
+			except Exception:
+				self.errors += 1
+				snapshot     = None
+
+			if (self.scheduler is not None):
+				self.interval = self.scheduler.nextInterval(snapshot)
+
+			self.stopped.wait(max(0, self.interval - (default_timer() - start)))
+
+class AdaptiveInterval:
+	''' Choose the next poll interval from the last status: fast near the end of a print, while the bed cools and just after an error, the normal interval while printing, and exponential back off while offline or idle. '''
+
+	def __init__(self, minimum = POLL_INTERVAL_MIN, maximum = POLL_INTERVAL_MAX, interval = POLL_INTERVAL, requestsPerPoll = 2):
+		self.minimum         = minimum
+		self.maximum         = maximum
+		self.interval        = interval
+		self.requestsPerPoll = requestsPerPoll
+		self.current         = interval
+		self.errorSince      = None
+		self.state           = None
+
+		# Statistics: polls scheduled and the seconds they cover
+		self.polls   = 0
+		self.elapsed = 0.0
+
+	def nextInterval(self, snapshot):
+		''' Return the seconds to wait before the next poll, given the snapshot of this one (None if the poll failed) '''
+
+		now = default_timer()
+
+		# Remember when the current error appeared
+		if ((snapshot is not None) and (snapshot.error is not None)):
+			if (self.errorSince is None):
+				self.errorSince = now
+		else:
+			self.errorSince = None
+
+		# Just after an error
+		if ((self.errorSince is not None) and ((now - self.errorSince) < ERROR_FAST_PERIOD)):
+			interval = self.minimum
+		# Offline, unreachable or a lasting error
+		elif ((snapshot is None) or (snapshot.connected == False) or (self.errorSince is not None)):
+			interval = None
+		# Nearly finished
+		elif ((snapshot.printing) and (snapshot.completion is not None) and (snapshot.completion >= NEAR_COMPLETE_PERCENT)):
+			interval = self.minimum
+		elif (snapshot.printing):
+			interval = self.interval
+		# Finished and the bed is cooling towards the cooled down colour
+		elif ((snapshot.completion == 100) and (snapshot.bedDegC is not None) and (snapshot.bedDegC > COOLDOWN_DEGC)):
+			interval = self.minimum
+		# Idle
+		else:
+			interval = None
+
+		# Back off by doubling, from no less than the normal interval, starting again whenever the printer comes online or stops printing
+		if (snapshot is None): state = None
+		else                 : state = (snapshot.connected, snapshot.printing)
+
+		if (interval is None):
+			if (state != self.state): interval = self.interval
+			else                    : interval = max(self.current * 2, self.interval)
+		self.state = state
+
+		self.current = min(max(interval, self.minimum), self.maximum)
+
+		self.polls   += 1
+		self.elapsed += self.current
+		return self.current
+
+	def getRequestsSavedPerHour(self):
+		''' Return how many fewer requests per hour the chosen intervals send than polling at the normal interval '''
+
+		if (self.elapsed == 0.0):
+			return 0.0
+
+		saved = (self.elapsed / self.interval - self.polls) * self.requestsPerPoll
+		return saved * 3600 / self.elapsed
+
+class FleetStatus:
+	''' Status of many printers polled from one process, every request sent through one multi handle with at most maxActive in flight. printers is a list of (address, api_key). '''
+
+	# Optional loopMetrics.Metrics to record the JSON parse time of each cycle in
+	metrics = None
+
+	def __init__(self, printers, options = None, verbose = None, maxActive = FLEET_MAX_ACTIVE):
+		self.printers  = list(printers)
+		self.options   = options
+		self.verbose   = verbose
+		self.maxActive = maxActive
+
+		# Recent temperatures of every printer, for the trends and cooldown estimates
+		self.histories = [TemperatureHistory() for printer in self.printers]
+
+		# Prepare the api/job and api/printer request of every printer once
+		self.requests = []
+		for address, api_key in self.printers:
+			self.requests.append(octoprint_restapi.CLIENT.prepare('api/job'    , address, api_key, options))
+			self.requests.append(octoprint_restapi.CLIENT.prepare('api/printer', address, api_key, options))
+
+		# Statistics: poll cycles, cycle time, and the slowest request of each printer in the last cycle
+		self.cycles       = 0
+		self.cycleTime    = 0.0
+		self.cycleTimeSum = 0.0
+		self.cycleTimeMax = 0.0
+		self.latency      = (None,) * len(self.printers)
+
+		self.update()
+
+	def update(self):
+		''' Poll every printer. A printer that cannot be reached shows as not connected, the others are not held up by it (beyond its timeout). '''
+
+		start     = default_timer()
+		timings   = [None] * len(self.requests)
+		responses = octoprint_restapi.CLIENT.get_many(self.requests, self.verbose, maxActive = self.maxActive, timings = timings, raiseErrors = False)
+
+		parsed    = default_timer()
+		snapshots = []
+		for i in range(len(self.printers)):
+			(jobResponseCode, jobResult), (printerResponseCode, printerResult) = responses[2 * i], responses[2 * i + 1]
+			snapshots.append(StatusSnapshot.fromResults(jobResponseCode, jobResult, parseResult(jobResult), printerResponseCode, printerResult, parseResult(printerResult), self.histories[i], parsed))
+		if (self.metrics is not None):
+			observeParseTime(self.metrics, default_timer() - parsed)
 
-		if (self.isPrinterConnected()       == False): return None
-		if (self.apiPrinterResponseCode     !=   200): return None
-		if (self.apiPrinterResultDictionary is  None): return None
+		# Replace the snapshots in one assignment so readers always see one cycle
+		self.snapshots = tuple(snapshots)
+		self.latency   = tuple(max(timings[2 * i], timings[2 * i + 1]) for i in range(len(self.printers)))
 
-		# After serial connection, octoprint returns an empty dictionary for temperature, so we must test that keys exist
-		if (('temperature' in self.apiPrinterResultDictionary                        ) == False): return None
-		if (('tool0'       in self.apiPrinterResultDictionary['temperature']         ) == False): return None
-		if (('actual'      in self.apiPrinterResultDictionary['temperature']['tool0']) == False): return None
+		# Keep track of how long each cycle takes
+		self.cycleTime     = default_timer() - start
+		self.cycles       += 1
+		self.cycleTimeSum += self.cycleTime
+		if (self.cycleTime > self.cycleTimeMax):
+			self.cycleTimeMax = self.cycleTime
 
-		return self.apiPrinterResultDictionary['temperature']['tool0']['actual']
+	def getSnapshots(self):
+		''' Return the status snapshot of every printer, in the order given '''
+		return self.snapshots
+
+	def getSnapshot(self, index):
+		''' Return the status snapshot of one printer '''
+		return self.snapshots[index]
+
+	def getStatistics(self):
+		''' Return poll cycles, last, mean and max cycle time in seconds and the slowest request of each printer in the last cycle '''
+
+		if (self.cycles == 0): mean = 0.0
+		else                 : mean = self.cycleTimeSum / self.cycles
+
+		return {'cycles': self.cycles, 'cycleTime': self.cycleTime, 'meanCycleTime': mean, 'maxCycleTime': self.cycleTimeMax, 'latency': self.latency}
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def statusCache(ttl = None):
+	''' Response cache for PrinterStatus: api/printer without the sd section, gzip and ETag revalidation, optionally fresh for ttl seconds '''
+
+	if (ttl is None): ttl = {}
+	else            : ttl = {'api/job': ttl, 'api/printer': ttl}
+
+	return octoprint_restapi.ResponseCache(ttl, {'api/printer': ['state', 'temperature']})
+
+def observeParseTime(metrics, seconds):
+	''' Record the time to parse the results of one update '''
+	metrics.histogram('ledstrip_json_parse_seconds', 'Time to parse the api/job and api/printer results of one update').observe(seconds)
+
+def parseResult(result):
+	''' Decode a json object result string, or return None if the result is not one '''
+	if ((result is not None) and (result.startswith('{'))): return json.loads(result)
+	else                                                  : return None
+
+def readOnlyView(value):
+	''' Wrap dictionaries and lists from a result in read-only views, other values are returned as they are '''
+	if (isinstance(value, dict)): return DictView(value)
+	if (isinstance(value, list)): return ListView(value)
+	return value
 
 #########################################################################
 # MAIN
@@ -152,13 +895,33 @@ def main():
 	parser.add_argument("-a", "--address", dest   = "address"   , help = "OctoPrint IP address if running GET/POST from another device on your network.")
 	parser.add_argument("-k", "--key"    , dest   = "api_key"   , help = "API KEY for HTTP GET or POST request.")
 	parser.add_argument("-v", "--verbose", action = "store_true", help = "Enable HTTP verbose option.")
+	parser.add_argument("-p", "--push"   , action = "store_true", help = "Follow the OctoPrint push API instead of polling.")
+	parser.add_argument("-c", "--cache"  , action = "store_true", help = "Poll with gzip, ETag revalidation and without unused sections.")
+	parser.add_argument("-A", "--adaptive"    , action = "store_true"                                     , help = "Choose each poll interval from the printer state.")
+	parser.add_argument("--min-interval"      , dest   = "minInterval", type = float, default = POLL_INTERVAL_MIN, help = "Shortest adaptive poll interval in seconds.")
+	parser.add_argument("--max-interval"      , dest   = "maxInterval", type = float, default = POLL_INTERVAL_MAX, help = "Longest adaptive poll interval in seconds.")
+	parser.add_argument("-m", "--max-body"    , dest   = "maxBody"    , type = int  , default = None             , help = "Stream responses into reused buffers, refusing bodies over this many bytes or that are not JSON.")
 
 	# Parse the arguments
 	args         = parser.parse_args()
 	args.options = None
 
+	# Optionally bound the response size
+	if (args.maxBody is not None):
+		octoprint_restapi.CLIENT.streaming = True
+		octoprint_restapi.CLIENT.maxBody   = args.maxBody
+
+	# Optionally adapt the poll interval to the printer state
+	if (args.adaptive): scheduler = AdaptiveInterval(args.minInterval, args.maxInterval)
+	else              : scheduler = None
+
+	# Optionally trim and revalidate the polls
+	if (args.cache): cache = statusCache()
+	else           : cache = None
+
 	# Pass the data into the printer status class
-	printer = PrinterStatus(args.address, args.api_key, args.options, args.verbose)
+	if (args.push): printer = PushPrinterStatus(args.address, args.api_key, args.options, args.verbose, cache = cache)
+	else          : printer = PrinterStatus    (args.address, args.api_key, args.options, args.verbose, cache)
 
 	# Poll the printer for status
 	try:
@@ -171,10 +934,13 @@ def main():
 			print("Completion Percentage: " + str(printer.getCompletionPercentage())                                 )
 			print("Bed Temperature: "       + str(printer.getBedTemperatureDegC()  ) + " " + u'\N{DEGREE SIGN}' + "C")
 			print("Tool 0 Temperature: "    + str(printer.getTool0TemperatureDegC()) + " " + u'\N{DEGREE SIGN}' + "C")
+			print("Bed Trend: "             + str(printer.getBedTemperatureTrend() ) + " " + u'\N{DEGREE SIGN}' + "C/min")
+			print("Bed Cooled Down In: "    + str(printer.getBedCooldownEta()      ) + " s"                          )
 			print("\r")
 
 			# Sleep for a while before trying again
-			time.sleep(1)
+			if (scheduler is None): time.sleep(POLL_INTERVAL)
+			else                  : time.sleep(scheduler.nextInterval(printer.getSnapshot()))
 
 			# Update the printer status
 			printer.update()
@@ -188,5 +954,11 @@ def main():
 		print("Printer result string:")
 		print(printer.getApiPrinterResultString())
 
+		if (cache is not None):
+			print("Requests: " + `cache.requests` + ", not modified: " + `cache.notModified` + ", from cache: " + `cache.hits` + ", bytes transferred: " + `cache.bytesTransferred`)
+
+		if (scheduler is not None):
+			print("Polls: " + `scheduler.polls` + ", requests saved per hour: " + ("%.0f" % scheduler.getRequestsSavedPerHour()))
+
 if __name__ == '__main__':
 	main()
@@ -0,0 +1,382 @@
+import BaseHTTPServer
+import SocketServer
+import base64
+import hashlib
+import json
+import octoprint_printerStatus
+import octoprint_restapi
+import select
+import struct
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from timeit import default_timer
+
+#########################################################################
+#  Usage Examples
+#########################################################################
+
+# 1. Check PushPrinterStatus against a stand-in OctoPrint replaying recorded push sessions (runs anywhere, no printer needed; sudo pip install websocket-client)
+  #python octoprint_pushReplay.py
+
+# 2. Record the push messages of a real printer for 60 seconds, one json message per line
+  #sudo python octoprint_pushReplay.py -a 'http://192.168.1.234:80/' -k 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX' -r 60 -f recording.jsonl
+
+# 3. Replay a recording through the stand-in and print the status it leaves
+  #python octoprint_pushReplay.py -f recording.jsonl
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Address the stand-in OctoPrint listens on
+SERVER_ADDRESS = '127.0.0.1'
+
+# Key the websocket handshake answer is derived with (RFC 6455)
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# Status served over REST while the push socket is down
+REST_JOB     = {"job": {"file": {"name": None}}, "progress": {"completion": 100.0}, "state": "Operational"}
+REST_PRINTER = {"state": {"text": "Operational", "flags": {"printing": False}}, "temperature": {"bed": {"actual": 25.0, "target": 0.0}, "tool0": {"actual": 24.0, "target": 0.0}}}
+
+# Passive login session handed out by api/login, which the socket must be authenticated with
+LOGIN = {"name": "pi", "session": "0123456789ABCDEF"}
+
+# Push sessions recorded from OctoPrint 1.4: a print in progress, and an error after the print
+SESSION_PRINTING = [
+	{"connected": {"version": "1.4.0", "display_version": "1.4.0", "branch": None, "plugin_hash": "5c5b0b6b", "config_hash": "9e4ec0a3", "debug": False, "safe_mode": None, "permissions": []}},
+	{"history": {"state": {"text": "Printing", "flags": {"operational": True, "printing": True, "paused": False, "error": False, "ready": False}},
+	             "job": {"file": {"name": "part.gcode", "size": 1234567}, "estimatedPrintTime": 3600.5},
+	             "progress": {"completion": 41.5, "filepos": 512345, "printTime": 1490, "printTimeLeft": 2110},
+	             "temps": [{"time": 1600000000, "bed": {"actual": 59.8, "target": 60.0}, "tool0": {"actual": 209.4, "target": 210.0}}],
+	             "logs": [], "messages": [], "offsets": {}, "busyFiles": []}},
+	{"plugin": {"plugin": "announcements", "data": {"type": "announcements"}}},
+	{"current": {"state": {"text": "Printing", "flags": {"operational": True, "printing": True, "paused": False, "error": False, "ready": False}},
+	             "job": {"file": {"name": "part.gcode", "size": 1234567}, "estimatedPrintTime": 3600.5},
+	             "progress": {"completion": 42.0, "filepos": 518522, "printTime": 1502, "printTimeLeft": 2098},
+	             "temps": [{"time": 1600000002, "bed": {"actual": 59.9, "target": 60.0}, "tool0": {"actual": 209.9, "target": 210.0}},
+	                       {"time": 1600000004, "bed": {"actual": 60.0, "target": 60.0}, "tool0": {"actual": 210.0, "target": 210.0}}],
+	             "logs": ["Recv: ok"], "messages": [], "offsets": {}, "busyFiles": []}},
+]
+
+SESSION_ERROR = [
+	{"connected": {"version": "1.4.0", "display_version": "1.4.0", "branch": None, "plugin_hash": "5c5b0b6b", "config_hash": "9e4ec0a3", "debug": False, "safe_mode": None, "permissions": []}},
+	{"current": {"state": {"text": "Operational", "flags": {"operational": True, "printing": False, "paused": False, "error": False, "ready": True}},
+	             "job": {"file": {"name": "part.gcode", "size": 1234567}, "estimatedPrintTime": 3600.5},
+	             "progress": {"completion": 100.0, "filepos": 1234567, "printTime": 3598, "printTimeLeft": 0},
+	             "temps": [{"time": 1600002100, "bed": {"actual": 58.2, "target": 0.0}, "tool0": {"actual": 180.3, "target": 0.0}}],
+	             "logs": [], "messages": [], "offsets": {}, "busyFiles": []}},
+	{"event": {"type": "Error", "payload": {"error": "Thermal runaway"}}},
+]
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class PushStandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	''' Stand-in OctoPrint: serves api/job and api/printer, a passive api/login, and a /sockjs/websocket that replays each offered session once.
+	    The socket of a session stays open until drop() is called or the client closes it, and upgrades are refused while no session is on offer. '''
+
+	daemon_threads = True
+
+	def __init__(self):
+		BaseHTTPServer.HTTPServer.__init__(self, (SERVER_ADDRESS, 0), PushStandInHandler)
+		self.job          = REST_JOB
+		self.printer      = REST_PRINTER
+		self.sessions     = []
+		self.lock         = threading.Lock()
+		self.drops        = 0
+		self.open         = 0
+		self.running      = True
+		self.restRequests = 0
+		self.logins       = []
+		self.auths        = []
+
+	def url(self):
+		return 'http://%s:%d/' % self.server_address
+
+	def offer(self, messages):
+		''' Replay these messages (dictionaries or json strings) to the next websocket that connects '''
+		with self.lock:
+			self.sessions.append(messages)
+
+	def drop(self):
+		''' Close the open websocket without a close frame, like a dropped network '''
+		self.drops += 1
+
+	def process_request_thread(self, request, client_address):
+		''' Count the connections being served, so stop() can wait for them '''
+
+		with self.lock:
+			self.open += 1
+		try:
+			SocketServer.ThreadingMixIn.process_request_thread(self, request, client_address)
+		finally:
+			with self.lock:
+				self.open -= 1
+
+	def handle_error(self, request, client_address):
+		''' Clients hang up on refused upgrades and dropped sockets, which is expected here '''
+		pass
+
+	def stop(self):
+		''' Stop serving, and let the connections still open close before returning '''
+		self.running = False
+		self.shutdown()
+		waitFor(lambda: (self.open == 0), 1)
+		self.server_close()
+
+class PushStandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	''' Request handler of the PushStandInServer '''
+
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		if   (self.path.startswith('/sockjs/websocket')): self.websocket()
+		elif (self.path.startswith('/api/printer'))     : self.reply(200, self.server.printer)
+		elif (self.path.startswith('/api/job'))         : self.reply(200, self.server.job)
+		else                                            : self.reply(404, {"error": "Not found"})
+
+	def do_POST(self):
+		body = self.rfile.read(int(self.headers.getheader('Content-Length') or 0))
+
+		# OctoPrint refuses a body that is not strict json
+		try:
+			data = json.loads(body)
+		except ValueError:
+			self.reply(400, {"error": "Malformed JSON body"})
+			return
+
+		if (self.path.startswith('/api/login') and (data.get('passive') == True) and self.headers.getheader('X-Api-Key')):
+			self.server.logins.append(data)
+			self.reply(200, LOGIN)
+		else:
+			self.reply(403, {"error": "Forbidden"})
+
+	def reply(self, responseCode, dictionary):
+		if (self.path.startswith('/api/job') or self.path.startswith('/api/printer')):
+			self.server.restRequests += 1
+
+		body = json.dumps(dictionary)
+		self.send_response(responseCode)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def websocket(self):
+		''' Upgrade to a websocket, read the auth message, replay the offered session and hold the socket open '''
+
+		with self.server.lock:
+			if (len(self.server.sessions) == 0): messages = None
+			else                               : messages = self.server.sessions.pop(0)
+		if (messages is None):
+			self.reply(503, {"error": "No session on offer"})
+			return
+
+		self.close_connection = 1
+		generation            = self.server.drops
+
+		key = self.headers.getheader('Sec-WebSocket-Key')
+		self.send_response(101, 'Switching Protocols')
+		self.send_header('Upgrade', 'websocket')
+		self.send_header('Connection', 'Upgrade')
+		self.send_header('Sec-WebSocket-Accept', base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest()))
+		self.end_headers()
+
+		self.server.auths.append(json.loads(readFrame(self.rfile)).get('auth'))
+
+		for message in messages:
+			if (not isinstance(message, basestring)):
+				message = json.dumps(message)
+			self.wfile.write(textFrame(message))
+
+		# Hold the socket until dropped, or until the client gives up on it (a close frame or a closed socket)
+		while ((self.server.drops == generation) and (self.server.running)):
+			readable, writable, exceptional = select.select([self.connection], [], [], 0.05)
+			if (len(readable) != 0):
+				break
+
+	def log_message(self, format, *args):
+		pass
+
+class RecordingPrinterStatus(octoprint_printerStatus.PushPrinterStatus):
+	''' PushPrinterStatus that counts the push messages it applies and optionally writes each one to a file, one json message per line '''
+
+	def __init__(self, address = None, api_key = None, recording = None, reconnectDelay = octoprint_printerStatus.PUSH_RECONNECT_DELAY, timeout = octoprint_printerStatus.PUSH_TIMEOUT):
+		self.applied   = 0
+		self.recording = recording
+		octoprint_printerStatus.PushPrinterStatus.__init__(self, address, api_key, reconnectDelay = reconnectDelay, timeout = timeout)
+
+	def apply(self, message):
+		if (self.recording is not None):
+			self.recording.write(json.dumps(message) + '\n')
+			self.recording.flush()
+
+		octoprint_printerStatus.PushPrinterStatus.apply(self, message)
+		self.applied += 1
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def textFrame(text):
+	''' Encode text as one unmasked websocket text frame, as a server sends it '''
+
+	length = len(text)
+	if   (length < 126)  : header = struct.pack('!BB', 0x81, length)
+	elif (length < 65536): header = struct.pack('!BBH', 0x81, 126, length)
+	else                 : header = struct.pack('!BBQ', 0x81, 127, length)
+	return header + text
+
+def readFrame(stream):
+	''' Read one masked websocket frame, as a client sends it, and return its payload '''
+
+	first, second = struct.unpack('!BB', stream.read(2))
+	length        = second & 0x7f
+	if   (length == 126): length, = struct.unpack('!H', stream.read(2))
+	elif (length == 127): length, = struct.unpack('!Q', stream.read(8))
+
+	mask    = bytearray(stream.read(4))
+	payload = bytearray(stream.read(length))
+	for i in range(length):
+		payload[i] ^= mask[i % 4]
+	return str(payload)
+
+def waitFor(condition, timeout = 5):
+	''' Wait until condition() is true. Returns False if it is still false after timeout seconds. '''
+
+	end = default_timer() + timeout
+	while (condition() == False):
+		if (default_timer() > end):
+			return False
+		time.sleep(0.01)
+	return True
+
+def checkPush(server, timeout = 2):
+	''' Drive a PushPrinterStatus through REST polling, a pushed print, a dropped socket, a reconnect with an error event and a silent socket.
+	    Returns a list of failure strings. '''
+
+	failures = []
+	def check(name, actual, expected):
+		if (actual != expected):
+			failures.append(name + ": " + repr(actual) + " != " + repr(expected))
+
+	# No session on offer yet, so the status comes from REST
+	status = RecordingPrinterStatus(server.url(), 'KEY', reconnectDelay = 0.1, timeout = timeout)
+	check("rest push connected", status.pushConnected, False)
+	check("rest completion", status.getCompletionPercentage(), 100.0)
+	check("rest bed", status.getBedTemperatureDegC(), 25.0)
+
+	# A print in progress is pushed, and update() leaves REST alone while it is
+	server.offer(SESSION_PRINTING)
+	check("printing applied", waitFor(lambda: ((status.applied == len(SESSION_PRINTING)) and (status.pushConnected))), True)
+	check("login", server.logins[-1:], [{"passive": True}])
+	check("auth", server.auths, [LOGIN['name'] + ':' + LOGIN['session']])
+	check("printing", status.isPrintActive(), True)
+	check("printing completion", status.getCompletionPercentage(), 42.0)
+	check("printing bed", status.getBedTemperatureDegC(), 60.0)
+	check("printing tool0", status.getTool0TemperatureDegC(), 210.0)
+
+	restRequests = server.restRequests
+	status.update()
+	check("push update requests", server.restRequests - restRequests, 0)
+
+	# The socket drops and cannot reconnect, so update() polls REST again
+	server.drop()
+	check("drop noticed", waitFor(lambda: (status.pushConnected == False)), True)
+	status.update()
+	check("fallback update requests", server.restRequests - restRequests, 2)
+	check("fallback printing", status.isPrintActive(), False)
+	check("fallback completion", status.getCompletionPercentage(), 100.0)
+	check("fallback bed", status.getBedTemperatureDegC(), 25.0)
+
+	# It reconnects to the next session, whose error event sets the error state
+	applied = status.applied
+	server.offer(SESSION_ERROR)
+	check("error applied", waitFor(lambda: ((status.applied == applied + len(SESSION_ERROR)) and (status.pushConnected))), True)
+	check("error state", status.getErrorState(), "Thermal runaway")
+	check("error bed", status.getBedTemperatureDegC(), 58.2)
+	check("reconnect auth", len(server.auths), 2)
+
+	# The socket stays open but silent, so it is treated as dropped after the timeout
+	check("silence noticed", waitFor(lambda: (status.pushConnected == False), timeout + 3), True)
+
+	status.close()
+	status.thread.join()
+	return failures
+
+def printStatus(status):
+	''' Print the status like octoprint_printerStatus.py '''
+
+	print("Is printer connected? "  + str(status.isPrinterConnected()     ))
+	print("Is print active? "       + str(status.isPrintActive()          ))
+	print("Error state: "           + str(status.getErrorState()          ))
+	print("Completion Percentage: " + str(status.getCompletionPercentage()))
+	print("Bed Temperature: "       + str(status.getBedTemperatureDegC()  ) + " C")
+	print("Tool 0 Temperature: "    + str(status.getTool0TemperatureDegC()) + " C")
+
+#########################################################################
+#  MAIN
+#########################################################################
+def main():
+	''' Check PushPrinterStatus against recorded sessions, replay a recording, or record one from a printer '''
+
+	# Declare input arguments
+	parser = ArgumentParser()
+	parser.add_argument("-a", "--address", dest = "address", help = "OctoPrint IP address of the printer to record.")
+	parser.add_argument("-k", "--key"    , dest = "api_key", help = "API KEY of the printer to record.")
+	parser.add_argument("-r", "--record" , dest = "record" , type = float, default = None, help = "Seconds to record the printer's push messages for (into --file, or stdout).")
+	parser.add_argument("-f", "--file"   , dest = "file"   , default = None                , help = "Recording to replay, or to record into, one json message per line.")
+	parser.add_argument("-t", "--timeout", dest = "timeout", type = float, default = 2     , help = "Seconds of push silence the check allows before the socket counts as dropped.")
+
+	# Parse the arguments
+	args = parser.parse_args()
+
+	# Record a real printer
+	if (args.record is not None):
+		if (args.file is not None): recording = open(args.file, 'w')
+		else                      : recording = sys.stdout
+		status = RecordingPrinterStatus(args.address, args.api_key, recording)
+		time.sleep(args.record)
+		status.close()
+		if (args.file is not None):
+			recording.close()
+			print("Recorded " + str(status.applied) + " messages")
+		return
+
+	server = PushStandInServer()
+	thread = threading.Thread(target = server.serve_forever)
+	thread.daemon = True
+	thread.start()
+
+	# Replay a recording and show where it leaves the status
+	if (args.file is not None):
+		with open(args.file) as stream:
+			messages = [line.strip() for line in stream if (line.strip() != '')]
+
+		server.offer(messages)
+		status = RecordingPrinterStatus(server.url(), 'KEY', reconnectDelay = 0.1)
+		waitFor(lambda: (status.applied == len(messages)), 10)
+		print("Replayed " + str(status.applied) + " of " + str(len(messages)) + " messages")
+		printStatus(status)
+		status.close()
+		status.thread.join()
+		octoprint_restapi.CLIENT.close()
+		server.stop()
+		return
+
+	# Close the REST connections too, so the server has nothing left open
+	failures = checkPush(server, args.timeout)
+	octoprint_restapi.CLIENT.close()
+	server.stop()
+
+	for failure in failures:
+		print(failure)
+	if (len(failures) != 0):
+		sys.exit(1)
+	print("Push status ok")
+
+if __name__ == '__main__':
+	main()
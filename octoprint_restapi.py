@@ -3,10 +3,20 @@ import yaml                           #sudo pip install pyyaml
 import ast
 import json
 import os
+import subprocess
 import sys
+import threading
+import time
 from StringIO import StringIO
+from urlparse import urlparse
 from argparse import ArgumentParser
 
+# Use the C accelerated yaml parser if libyaml is available
+try:
+	from yaml import CSafeLoader as YamlLoader
+except ImportError:
+	from yaml import SafeLoader as YamlLoader
+
 #########################################################################
 #  Usage Examples
 #########################################################################
@@ -33,6 +43,9 @@ from argparse import ArgumentParser
   #sudo python octoprint_restapi.py post -c 'api/printer/sd' -d '{ "command": "release" }'
   #sudo python octoprint_restapi.py post -c 'api/printer/sd' -d '{ "command": "init" }'
 
+# 8. The same sequence as a batch over one connection, with a result printed as a json line for each command
+  #printf 'post api/printer/sd { "command": "release" }\ndelay 1\npost api/printer/sd { "command": "init" }\n' | sudo python octoprint_restapi.py batch --stop-on-error
+
 #########################################################################
 #  Globals
 #########################################################################
@@ -40,15 +53,501 @@ from argparse import ArgumentParser
 # Network address of octoprint
 OCTOPRINT_ADDRESS = 'http://localhost:5000/'
 
+# Seconds allowed to connect to octoprint, and for a whole status request sent with get_many (single requests, such as a POST from the command line, may take as long as they need)
+CONNECT_TIMEOUT = 3
+TOTAL_TIMEOUT   = 5
+
 # Octoprint user account
 USERNAME = 'pi'
 
+# Api keys read from config.yaml: path -> (modification time, size, api key)
+API_KEY_CACHE = {}
+
+# Methods a batch command can use
+BATCH_METHODS = ('get', 'post')
+
+# Sections that can be left out of a response with the exclude option
+EXCLUDABLE_SECTIONS = {'api/printer': ['temperature', 'sd', 'state']}
+
+# Streaming responses: initial buffer size, the most a buffer keeps between requests, the largest body accepted and the content types accepted from a 2xx response
+RESPONSE_BUFFER_SIZE = 16384
+RESPONSE_BUFFER_KEEP = 1048576
+MAX_BODY_SIZE        = 8388608
+JSON_CONTENT_TYPES   = ('application/json',)
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class RestClient:
+	''' Keep idle curl handles per host so that requests reuse their HTTP keep-alive connections, and remember the address and header of each REST request. '''
+
+	def __init__(self, connectTimeout = CONNECT_TIMEOUT, timeout = TOTAL_TIMEOUT):
+		self.handles        = {}
+		self.templates      = {}
+
+		# Seconds allowed to connect for every request, and for a whole request sent with get_many (the polling path)
+		self.connectTimeout = connectTimeout
+		self.timeout        = timeout
+
+		# Multi handles of get_many, one per thread (see _multi), and all of them for close
+		self.local  = threading.local()
+		self.multis = []
+
+		# Optional loopMetrics.Metrics to record the curl timing breakdown of each request in, and its histograms by address
+		self.metrics         = None
+		self.phaseHistograms = {}
+
+		# Optionally stream responses into a ResponseBuffer kept with each handle, limited to maxBody bytes and the contentTypes
+		self.streaming    = False
+		self.maxBody      = MAX_BODY_SIZE
+		self.contentTypes = JSON_CONTENT_TYPES
+		self.buffers      = {}
+
+		# Statistics: requests sent, new connections opened and bytes received (headers and body as sent on the wire)
+		self.requests        = 0
+		self.connects        = 0
+		self.bytesDownloaded = 0
+
+	def __del__(self):
+		self.close()
+
+	def close(self):
+		''' Close every handle (and its connection) '''
+		for idle in self.handles.values():
+			for c in idle:
+				c.close()
+		self.handles.clear()
+		self.buffers.clear()
+
+		# A thread's multi handle that is no longer listed is replaced on its next use
+		for multi in self.multis:
+			multi.close()
+		del self.multis[:]
+
+	def prepare(self, command, address, api_key, options = None, post = False):
+		''' Return the (address, header) for a REST API command, building it the first time it is seen. '''
+
+		key = (command, address, api_key, options, post)
+		if (key in self.templates):
+			return self.templates[key]
+
+		# POST data is in json format
+		if (post): header = ['Content-Type: application/json', 'X-Api-Key: ' + api_key]
+		else     : header = ['X-Api-Key: ' + api_key]
+
+		# Ensure that the command can be appended to the address
+		if (address.endswith("/") == False):
+			address = address + "/"
+
+		# Trim off the starting slash since we forced it on the address
+		if ((command.startswith("/") == True) and (len(command) > 1)):
+			command = command[1:]
+
+		# Trim off the ending slash, as it is added automatically if options are present
+		if (command.endswith("/") == True):
+			command = command[:-1]
+
+		# Add options if there are any
+		address = address + command
+		if (options is not None):
+			if (post): address = address + '?' + options
+			else     : address = address + "/?" + options
+
+		self.templates[key] = (address, header)
+		return self.templates[key]
+
+	def get(self, address, header = None, verbose = None, timeout = None):
+		''' Send a HTTP GET request to the server address and return the response code and response string. '''
+		return self.perform(address, None, header, verbose, timeout)
+
+	def post(self, address, postData, header = None, verbose = None, timeout = None):
+		''' Send a HTTP POST request to the server address and return the response code and response string. '''
+		return self.perform(address, json.dumps(postData), header, verbose, timeout)
+
+	def get_many(self, requests, verbose = None, encoding = None, responseHeaders = None, maxActive = None, timings = None, raiseErrors = True):
+		''' Send HTTP GET requests, given as a list of (address, header), at the same time. Returns a list of (response code, response string) once they have all completed.
+		    Optionally accept a content encoding (such as gzip) and fill a list of dictionaries with the response headers of each request.
+		    Optionally keep at most maxActive requests in flight, fill a list with the total time of each request, and (raiseErrors False) return (None, error message) for failed requests instead of raising. '''
+
+		multi = self._multi()
+
+		# Its connection cache only grows with the transfers in flight, so make room for a connection to every request when they are limited
+		if (len(requests) > self.local.maxConnects):
+			self.local.maxConnects = len(requests)
+			multi.setopt(pycurl.M_MAXCONNECTS, self.local.maxConnects)
+
+		results = [None] * len(requests)
+		running = {}
+		failed  = []
+		queued  = 0
+
+		try:
+			while ((queued < len(requests)) or (len(running) > 0)):
+
+				# Start requests until maxActive are in flight (a finished request's handle, and connection, is reused for the next one to its host)
+				while ((queued < len(requests)) and ((maxActive is None) or (len(running) < maxActive))):
+					address, header = requests[queued]
+					if (responseHeaders is None): c, buffer = self._setup(address, None, header, verbose, encoding, timeout = self.timeout)
+					else                        : c, buffer = self._setup(address, None, header, verbose, encoding, responseHeaders[queued], self.timeout)
+					multi.add_handle(c)
+					running[c] = (queued, address, buffer)
+					queued    += 1
+
+				ret, active = multi.perform()
+				if (ret == pycurl.E_CALL_MULTI_PERFORM):
+					continue
+
+				# Collect the requests that have completed
+				while (True):
+					remaining, ok, errors = multi.info_read()
+					for c, errno, errmsg in [(c, None, None) for c in ok] + errors:
+						multi.remove_handle(c)
+						i, address, buffer = running.pop(c)
+						if (timings is not None):
+							timings[i] = c.getinfo(pycurl.TOTAL_TIME)
+
+						if (errno is None):
+							results[i] = self._finish(address, c, buffer)
+						else:
+							# Report why a streaming buffer aborted the transfer
+							errmsg = getattr(buffer, 'error', None) or errmsg
+							self._release(address, c)
+							results[i] = (None, errmsg)
+							failed.append((c, errno, errmsg))
+					if (remaining == 0):
+						break
+
+				if (len(running) > 0):
+					multi.select(1.0)
+		finally:
+			for c, (i, address, buffer) in running.items():
+				multi.remove_handle(c)
+				self._release(address, c)
+
+		# Raise the first error like perform() would, unless the caller takes the failed requests in place
+		if ((raiseErrors) and (len(failed) != 0)):
+			c, errno, errmsg = failed[0]
+			raise pycurl.error(errno, errmsg)
+
+		return results
+
+	def perform(self, address, postFields = None, header = None, verbose = None, timeout = None):
+		''' Send a request on an idle handle for the host (POST if postFields is given, otherwise GET), optionally failing it after timeout seconds. '''
+
+		c, buffer = self._setup(address, postFields, header, verbose, timeout = timeout)
+
+		# Send the request, returning the handle if it fails
+		try:
+			c.perform()
+		except pycurl.error:
+			self._release(address, c)
+
+			# Report why a streaming buffer aborted the transfer
+			if (getattr(buffer, 'error', None) is not None):
+				raise pycurl.error(pycurl.E_WRITE_ERROR, buffer.error)
+			raise
+
+		return self._finish(address, c, buffer)
+
+	def _setup(self, address, postFields, header, verbose, encoding = None, responseHeaders = None, timeout = None):
+		''' Configure an idle handle for a request, returning the handle and its result buffer. Optionally fail the request if it takes over timeout seconds. '''
+
+		# Get the Curl object for this host and a buffer to write the response to (the handle's own buffer when streaming)
+		c = self._handle(address)
+		if (self.streaming): buffer = self._buffer(c)
+		else               : buffer = StringIO()
+
+		# Configure the address
+		c.setopt(c.URL, address)
+
+		# Add the post data
+		if (postFields is not None):
+			c.setopt(c.POSTFIELDS, postFields)
+
+		# Optionally add a header
+		if (header is not None):
+			c.setopt(c.HTTPHEADER, header)
+
+		# Optionally add verbose option
+		if ((verbose is not None) and (verbose is not False)):
+			c.setopt(c.VERBOSE, True)
+
+		# Optionally bound the whole request, so a hung server fails a status poll instead of holding it up
+		if (timeout is not None):
+			c.setopt(c.TIMEOUT_MS, int(timeout * 1000))
+
+		# Optionally accept a compressed response (curl decodes it)
+		if (encoding is not None):
+			c.setopt(c.ENCODING, encoding)
+
+		# Optionally collect the response headers, with lower case names
+		if (responseHeaders is not None):
+			def headerLine(line):
+				if (line.startswith('HTTP/')):
+					responseHeaders.clear()
+				elif (':' in line):
+					name, value = line.split(':', 1)
+					responseHeaders[name.strip().lower()] = value.strip()
+				if (self.streaming):
+					return buffer.header(line)
+			c.setopt(c.HEADERFUNCTION, headerLine)
+		# A streaming buffer checks the size and content type before any of the body arrives
+		elif (self.streaming):
+			c.setopt(c.HEADERFUNCTION, buffer.header)
+
+		# Configure the result buffer
+		if (self.streaming): c.setopt(c.WRITEFUNCTION, buffer.write)
+		else               : c.setopt(c.WRITEDATA, buffer)
+
+		return c, buffer
+
+	def _buffer(self, c):
+		''' Get the streaming buffer of a handle, emptied for a new request '''
+
+		buffer = self.buffers.get(c)
+		if (buffer is None):
+			buffer = ResponseBuffer(RESPONSE_BUFFER_SIZE)
+			self.buffers[c] = buffer
+
+		buffer.reset(self.maxBody, self.contentTypes)
+		return buffer
+
+	def _finish(self, address, c, buffer):
+		''' Get the response code of a completed request and return the handle (which stays open) to the idle list '''
+
+		responseCode = c.getinfo(pycurl.RESPONSE_CODE)
+
+		# Keep track of how many requests needed a new connection
+		self.requests        += 1
+		self.connects        += c.getinfo(pycurl.NUM_CONNECTS)
+		self.bytesDownloaded += int(c.getinfo(pycurl.SIZE_DOWNLOAD)) + c.getinfo(pycurl.HEADER_SIZE)
+
+		if (self.metrics is not None):
+			self._observe(address, c)
+
+		self._release(address, c)
+
+		# Return the responseCode as int and result as string
+		return responseCode, buffer.getvalue()
+
+	def _multi(self):
+		''' Get the calling thread's multi handle. It owns the connections of the transfers it runs, so it is kept open for reuse.
+		    Threads (status pollers, daemon requests) cannot share one, as info_read would hand one thread the transfers another is waiting for. '''
+
+		multi = getattr(self.local, 'multi', None)
+		if ((multi is None) or (multi not in self.multis)):
+			multi                  = pycurl.CurlMulti()
+			self.local.multi       = multi
+			self.local.maxConnects = 0
+			self.multis.append(multi)
+
+		return multi
+
+	def _observe(self, address, c):
+		''' Record the time to each curl phase of a completed request in the histograms of its endpoint '''
+
+		histograms = self.phaseHistograms.get(address)
+		if (histograms is None):
+			labels     = {'endpoint': urlparse(address).path}
+			histograms = []
+			for phase, info in (('namelookup', pycurl.NAMELOOKUP_TIME), ('connect', pycurl.CONNECT_TIME), ('starttransfer', pycurl.STARTTRANSFER_TIME), ('total', pycurl.TOTAL_TIME)):
+				labels['phase'] = phase
+				histograms.append((info, self.metrics.histogram('octoprint_http_seconds', 'Time from the start of an OctoPrint request to the end of each curl phase', labels)))
+			self.phaseHistograms[address] = histograms
+
+		for info, histogram in histograms:
+			histogram.observe(c.getinfo(info))
+
+	def _handle(self, address):
+		''' Get an idle Curl object for the scheme and host of the address, clearing the options of its previous request '''
+
+		host = urlparse(address)[:2]
+		idle = self.handles.setdefault(host, [])
+
+		# Another thread may take the last idle handle first
+		try:
+			c = idle.pop()
+			c.reset()
+		except IndexError:
+			c = pycurl.Curl()
+
+		# Reset clears every option, so set keep-alive and the connect timeout again (an unreachable host then fails the request instead of blocking)
+		c.setopt(c.TCP_KEEPALIVE, 1)
+		c.setopt(c.NOSIGNAL     , 1)
+		if (self.connectTimeout is not None):
+			c.setopt(c.CONNECTTIMEOUT_MS, int(self.connectTimeout * 1000))
+
+		return c
+
+	def _release(self, address, c):
+		''' Return a Curl object to the idle list for its host '''
+		self.handles[urlparse(address)[:2]].append(c)
+
+class ResponseBuffer:
+	''' Growable response body buffer for pycurl's WRITEFUNCTION and HEADERFUNCTION. The body is written in place (preallocated from Content-Length when sent),
+	    and the transfer is aborted as soon as the body would exceed maxBody bytes or a 2xx response has a content type other than contentTypes. '''
+
+	def __init__(self, size = RESPONSE_BUFFER_SIZE, maxBody = MAX_BODY_SIZE, contentTypes = JSON_CONTENT_TYPES):
+		self.buffer = bytearray(size)
+		self.reset(maxBody, contentTypes)
+
+	def reset(self, maxBody = MAX_BODY_SIZE, contentTypes = JSON_CONTENT_TYPES):
+		''' Empty the buffer for a new request, giving back memory over RESPONSE_BUFFER_KEEP bytes '''
+
+		if (len(self.buffer) > RESPONSE_BUFFER_KEEP):
+			self.buffer = bytearray(RESPONSE_BUFFER_SIZE)
+
+		self.length       = 0
+		self.status       = None
+		self.error        = None
+		self.maxBody      = maxBody
+		self.contentTypes = contentTypes
+
+	def header(self, line):
+		''' Check each response header line before the body arrives (a return value of 0 aborts the transfer) '''
+
+		lower = line.lower()
+
+		# A new response (after a redirect or 100 Continue) starts the body again
+		if (lower.startswith('http/')):
+			self.length = 0
+			self.status = int(line.split()[1])
+
+		elif (lower.startswith('content-length:')):
+			size = int(line.split(':', 1)[1])
+			if ((self.maxBody is not None) and (size > self.maxBody)):
+				self.error = "Response body of " + str(size) + " bytes is larger than " + str(self.maxBody) + " bytes"
+				return 0
+			self._reserve(size)
+
+		elif ((lower.startswith('content-type:')) and (self.contentTypes is not None) and (200 <= self.status < 300)):
+			contentType = lower.split(':', 1)[1].split(';')[0].strip()
+			if (contentType not in self.contentTypes):
+				self.error = "Response content type " + contentType + " is not one of " + ", ".join(self.contentTypes)
+				return 0
+
+	def write(self, data):
+		''' Append a chunk of the body (a return value of 0 aborts the transfer) '''
+
+		end = self.length + len(data)
+		if ((self.maxBody is not None) and (end > self.maxBody)):
+			self.error = "Response body is larger than " + str(self.maxBody) + " bytes"
+			return 0
+
+		# Grow by doubling when the length was not known
+		if (end > len(self.buffer)):
+			self._reserve(max(end, 2 * len(self.buffer)))
+
+		self.buffer[self.length:end] = data
+		self.length = end
+
+	def getvalue(self):
+		''' Return the body as a string, copied once straight out of the buffer. A buffer grown past RESPONSE_BUFFER_KEEP is given back before the body is decoded. '''
+
+		value = memoryview(self.buffer)[:self.length].tobytes()
+		if (len(self.buffer) > RESPONSE_BUFFER_KEEP):
+			self.buffer = bytearray(RESPONSE_BUFFER_SIZE)
+		return value
+
+	def _reserve(self, size):
+		''' Make room for size bytes '''
+		if (size > len(self.buffer)):
+			self.buffer.extend(bytearray(size - len(self.buffer)))
+
+class ResponseCache:
+	''' Opt-in cache for REST_API_GET: a time to live per command, ETag revalidation, gzip transfer and excluding the sections the caller does not use. '''
+
+	def __init__(self, ttl = None, sections = None, encoding = 'gzip'):
+		''' ttl maps a command to the seconds a response stays fresh, sections maps a command to the sections the caller uses (see EXCLUDABLE_SECTIONS) '''
+
+		self.ttl      = dict(ttl      or {})
+		self.sections = dict(sections or {})
+		self.encoding = encoding
+
+		# Address -> (time received, etag, response code, result)
+		self.entries = {}
+
+		# Statistics: requests sent, answers from the cache, 304 revalidations and bytes received
+		self.requests         = 0
+		self.hits             = 0
+		self.notModified      = 0
+		self.bytesTransferred = 0
+
+	def options(self, command, options = None):
+		''' Add an exclude option for the sections of the command that the caller does not use '''
+
+		command = command.strip("/")
+		if (command not in self.sections):
+			return options
+
+		exclude = [section for section in EXCLUDABLE_SECTIONS.get(command, []) if section not in self.sections[command]]
+		if ((len(exclude) == 0) or ((options is not None) and ('exclude=' in options))):
+			return options
+
+		if (options is None): return 'exclude=' + ','.join(exclude)
+		else                : return options + '&exclude=' + ','.join(exclude)
+
+	def get_many(self, commands, address, api_key, options = None, verbose = None):
+		''' Return a list of (response code, result) for the commands, sending (conditional) requests at the same time only for those that are not fresh. '''
+
+		now      = time.time()
+		results  = [None] * len(commands)
+		pending  = []
+		requests = []
+
+		for i, command in enumerate(commands):
+			url, header = CLIENT.prepare(command, address, api_key, self.options(command, options))
+			entry       = self.entries.get(url)
+
+			# Still fresh, so answer from the cache
+			if ((entry is not None) and ((now - entry[0]) < self.ttl.get(command.strip("/"), 0))):
+				self.hits += 1
+				results[i] = (entry[2], entry[3])
+				continue
+
+			# Otherwise ask the server whether it has changed
+			if ((entry is not None) and (entry[1] is not None)):
+				header = header + ['If-None-Match: ' + entry[1]]
+
+			pending.append((i, url, entry))
+			requests.append((url, header))
+
+		if (len(requests) == 0):
+			return results
+
+		# Send the requests, keeping track of the bytes received
+		responseHeaders = [{} for request in requests]
+		received        = CLIENT.bytesDownloaded
+		responses       = CLIENT.get_many(requests, verbose, self.encoding, responseHeaders)
+		self.requests         += len(requests)
+		self.bytesTransferred += CLIENT.bytesDownloaded - received
+
+		for (i, url, entry), (responseCode, result), headers in zip(pending, responses, responseHeaders):
+			# Not modified, so the cached result is still current
+			if ((responseCode == 304) and (entry is not None)):
+				self.notModified += 1
+				etag                 = entry[1]
+				responseCode, result = entry[2], entry[3]
+			else:
+				etag = headers.get('etag')
+
+			if (responseCode == 200):
+				self.entries[url] = (now, etag, responseCode, result)
+
+			results[i] = (responseCode, result)
+
+		return results
+
+# Shared client behind HTTP_GET, HTTP_POST, REST_API_GET and REST_API_POST
+CLIENT = RestClient()
+
 #########################################################################
 #  Functions
 #########################################################################
 
 def READ_API_KEY(username = None):
-	''' Get the api key for the given user name. The api key is needed to communicate with octoprint using the REST API. '''
+	''' Get the api key for the given user name. The api key is needed to communicate with octoprint using the REST API. The key is cached until config.yaml changes. '''
 
 	# Use default name if none is supplied
 	if (username is None):
@@ -57,81 +556,88 @@ def READ_API_KEY(username = None):
 	# Get path of config.yaml file that contains the API KEY
 	path = '/home/' + username + '/.octoprint/config.yaml'
 
-	if (os.path.exists(path) == False):
+	try:
+		stat = os.stat(path)
+	except OSError:
 		print("Could not find /.octoprint/config.yaml for user " + username)
 		sys.exit()
 
+	# Use the cached key unless the file has changed since it was read
+	cached = API_KEY_CACHE.get(path)
+	if ((cached is not None) and (cached[0] == stat.st_mtime) and (cached[1] == stat.st_size)):
+		return cached[2]
+
 	# Open the file and extract the API KEY using a yaml parser
 	with open(path, 'r') as stream:
 		try:
-			yaml_data = yaml.load(stream)
-			api_key   = yaml_data['api']['key']
+			api_key = FIND_YAML_VALUE(stream, ['api', 'key'])
+
+			# Anchors and aliases are only resolved by loading the whole document
+			if (api_key is None):
+				stream.seek(0)
+				yaml_data = yaml.load(stream, Loader = YamlLoader)
+				try:
+					api_key = yaml_data['api']['key']
+				except (KeyError, TypeError):
+					api_key = None
 		except yaml.YAMLError as exc:
 			print(exc)
 			sys.exit()
 
-	# Return the api key
-	return api_key
-
-def HTTP_GET(address, header = None, verbose = None):
-	''' Send a HTTP GET request to the server address and return the response as a string. '''
-
-	# Create a buffer to write the response to and get Curl object
-	buffer = StringIO()
-	c      = pycurl.Curl()
+	if (api_key is None):
+		print("Could not find the api key in /.octoprint/config.yaml for user " + username)
+		sys.exit()
 
-	# Configure the address
-	c.setopt(c.URL, address)
+	# Cache and return the api key
+	API_KEY_CACHE[path] = (stat.st_mtime, stat.st_size, api_key)
+	return api_key
 
-	# Optionally add a header
-	if (header is not None):
-		c.setopt(c.HTTPHEADER, header)
+def FIND_YAML_VALUE(stream, keys):
+	''' Return the scalar value at the given path of mapping keys in a yaml stream, or None. Walks the parser events and stops once found, without building the document. '''
 
-	# Optionally add verbose option
-	if ((verbose is not None) and (verbose is not False)):
-		c.setopt(c.VERBOSE, True)
+	# One entry for each open collection: [is mapping, expecting a key, current key]
+	stack = []
 
-	# Configure the result buffer, send the GET request, get the response code and close the object
-	c.setopt(c.WRITEDATA, buffer)
-	c.perform()
-	responseCode = c.getinfo(pycurl.RESPONSE_CODE)
-	c.close()
+	for event in yaml.parse(stream, Loader = YamlLoader):
+		if (isinstance(event, (yaml.ScalarEvent, yaml.AliasEvent))):
+			if ((len(stack) == 0) or (stack[-1][0] == False)):
+				continue
 
-	# Return the responseCode as int and result as string
-	return responseCode, buffer.getvalue()
+			top = stack[-1]
+			if (top[1]):
+				top[1] = False
+				top[2] = getattr(event, 'value', None)
+			else:
+				if ((isinstance(event, yaml.ScalarEvent)) and ([frame[2] for frame in stack] == keys)):
+					return event.value
+				top[1] = True
 
-def HTTP_POST(address, postData, header = None, verbose = None):
-	''' Send a HTTP POST request to the server address and return the response as a string. '''
+		elif (isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent))):
+			stack.append([isinstance(event, yaml.MappingStartEvent), True, None])
 
-	# Create a buffer to write the response to and get Curl object
-	buffer = StringIO()
-	c      = pycurl.Curl()
+		elif (isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent))):
+			stack.pop()
 
-	# Configure the address
-	c.setopt(c.URL, address)
+			# The collection was the value of a key in the enclosing mapping
+			if ((len(stack) != 0) and (stack[-1][0])):
+				stack[-1][1] = True
 
-	# Add the post data
-	c.setopt(c.POSTFIELDS, json.dumps(postData))
+	return None
 
-	# Optionally add a header
-	if (header is not None):
-		c.setopt(c.HTTPHEADER, header)
+def HTTP_GET(address, header = None, verbose = None):
+	''' Send a HTTP GET request to the server address and return the response as a string. '''
 
-	# Optionally add verbose option
-	if ((verbose is not None) and (verbose is not False)):
-		c.setopt(c.VERBOSE, True)
+	# Send the GET request over the shared client's connection to the host
+	return CLIENT.get(address, header, verbose)
 
-	# Configure the result buffer, send the POST request, get the response code and close the object
-	c.setopt(c.WRITEDATA, buffer)
-	c.perform()
-	responseCode = c.getinfo(pycurl.RESPONSE_CODE)
-	c.close()
+def HTTP_POST(address, postData, header = None, verbose = None):
+	''' Send a HTTP POST request to the server address and return the response as a string. '''
 
-	# Return the responseCode as int and result as string
-	return responseCode, buffer.getvalue()
+	# Send the POST request over the shared client's connection to the host
+	return CLIENT.post(address, postData, header, verbose)
 
-def REST_API_GET(command, address = None, api_key = None, options = None, verbose = None):
-	''' Send a HTTP GET request to the octprint server using the given command, api_key and option. Response is a dictionary. '''
+def REST_API_GET(command, address = None, api_key = None, options = None, verbose = None, cache = None):
+	''' Send a HTTP GET request to the octprint server using the given command, api_key and option. Response is a dictionary. Optionally go through a ResponseCache. '''
 
 	# Ensure command parameter is present
 	if (command is None):
@@ -141,34 +647,46 @@ def REST_API_GET(command, address = None, api_key = None, options = None, verbos
 	# Get the user's API_KEY (if not supplied) so that we can send a GET request to octoprint
 	if (api_key is None):
 		api_key = READ_API_KEY(USERNAME)
-	api_key = 'X-Api-Key: ' + api_key
 
 	# If address is not specified then use default
 	if (address is None):
 		address = OCTOPRINT_ADDRESS
 
-	# Ensure that the command can be appended to the address
-	if (address.endswith("/") == False):
-		address = address + "/"
+	# Let the cache answer or revalidate
+	if (cache is not None):
+		return cache.get_many([command], address, api_key, options, verbose)[0]
 
-	# Trim off the starting slash since we forced it on the address
-	if ((command.startswith("/") == True) and (len(command) > 1)):
-		command = command[1:]
+	# Get the prepared address and header
+	address, header = CLIENT.prepare(command, address, api_key, options)
 
-	# Trim off the ending slash, as it is added automatically if options are present
-	if (command.endswith("/") == True):
-		command = command[:-1]
+	# Send the GET request and get the result
+	return HTTP_GET(address, header, verbose)
 
-	# Add options if there are any
-	address = address + command
-	if (options is not None):
-		address = address + "/?" + options
+def REST_API_GET_MULTI(commands, address = None, api_key = None, options = None, verbose = None, cache = None):
+	''' Send HTTP GET requests for a list of commands to the octoprint server at the same time. Returns a list of (response code, result) in the same order, once all have completed. Optionally go through a ResponseCache. '''
 
-	# Prepare the header
-	header = [api_key]
+	# Ensure command parameter is present
+	if ((commands is None) or (None in commands)):
+		print("Commands is a required parameter for REST_API_GET_MULTI")
+		sys.exit()
 
-	# Send the GET request and get the result
-	return HTTP_GET(address, header, verbose)
+	# Get the user's API_KEY (if not supplied) so that we can send a GET request to octoprint
+	if (api_key is None):
+		api_key = READ_API_KEY(USERNAME)
+
+	# If address is not specified then use default
+	if (address is None):
+		address = OCTOPRINT_ADDRESS
+
+	# Let the cache answer or revalidate
+	if (cache is not None):
+		return cache.get_many(commands, address, api_key, options, verbose)
+
+	# Get the prepared address and header of each command
+	requests = [CLIENT.prepare(command, address, api_key, options) for command in commands]
+
+	# Send the GET requests and get the results
+	return CLIENT.get_many(requests, verbose)
 
 def REST_API_POST(command, postData, address = None, api_key = None, options = None, verbose = None):
 	''' Send a HTTP GET request to the octprint server using the given command, api_key and option. Response is a dictionary. '''
@@ -186,40 +704,136 @@ def REST_API_POST(command, postData, address = None, api_key = None, options = N
 	else:
 		postData = ast.literal_eval(postData)
 
-	# Indicate that the postData is in json format
-	header = ['Content-Type: application/json']
-
 	# Get the user's API_KEY (if not supplied) so that we can send a POST request to octoprint
 	if (api_key is None):
 		api_key = READ_API_KEY(USERNAME)
-	api_key = 'X-Api-Key: ' + api_key
 
-	# Add the api key to the header data
-	header.append(api_key)
+	# If address is not specified then use default
+	if (address is None):
+		address = OCTOPRINT_ADDRESS
+
+	# Get the prepared address and header (indicating that the postData is in json format)
+	address, header = CLIENT.prepare(command, address, api_key, options, post = True)
+
+	# Send the POST request and get the result
+	return HTTP_POST(address, postData, header, verbose)
+
+def READ_BATCH(lines):
+	''' Read batch commands, one per line, from a file or any sequence of lines. A line is either a json object with method, command and optionally options,
+	    data and delay (seconds to wait before sending it), or one of "get COMMAND [OPTIONS]", "post COMMAND DATA" and "delay SECONDS".
+	    Blank lines and lines starting with # are skipped. Returns a list of command dictionaries with the post data already decoded. '''
+
+	batch = []
+	delay = 0.0
+	for number, line in enumerate(lines, 1):
+		line = line.strip()
+		if ((len(line) == 0) or (line.startswith('#'))):
+			continue
+
+		try:
+			if (line.startswith('{')):
+				entry = json.loads(line)
+			else:
+				words  = line.split(None, 2)
+				method = words[0].lower()
+
+				# A delay applies to the next command
+				if (method == 'delay'):
+					delay += float(words[1])
+					continue
+
+				entry = {'method': method, 'command': words[1]}
+				if (len(words) == 3):
+					if (method == 'post'): entry['data']    = words[2]
+					else                 : entry['options'] = words[2]
+
+			# Decode the post data once, in the same format as REST_API_POST
+			if (isinstance(entry.get('data'), basestring)):
+				entry['data'] = ast.literal_eval(entry['data'])
+		except (ValueError, SyntaxError, IndexError) as exc:
+			raise ValueError("Batch line " + str(number) + ": " + str(exc))
+
+		entry['method'] = str(entry.get('method', '')).lower()
+		if (entry['method'] not in BATCH_METHODS):
+			raise ValueError("Batch line " + str(number) + ": method must be one of " + ", ".join(BATCH_METHODS))
+		if (entry.get('command') is None):
+			raise ValueError("Batch line " + str(number) + ": command is required")
+		if ((entry['method'] == 'post') and (entry.get('data') is None)):
+			raise ValueError("Batch line " + str(number) + ": post data is required")
+
+		entry['line']  = number
+		entry['delay'] = float(entry.get('delay', 0)) + delay
+		delay          = 0.0
+		batch.append(entry)
+
+	return batch
+
+def REST_API_BATCH(batch, address = None, api_key = None, verbose = None, stopOnError = False):
+	''' Send the commands of a batch (see READ_BATCH) in order over the shared client's connection, yielding a result dictionary for each as soon as it completes:
+	    line, method, command, code, result (decoded if json), error and seconds. Optionally stop after the first command that fails (an error or a 4xx/5xx response). '''
+
+	# Get the user's API_KEY (if not supplied) once for the whole batch
+	if (api_key is None):
+		api_key = READ_API_KEY(USERNAME)
 
 	# If address is not specified then use default
 	if (address is None):
 		address = OCTOPRINT_ADDRESS
 
-	# Ensure that the command can be appended to the address
-	if (address.endswith("/") == False):
-		address = address + "/"
+	for entry in batch:
+		if (entry['delay'] > 0):
+			time.sleep(entry['delay'])
+
+		post            = (entry['method'] == 'post')
+		request, header = CLIENT.prepare(entry['command'], address, api_key, entry.get('options'), post)
 
-	# Trim off the starting slash since we forced it on the address
-	if ((command.startswith("/") == True) and (len(command) > 1)):
-		command = command[1:]
+		code   = None
+		result = None
+		error  = None
+		start  = time.time()
+		try:
+			if (post): code, result = CLIENT.post(request, entry['data'], header, verbose)
+			else     : code, result = CLIENT.get (request, header, verbose)
+		except pycurl.error as exc:
+			error = exc.args[1]
+		seconds = time.time() - start
 
-	# Trim off the ending slash, as it is added automatically if options are present
-	if (command.endswith("/") == True):
-		command = command[:-1]
+		if ((error is None) and (code >= 400)):
+			error = "HTTP response code " + str(code)
 
-	# Add options if there are any
-	address = address + command
-	if (options is not None):
-		address = address + '?' + options
+		# Pass json results on decoded, so each output line is one json document
+		if (result):
+			try:
+				result = json.loads(result)
+			except ValueError:
+				pass
 
-	# Send the POST request and get the result
-	return HTTP_POST(address, postData, header, verbose)
+		yield {'line': entry['line'], 'method': entry['method'], 'command': entry['command'], 'code': code, 'result': result, 'error': error, 'seconds': seconds}
+
+		if ((error is not None) and (stopOnError)):
+			return
+
+def RUN_ONE_AT_A_TIME(batch, address = None, api_key = None):
+	''' Run each command of a batch as its own octoprint_restapi.py process, as a script of separate calls would, and return the wall time in seconds.
+	    The batch may only hold GETs, since it repeats commands that have already been sent. '''
+
+	if (any(entry['method'] != 'get' for entry in batch)):
+		raise ValueError("Only a batch of GETs can be run again")
+
+	start = time.time()
+	with open(os.devnull, 'w') as devnull:
+		for entry in batch:
+			if (entry['delay'] > 0):
+				time.sleep(entry['delay'])
+
+			command = [sys.executable, os.path.abspath(__file__), entry['method'], '-c', entry['command']]
+			if (address              is not None): command += ['-a', address]
+			if (api_key              is not None): command += ['-k', api_key]
+			if (entry.get('options') is not None): command += ['-o', entry['options']]
+			if (entry['method'] == 'post')       : command += ['-d', repr(entry['data'])]
+			subprocess.call(command, stdout = devnull)
+
+	return time.time() - start
 
 #########################################################################
 #  MAIN
@@ -236,11 +850,20 @@ def main():
 	parser.add_argument("-d", "--data"    , dest   = "postData"  , help = "Post data for HTTP POST as a dictionary.")
 	parser.add_argument("-u", "--username", dest   = "username"  , help = "Username for API KEY request.")
 	parser.add_argument("-v", "--verbose" , action = "store_true", help = "Enable HTTP verbose option.")
-	parser.add_argument("function", help = "Desired function, such as getkey, get or post")
+	parser.add_argument("-m", "--max-body", dest   = "maxBody"   , type = int, help = "Stream the response into a reused buffer, refusing bodies over this many bytes or that are not JSON.")
+	parser.add_argument("-f", "--file"    , dest   = "file"      , default = "-", help = "File of batch commands, one per line (default stdin).")
+	parser.add_argument("--stop-on-error" , dest   = "stopOnError", action = "store_true", help = "Stop a batch at the first command that fails.")
+	parser.add_argument("--compare"       , action = "store_true", help = "Run the batch again one command per process and report both wall times (sends every command twice, so only for batches of GETs).")
+	parser.add_argument("function", help = "Desired function, such as getkey, get, post or batch")
 
 	# Parse the arguments
 	args = parser.parse_args()
 
+	# Optionally bound the response size
+	if (args.maxBody is not None):
+		CLIENT.streaming = True
+		CLIENT.maxBody   = args.maxBody
+
 	# Perform user function based on arguments
 	if (args.function.lower() == 'get'):
 		responseCode, result = REST_API_GET(args.command, args.address, args.api_key, args.options, args.verbose)
@@ -251,6 +874,39 @@ def main():
 	elif (args.function.lower() == 'getkey'):
 		result = READ_API_KEY(args.username)
 		print(result)
+	elif (args.function.lower() == 'batch'):
+		try:
+			if (args.file == '-'):
+				batch = READ_BATCH(sys.stdin)
+			else:
+				with open(args.file) as f:
+					batch = READ_BATCH(f)
+		except ValueError as exc:
+			print(str(exc))
+			sys.exit(1)
+
+		# Refuse before sending anything, rather than POST (home, start a job, ...) twice
+		if ((args.compare) and (any(entry['method'] != 'get' for entry in batch))):
+			print("--compare sends every command twice, so it only runs batches of GETs")
+			sys.exit(1)
+
+		# Stream a json line for each command as it completes
+		errors   = 0
+		connects = CLIENT.connects
+		start    = time.time()
+		for result in REST_API_BATCH(batch, args.address, args.api_key, args.verbose, args.stopOnError):
+			if (result['error'] is not None):
+				errors += 1
+			print(json.dumps(result))
+			sys.stdout.flush()
+
+		summary = {'commands': len(batch), 'errors': errors, 'connections': CLIENT.connects - connects, 'seconds': time.time() - start}
+		if (args.compare):
+			summary['oneAtATimeSeconds'] = RUN_ONE_AT_A_TIME(batch, args.address, args.api_key)
+		print(json.dumps({'summary': summary}))
+
+		if (errors != 0):
+			sys.exit(1)
 	else:
 		print("Invalid argument function")
 
@@ -0,0 +1,396 @@
+import octoprint_restapi
+import asyncore
+import ast
+import json
+import pycurl                         #sudo apt-get install libgnutls28-dev && sudo apt-get install libcurl4-gnutls-dev && sudo pip install pycurl
+import socket
+import sys
+import threading
+from argparse import ArgumentParser
+from collections import deque
+from octoprint_restapi import RestClient
+from timeit import default_timer
+
+#########################################################################
+#  Usage Examples
+#########################################################################
+
+# 1. Start requests to several printers, keep rendering, and pick up the responses as they arrive
+  #import octoprint_restapiAsync
+  #job     = octoprint_restapiAsync.REST_API_GET_ASYNC('api/job'    , 'http://192.168.1.234:80/', 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX')
+  #printer = octoprint_restapiAsync.REST_API_GET_ASYNC('api/printer', 'http://192.168.1.235:80/', 'YYYYYYYYYYYYYYYYYYYYYYYYYYYYYYYY')
+  #while (octoprint_restapiAsync.CLIENT.pending() != 0):
+  #	octoprint_restapiAsync.CLIENT.poll(0.01)   # wait at most 10 ms for the network
+  #	engine.renderFrame()
+  #responseCode, result = job.response()
+
+# 2. Check the client against a local stand-in server and measure requests/sec at each concurrency (runs anywhere, no printer needed)
+  #python octoprint_restapiAsync.py -n 400 -j 1 4 16 64 -d 0.02
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Most requests in flight at once, and most connections kept open to one host
+MAX_ACTIVE           = 16
+MAX_HOST_CONNECTIONS = 8
+
+# Address the stand-in server listens on
+SERVER_ADDRESS = '127.0.0.1'
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class Request:
+	''' A request started by an AsyncRestClient. It is done once the client's poll has received the response or error, and then calls its callback with itself. '''
+
+	def __init__(self, address, postFields, header, verbose, callback):
+		self.address    = address
+		self.postFields = postFields
+		self.header     = header
+		self.verbose    = verbose
+		self.callback   = callback
+
+		self.done         = False
+		self.responseCode = None
+		self.result       = None
+		self.error        = None
+
+	def response(self):
+		''' Return the (response code, response string) of a done request, raising its error like octoprint_restapi.REST_API_GET would '''
+		if (self.error is not None):
+			raise pycurl.error(self.error[0], self.error[1])
+		return self.responseCode, self.result
+
+	def _complete(self, responseCode, result, error):
+		self.responseCode = responseCode
+		self.result       = result
+		self.error        = error
+		self.done         = True
+
+		if (self.callback is not None):
+			self.callback(self)
+
+class AsyncRestClient(RestClient):
+	''' RestClient whose requests are started without waiting and completed by poll, so network I/O can overlap LED rendering and other printers in one thread.
+	    At most maxActive requests are in flight (the rest wait their turn in order), over at most maxHostConnections keep-alive connections per host. '''
+
+	def __init__(self, connectTimeout = octoprint_restapi.CONNECT_TIMEOUT, timeout = octoprint_restapi.TOTAL_TIMEOUT, maxActive = MAX_ACTIVE, maxHostConnections = MAX_HOST_CONNECTIONS):
+		RestClient.__init__(self, connectTimeout, timeout)
+		self.maxActive = maxActive
+
+		# One multi handle runs every transfer and keeps their connections
+		self.multi = pycurl.CurlMulti()
+		self.multi.setopt(pycurl.M_MAX_HOST_CONNECTIONS, maxHostConnections)
+		self.multi.setopt(pycurl.M_MAXCONNECTS         , maxActive)
+
+		self.waiting = deque()
+		self.running = {}
+
+	def getAsync(self, command, address = None, api_key = None, options = None, verbose = None, callback = None):
+		''' Start a HTTP GET request with the command, address, api_key and options of REST_API_GET. Returns its Request. '''
+
+		if (api_key is None): api_key = octoprint_restapi.READ_API_KEY(octoprint_restapi.USERNAME)
+		if (address is None): address = octoprint_restapi.OCTOPRINT_ADDRESS
+
+		address, header = self.prepare(command, address, api_key, options)
+		return self.start(Request(address, None, header, verbose, callback))
+
+	def postAsync(self, command, postData, address = None, api_key = None, options = None, verbose = None, callback = None):
+		''' Start a HTTP POST request with the command, post data (a dictionary or its string), address, api_key and options of REST_API_POST. Returns its Request. '''
+
+		if (isinstance(postData, basestring)):
+			postData = ast.literal_eval(postData)
+
+		if (api_key is None): api_key = octoprint_restapi.READ_API_KEY(octoprint_restapi.USERNAME)
+		if (address is None): address = octoprint_restapi.OCTOPRINT_ADDRESS
+
+		address, header = self.prepare(command, address, api_key, options, post = True)
+		return self.start(Request(address, json.dumps(postData), header, verbose, callback))
+
+	def start(self, request):
+		''' Queue a Request, sending it as soon as there is room in flight '''
+		self.waiting.append(request)
+		self._admit()
+		return request
+
+	def pending(self):
+		''' Return the number of requests not yet done '''
+		return len(self.waiting) + len(self.running)
+
+	def poll(self, timeout = 0):
+		''' Move every transfer along, waiting up to timeout seconds for network activity if nothing has completed. Completes the requests that have finished
+		    (running their callbacks) and returns how many did. '''
+
+		completed = self._perform()
+		if ((completed == 0) and (timeout > 0) and (len(self.running) != 0)):
+			self.multi.select(timeout)
+			completed = self._perform()
+
+		return completed
+
+	def wait(self, requests, timeout = None):
+		''' Poll until the given requests are done (or timeout seconds have passed). Returns True if they are all done. '''
+
+		start = default_timer()
+		while (not all(request.done for request in requests)):
+			if ((timeout is not None) and (default_timer() - start >= timeout)):
+				return False
+			self.poll(0.1)
+
+		return True
+
+	def close(self):
+		''' Abandon the requests not yet done and close every handle. Only attributes are used, as this also runs from __del__ at exit when the module globals are gone. '''
+
+		if (self.multi is not None):
+			for c in self.running:
+				self.multi.remove_handle(c)
+				c.close()
+		self.running.clear()
+		self.waiting.clear()
+
+		for idle in self.handles.values():
+			for c in idle:
+				c.close()
+		self.handles.clear()
+		self.buffers.clear()
+
+		if (self.multi is not None):
+			self.multi.close()
+			self.multi = None
+
+	def _admit(self):
+		''' Start waiting requests until maxActive are in flight '''
+
+		while ((len(self.waiting) != 0) and (len(self.running) < self.maxActive)):
+			request = self.waiting.popleft()
+
+			# Status GETs are bounded by the timeout, a POST may take as long as it needs
+			if (request.postFields is None): c, buffer = self._setup(request.address, None, request.header, request.verbose, timeout = self.timeout)
+			else                           : c, buffer = self._setup(request.address, request.postFields, request.header, request.verbose)
+			self.multi.add_handle(c)
+			self.running[c] = (request, buffer)
+
+	def _perform(self):
+		''' Let curl do the work that is ready without blocking and complete the finished requests '''
+
+		while (True):
+			ret, active = self.multi.perform()
+			if (ret != pycurl.E_CALL_MULTI_PERFORM):
+				break
+
+		completed = 0
+		while (True):
+			remaining, ok, errors = self.multi.info_read()
+			for c, errno, errmsg in [(c, None, None) for c in ok] + errors:
+				self.multi.remove_handle(c)
+				request, buffer = self.running.pop(c)
+				if (errno is None):
+					responseCode, result = self._finish(request.address, c, buffer)
+					request._complete(responseCode, result, None)
+				else:
+					# Report why a streaming buffer aborted the transfer
+					errmsg = getattr(buffer, 'error', None) or errmsg
+					self._release(request.address, c)
+					request._complete(None, None, (errno, errmsg))
+				completed += 1
+			if (remaining == 0):
+				break
+
+		# Start the next requests in the freed slots
+		if (completed != 0):
+			self._admit()
+			self.multi.perform()
+
+		return completed
+
+class StandInServer(asyncore.dispatcher):
+	''' Minimal keep-alive OctoPrint stand-in on asyncore: answers every GET with a fixed api/job or api/printer JSON body and every POST with 204, after delay seconds '''
+
+	JOB     = json.dumps({"job": {}, "progress": {"completion": 42.0}, "state": "Printing"})
+	PRINTER = json.dumps({"state": {"text": "Printing", "flags": {"printing": True}}, "temperature": {"bed": {"actual": 60.0}, "tool0": {"actual": 210.0}}})
+
+	def __init__(self, delay = 0.0):
+		self.map    = {}
+		self.delay  = delay
+		self.timers = []
+		asyncore.dispatcher.__init__(self, map = self.map)
+		self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.set_reuse_addr()
+		self.bind((SERVER_ADDRESS, 0))
+		self.listen(128)
+		self.running = True
+
+	def url(self):
+		return 'http://%s:%d/' % self.socket.getsockname()
+
+	def handle_accept(self):
+		pair = self.accept()
+		if (pair is not None):
+			StandInConnection(pair[0], self)
+
+	def serve(self):
+		''' Run the event loop until stopped, firing the delayed replies when due '''
+
+		while (self.running):
+			asyncore.loop(0.001, map = self.map, count = 1)
+
+			now = default_timer()
+			due = [timer for timer in self.timers if (timer[0] <= now)]
+			for timer in due:
+				self.timers.remove(timer)
+				timer[1]()
+
+	def stop(self):
+		self.running = False
+
+class StandInConnection(asyncore.dispatcher_with_send):
+	''' One client connection of the StandInServer '''
+
+	def __init__(self, sock, server):
+		asyncore.dispatcher_with_send.__init__(self, sock, map = server.map)
+		self.server = server
+		self.data   = ''
+
+	def handle_read(self):
+		self.data += self.recv(65536)
+
+		# Answer every complete request received so far
+		while ('\r\n\r\n' in self.data):
+			head, rest = self.data.split('\r\n\r\n', 1)
+			length     = 0
+			for line in head.split('\r\n')[1:]:
+				if (line.lower().startswith('content-length:')):
+					length = int(line.split(':', 1)[1])
+			if (len(rest) < length):
+				return
+			self.data = rest[length:]
+
+			method, path = head.split(' ', 2)[:2]
+			if   (method == 'POST')      : reply = 'HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n'
+			elif ('api/printer' in path) : reply = self._reply(self.server.PRINTER)
+			else                         : reply = self._reply(self.server.JOB)
+
+			if (self.server.delay > 0): self.server.timers.append((default_timer() + self.server.delay, lambda reply = reply: self.send(reply)))
+			else                      : self.send(reply)
+
+	def _reply(self, body):
+		return 'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: ' + str(len(body)) + '\r\n\r\n' + body
+
+# Shared client behind REST_API_GET_ASYNC and REST_API_POST_ASYNC
+CLIENT = AsyncRestClient()
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def REST_API_GET_ASYNC(command, address = None, api_key = None, options = None, verbose = None, callback = None):
+	''' Start a HTTP GET request to the octoprint server on the shared async client (see REST_API_GET). Returns its Request, which CLIENT.poll completes. '''
+	return CLIENT.getAsync(command, address, api_key, options, verbose, callback)
+
+def REST_API_POST_ASYNC(command, postData, address = None, api_key = None, options = None, verbose = None, callback = None):
+	''' Start a HTTP POST request to the octoprint server on the shared async client (see REST_API_POST). Returns its Request, which CLIENT.poll completes. '''
+	return CLIENT.postAsync(command, postData, address, api_key, options, verbose, callback)
+
+def check_client(client, address):
+	''' Check GET, POST, options and errors against a stand-in server. Returns a list of failure strings. '''
+
+	failures = []
+	def check(name, actual, expected):
+		if (actual != expected):
+			failures.append(name + ": " + repr(actual) + " != " + repr(expected))
+
+	called = []
+	job     = client.getAsync('api/job', address, 'KEY', callback = called.append)
+	printer = client.getAsync('/api/printer/', address, 'KEY', 'exclude=sd')
+	sd      = client.postAsync('api/printer/sd', '{ "command": "init" }', address, 'KEY')
+	check("pending", client.pending(), 3)
+
+	client.wait([job, printer, sd], 5)
+	check("job", job.response(), (200, StandInServer.JOB))
+	check("printer", printer.response(), (200, StandInServer.PRINTER))
+	check("printer address", printer.address, address + 'api/printer/?exclude=sd')
+	check("post", sd.response(), (204, ''))
+	check("callback", called, [job])
+	check("pending", client.pending(), 0)
+
+	# A refused connection completes with an error, which response() raises
+	closed = socket.socket()
+	closed.bind((SERVER_ADDRESS, 0))
+	refused = client.getAsync('api/job', 'http://%s:%d/' % closed.getsockname(), 'KEY')
+	closed.close()
+	client.wait([refused], 5)
+	check("refused done", refused.done, True)
+	try:
+		refused.response()
+		failures.append("refused: no error raised")
+	except pycurl.error:
+		pass
+
+	return failures
+
+def measure(client, address, count, concurrency):
+	''' Send count api/job GETs with at most concurrency in flight. Returns requests/sec and the new connections opened. '''
+
+	client.maxActive = concurrency
+	connects         = client.connects
+
+	start    = default_timer()
+	requests = [client.getAsync('api/job', address, 'KEY') for i in range(count)]
+	client.wait(requests)
+	elapsed  = default_timer() - start
+
+	for request in requests:
+		request.response()
+	return count / elapsed, client.connects - connects
+
+def measure_blocking(address, count):
+	''' Send count api/job GETs one after another with the blocking octoprint_restapi. Returns requests/sec. '''
+
+	start = default_timer()
+	for i in range(count):
+		octoprint_restapi.REST_API_GET('api/job', address, 'KEY')
+	return count / (default_timer() - start)
+
+#########################################################################
+#  MAIN
+#########################################################################
+def main():
+	''' Check the async client against a local stand-in server and measure requests/sec at each concurrency '''
+
+	# Declare input arguments
+	parser = ArgumentParser()
+	parser.add_argument("-n", "--requests"   , dest = "count"      , type = int  , default = 400              , help = "Requests to send at each concurrency.")
+	parser.add_argument("-j", "--concurrency", dest = "concurrency", type = int  , nargs = "+", default = [1, 4, 16, 64], help = "Most requests in flight at once.")
+	parser.add_argument("-d", "--delay"      , dest = "delay"      , type = float, default = 0.02             , help = "Seconds the stand-in server takes to answer each request.")
+
+	# Parse the arguments
+	args = parser.parse_args()
+
+	server = StandInServer(args.delay)
+	thread = threading.Thread(target = server.serve)
+	thread.daemon = True
+	thread.start()
+
+	client   = AsyncRestClient(maxActive = max(args.concurrency), maxHostConnections = max(args.concurrency))
+	failures = check_client(client, server.url())
+	for failure in failures:
+		print(failure)
+
+	print("%-12s %12s %12s" % ("concurrency", "requests/sec", "connections"))
+	print("%-12s %12.1f %12s" % ("blocking", measure_blocking(server.url(), args.count), "-"))
+	for concurrency in args.concurrency:
+		requestsPerSec, connections = measure(client, server.url(), args.count, concurrency)
+		print("%-12d %12.1f %12d" % (concurrency, requestsPerSec, connections))
+
+	server.stop()
+	client.close()
+
+	if (len(failures) != 0):
+		sys.exit(1)
+	print("Async client ok")
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,197 @@
+import BaseHTTPServer
+import SocketServer
+import json
+import octoprint_restapi
+import resource
+import subprocess
+import sys
+import threading
+from argparse import ArgumentParser
+from timeit import default_timer
+
+#########################################################################
+#  Usage Examples
+#########################################################################
+
+# 1. Compare the peak memory of buffered and streamed responses of the default sizes (runs anywhere, no printer needed)
+  #python octoprint_restapiBenchmark.py
+
+# 2. Chosen response sizes in MB, sent without a Content-Length so the streaming buffer has to grow
+  #python octoprint_restapiBenchmark.py -s 1 16 64 --chunked
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Address the synthetic OctoPrint listens on
+SERVER_ADDRESS = '127.0.0.1'
+
+# Size of the body sent to check the max body size, and the max body size it is checked against
+OVERSIZE_BODY     = 64 * 1048576
+OVERSIZE_MAX_BODY = octoprint_restapi.MAX_BODY_SIZE
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class SyntheticServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	''' Serves an api/files style JSON listing of about ?size= bytes, and an HTML page at /page '''
+
+	daemon_threads = True
+
+	def __init__(self, chunked = False):
+		BaseHTTPServer.HTTPServer.__init__(self, (SERVER_ADDRESS, 0), SyntheticHandler)
+		self.chunked = chunked
+		self.bodies  = {}
+
+	def body(self, size):
+		''' Return (and keep) a JSON file listing of about size bytes '''
+
+		if (size not in self.bodies):
+			entry = json.dumps({"name": "part_%08d.gcode", "origin": "local", "size": 1234567, "date": 1600000000,
+			                    "gcodeAnalysis": {"estimatedPrintTime": 3600.5, "filament": {"tool0": {"length": 1234.5, "volume": 9.87}}}})
+			count = max(1, size // (len(entry) + 2))
+			self.bodies[size] = '{"files": [' + ', '.join(entry % i for i in range(count)) + '], "free": 1000000000}'
+
+		return self.bodies[size]
+
+	def handle_error(self, request, client_address):
+		''' The streaming buffer hangs up on the bodies it refuses, and the handler's final flush then hits the closed socket, which is expected here '''
+		pass
+
+	def url(self):
+		return 'http://%s:%d/' % self.server_address
+
+class SyntheticHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	''' Request handler of the SyntheticServer '''
+
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		if (self.path.startswith('/page')):
+			self.reply('text/html', '<html>' + ' ' * OVERSIZE_BODY + '</html>')
+		else:
+			self.reply('application/json', self.server.body(int(self.path.split('size=')[1])))
+
+	def reply(self, contentType, body):
+		self.send_response(200)
+		self.send_header('Content-Type', contentType)
+		if (self.server.chunked): self.send_header('Transfer-Encoding', 'chunked')
+		else                    : self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+
+		# Stop sending when the client gives up on the body
+		try:
+			for i in range(0, len(body), 65536):
+				chunk = body[i:i + 65536]
+				if (self.server.chunked): self.wfile.write('%x\r\n%s\r\n' % (len(chunk), chunk))
+				else                    : self.wfile.write(chunk)
+			if (self.server.chunked):
+				self.wfile.write('0\r\n\r\n')
+		except IOError:
+			self.close_connection = 1
+
+	def log_message(self, format, *args):
+		pass
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def peakMemory():
+	''' Return the peak resident memory of this process in MB (ru_maxrss is in kB on Linux) '''
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def fetch(server, path, mode, maxBody):
+	''' Get and decode one response in this process. Returns the peak memory added in MB by the body and by the body and its decoding, the seconds taken, the body size and the error (or None). '''
+
+	octoprint_restapi.CLIENT.streaming = (mode == 'stream')
+	octoprint_restapi.CLIENT.maxBody   = maxBody
+
+	# Warm up the handle so only the response counts towards the peak
+	octoprint_restapi.HTTP_GET(server + 'api/version?size=2', None, False)
+
+	before  = peakMemory()
+	decoded = None
+	size    = 0
+	error   = None
+	start   = default_timer()
+	try:
+		responseCode, result = octoprint_restapi.HTTP_GET(server + path, None, False)
+		size    = len(result)
+		body    = peakMemory() - before
+		decoded = json.loads(result)
+	except octoprint_restapi.pycurl.error as exc:
+		error = exc.args[1]
+	except ValueError:
+		error = "Not JSON"
+	elapsed = default_timer() - start
+
+	if (decoded is None):
+		body = peakMemory() - before
+	return body, peakMemory() - before, elapsed, size, error
+
+def measure(server, path, mode, maxBody):
+	''' Fetch in a new process, so each measurement starts from the same peak memory. Returns the same as fetch. '''
+
+	output = subprocess.check_output([sys.executable, __file__, '--child', server, path, mode, str(maxBody)])
+	return json.loads(output)
+
+#########################################################################
+#  MAIN
+#########################################################################
+def main():
+	''' Compare the peak memory of buffered (StringIO) and streamed (ResponseBuffer) responses, and check the early aborts '''
+
+	# A measurement run in a child process
+	if ((len(sys.argv) == 6) and (sys.argv[1] == '--child')):
+		print(json.dumps(fetch(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))))
+		return
+
+	# Declare input arguments
+	parser = ArgumentParser()
+	parser.add_argument("-s", "--sizes"  , dest = "sizes"  , type = int, nargs = "+", default = [1, 8, 32]                 , help = "Response sizes to benchmark in MB.")
+	parser.add_argument("-m", "--modes"  , dest = "modes"  , nargs = "+"            , default = ['buffer', 'stream']       , help = "Modes to benchmark: buffer and/or stream.")
+	parser.add_argument("-c", "--chunked", action = "store_true"                                                            , help = "Send the responses without a Content-Length.")
+
+	# Parse the arguments
+	args = parser.parse_args()
+
+	server = SyntheticServer(args.chunked)
+	thread = threading.Thread(target = server.serve_forever)
+	thread.daemon = True
+	thread.start()
+
+	failures = 0
+
+	# Peak memory of a response that is accepted
+	print("%-8s %8s %12s %14s %10s  %s" % ("mode", "MB", "body peak MB", "decode peak MB", "seconds", "result"))
+	for size in args.sizes:
+		path = 'api/files?size=' + str(size * 1048576)
+		for mode in args.modes:
+			body, added, elapsed, length, error = measure(server.url(), path, mode, (size + 1) * 1048576)
+			print("%-8s %8.1f %12.1f %14.1f %10.3f  %s" % (mode, length / 1048576.0, body, added, elapsed, error or "ok"))
+			if (error is not None):
+				failures += 1
+
+	# Responses over the max body size or of the wrong type are refused by the streaming buffer before they are downloaded
+	print("")
+	print("%-8s %-12s %12s %14s %10s  %s" % ("mode", "response", "body peak MB", "decode peak MB", "seconds", "result"))
+	checks = [("%d MB JSON" % (OVERSIZE_BODY // 1048576), 'api/files?size=' + str(OVERSIZE_BODY)),
+	          ("%d MB HTML" % (OVERSIZE_BODY // 1048576), 'page')]
+	for name, path in checks:
+		for mode in args.modes:
+			body, added, elapsed, length, error = measure(server.url(), path, mode, OVERSIZE_MAX_BODY)
+			print("%-8s %-12s %12.1f %14.1f %10.3f  %s" % (mode, name, body, added, elapsed, error or "accepted"))
+			if ((mode == 'stream') and (error is None)):
+				failures += 1
+
+	server.shutdown()
+
+	# Fail if the streaming buffer refused a response it should take or took one it should refuse
+	if (failures != 0):
+		print(str(failures) + " response(s) were not handled as expected")
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
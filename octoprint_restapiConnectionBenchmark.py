@@ -0,0 +1,189 @@
+import BaseHTTPServer
+import SocketServer
+import octoprint_restapi
+import pycurl
+import sys
+import threading
+import time
+from StringIO import StringIO
+from argparse import ArgumentParser
+from timeit import default_timer
+
+#########################################################################
+#  Usage Examples
+#########################################################################
+
+# 1. Compare the connections opened and the latency of a new curl handle per request with the shared keep-alive client (runs anywhere, no printer needed)
+  #python octoprint_restapiConnectionBenchmark.py
+
+# 2. More requests
+  #python octoprint_restapiConnectionBenchmark.py -n 5000
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Address the stand-in OctoPrint listens on
+SERVER_ADDRESS = '127.0.0.1'
+
+# Responses of the stand-in OctoPrint
+JOB_BODY     = '{"job": {"file": {"name": "part.gcode"}}, "progress": {"completion": 42.0}, "state": "Printing"}'
+PRINTER_BODY = '{"state": {"text": "Printing", "flags": {"printing": true}}, "temperature": {"bed": {"actual": 60.0, "target": 60.0}, "tool0": {"actual": 210.0, "target": 210.0}}}'
+
+# Seconds the stand-in takes to answer api/slow, and the status timeout checked against it
+SLOW_SECONDS  = 1.0
+CHECK_TIMEOUT = 0.3
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	''' Keep-alive stand-in OctoPrint serving api/job and api/printer, answering a POST with 204 and api/slow after SLOW_SECONDS. Counts the connections accepted. '''
+
+	daemon_threads = True
+
+	def __init__(self):
+		BaseHTTPServer.HTTPServer.__init__(self, (SERVER_ADDRESS, 0), StandInHandler)
+		self.connections = 0
+		self.lock        = threading.Lock()
+
+	def process_request(self, request, client_address):
+		with self.lock:
+			self.connections += 1
+		SocketServer.ThreadingMixIn.process_request(self, request, client_address)
+
+	def handle_error(self, request, client_address):
+		''' Clients that time out hang up on api/slow, which is expected here '''
+		pass
+
+	def url(self):
+		return 'http://%s:%d/' % self.server_address
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	''' Request handler of the StandInServer '''
+
+	protocol_version = 'HTTP/1.1'
+
+	# Send each response in one write, as the header lines written one at a time wait on delayed ACKs of a kept-alive connection
+	wbufsize = -1
+
+	def do_GET(self):
+		if (self.path.startswith('/api/slow')):
+			time.sleep(SLOW_SECONDS)
+
+		if (self.path.startswith('/api/job')): body = JOB_BODY
+		else                                 : body = PRINTER_BODY
+
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_POST(self):
+		self.rfile.read(int(self.headers.getheader('Content-Length', 0)))
+		if (self.path.startswith('/api/slow')):
+			time.sleep(SLOW_SECONDS)
+
+		self.send_response(204)
+		self.send_header('Content-Length', '0')
+		self.end_headers()
+
+	def log_message(self, format, *args):
+		pass
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def newHandleGet(address, header):
+	''' Send a GET on a new curl handle that is closed afterwards, as HTTP_GET did before the shared client '''
+
+	buffer = StringIO()
+	c      = pycurl.Curl()
+	c.setopt(c.URL, address)
+	c.setopt(c.HTTPHEADER, header)
+	c.setopt(c.WRITEDATA, buffer)
+	c.perform()
+	responseCode = c.getinfo(pycurl.RESPONSE_CODE)
+	c.close()
+
+	return responseCode, buffer.getvalue()
+
+def measure(server, get, count):
+	''' Send count pairs of api/job and api/printer GETs with get(address, header). Returns the connections the server accepted and the latencies in seconds. '''
+
+	requests  = [octoprint_restapi.CLIENT.prepare(command, server.url(), 'KEY') for command in ('api/job', 'api/printer')]
+	latencies = []
+	before    = server.connections
+
+	for i in range(count):
+		for address, header in requests:
+			start = default_timer()
+			get(address, header)
+			latencies.append(default_timer() - start)
+
+	return server.connections - before, latencies
+
+def checkTimeouts(server):
+	''' Check that the status timeout fails a slow get_many, and leaves a slow single GET and POST alone. Returns the number of failed checks. '''
+
+	client   = octoprint_restapi.RestClient(timeout = CHECK_TIMEOUT)
+	failures = 0
+
+	address, header = client.prepare('api/slow', server.url(), 'KEY')
+	responseCode, result = client.get_many([(address, header)], raiseErrors = False)[0]
+	print("%-28s %s" % ("get_many of a slow status", "timed out" if (responseCode is None) else "answered"))
+	if (responseCode is not None):
+		failures += 1
+
+	for name, send in (("single GET of a slow command", lambda: client.get(address, header)),
+	                   ("POST to a slow command"      , lambda: client.post(address, {'command': 'init'}, ['Content-Type: application/json'] + header))):
+		try:
+			responseCode, result = send()
+			print("%-28s %s" % (name, "answered " + str(responseCode)))
+		except pycurl.error as exc:
+			print("%-28s %s" % (name, "failed: " + exc.args[1]))
+			failures += 1
+
+	client.close()
+	return failures
+
+#########################################################################
+#  MAIN
+#########################################################################
+def main():
+	''' Report the connections opened and the request latency with and without the shared keep-alive client, and check where the status timeout applies '''
+
+	# Declare input arguments
+	parser = ArgumentParser()
+	parser.add_argument("-n", "--count", dest = "count", type = int, default = 1000, help = "Pairs of api/job and api/printer GETs to send in each mode.")
+
+	# Parse the arguments
+	args = parser.parse_args()
+
+	server = StandInServer()
+	thread = threading.Thread(target = server.serve_forever)
+	thread.daemon = True
+	thread.start()
+
+	print("%-12s %8s %11s %9s %9s %9s" % ("mode", "requests", "connections", "mean ms", "p50 ms", "p95 ms"))
+	for mode, get in (("new handle", newHandleGet), ("keep-alive", octoprint_restapi.CLIENT.get)):
+		connections, latencies = measure(server, get, args.count)
+		latencies.sort()
+		print("%-12s %8d %11d %9.3f %9.3f %9.3f" % (mode, len(latencies), connections, 1000 * sum(latencies) / len(latencies),
+		                                            1000 * latencies[len(latencies) // 2], 1000 * latencies[int(len(latencies) * 0.95)]))
+
+	print("")
+	failures = checkTimeouts(server)
+
+	octoprint_restapi.CLIENT.close()
+	server.shutdown()
+
+	if (failures != 0):
+		print(str(failures) + " timeout check(s) failed")
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -23,9 +23,13 @@ def main():
         args         = parser.parse_args()
 	args.options = None
 
-	# Refresh the SD Card contents
-	apiPrinterSDResponseCode1, apiPrinterResult1 = octoprint_restapi.REST_API_POST('api/printer/sd', '{ "command": "release" }', args.address, args.api_key, args.options, args.verbose)
-	apiPrinterSDResponseCode2, apiPrinterResult2 = octoprint_restapi.REST_API_POST('api/printer/sd', '{ "command": "init" }'   , args.address, args.api_key, args.options, args.verbose)
+	# Refresh the SD Card contents, release then init over one connection (init is always sent, even if release fails)
+	batch   = octoprint_restapi.READ_BATCH(['post api/printer/sd { "command": "release" }',
+	                                        'post api/printer/sd { "command": "init" }'   ])
+	results = list(octoprint_restapi.REST_API_BATCH(batch, args.address, args.api_key, args.verbose))
+
+	apiPrinterSDResponseCode1 = results[0]['code']
+	apiPrinterSDResponseCode2 = results[1]['code']
 
 	print("Release Response Code: " + `apiPrinterSDResponseCode1`)
 	print("Init    Response Code: " + `apiPrinterSDResponseCode2`)
@@ -1,5 +1,4 @@
-import RPi.GPIO as GPIO
-import time
+import os
 
 #########################################################################
 #  Usage Example
@@ -21,54 +20,110 @@ import time
 # time.sleep(1)
 # print("Exiting test")
 
+# Choose the backend by name (rpi, mmap or sim), in code or through the environment
+# gpio = GPIO('mmap')
+# SAFEGPIO_BACKEND=sim python P9813benchmark.py
+
+#########################################################################
+#  Globals
+#########################################################################
+
+# Environment variable naming the backend to use when none is given
+BACKEND_ENVIRONMENT = 'SAFEGPIO_BACKEND'
+
+# Backend used when none is given and the environment does not name one (the simulator is only used when named, so a Pi without RPi.GPIO fails loudly)
+BACKEND = 'rpi'
+
+# Backend name -> function that imports and returns the backend, filled in by register_backend
+BACKENDS = {}
+
+# Backends already loaded, by name
+LOADED = {}
+
 #########################################################################
 #  CLASSES
 #########################################################################
 
 class safeGPIO():
-	''' Add automatic cleanup to RPi.GPIO module by calling in __del__ (we keep reference to GPIO to ensure its still there)'''
-
-	# Class variables
-	HIGH     = GPIO.HIGH
-	LOW      = GPIO.LOW
-	OUT      = GPIO.OUT
-	IN       = GPIO.IN
-	HARD_PWM = GPIO.HARD_PWM
-	SERIAL   = GPIO.SERIAL
-	I2C      = GPIO.I2C
-	SPI      = GPIO.SPI
-	UNKNOWN  = GPIO.UNKNOWN
-	BOARD    = GPIO.BOARD
-	BCM      = GPIO.BCM
-	PUD_OFF  = GPIO.PUD_OFF
-	PUD_UP   = GPIO.PUD_UP
-	PUD_DOWN = GPIO.PUD_DOWN
-	RISING   = GPIO.RISING
-	FALLING  = GPIO.FALLING
-	BOTH     = GPIO.BOTH
-	VERSION  = GPIO.VERSION
-
-	def __init__(self):
+	''' Add automatic cleanup to RPi.GPIO module by calling in __del__ (we keep reference to GPIO to ensure its still there)
+	    The backend is a registered backend name (see register_backend) or any object with the RPi.GPIO functions (such as simGPIO.SimGPIO).
+	    Pins are claimed by setup (or claim), and cleanup only releases the pins this object claimed. '''
+
+	# Class variables (same values as RPi.GPIO, which every backend uses)
+	HIGH     = 1
+	LOW      = 0
+	OUT      = 0
+	IN       = 1
+	HARD_PWM = 43
+	SERIAL   = 40
+	I2C      = 42
+	SPI      = 41
+	UNKNOWN  = -1
+	BOARD    = 10
+	BCM      = 11
+	PUD_OFF  = 20
+	PUD_UP   = 22
+	PUD_DOWN = 21
+	RISING   = 31
+	FALLING  = 32
+	BOTH     = 33
+
+	# Version of the backend of the latest safeGPIO created (RPi.GPIO.VERSION for the rpi backend), None until one is created so the backend is not imported early
+	VERSION  = None
+
+	def __init__(self, backend = None):
 		# Create a reference to GPIO so that we can use it during delete
-		self.gpio = GPIO
+		if ((backend is None) or (isinstance(backend, str))): self.gpio = load_backend(backend)
+		else                                                : self.gpio = backend
+		safeGPIO.VERSION = getattr(self.gpio, 'VERSION', None)
+		self.claims      = []
 		self.gpio.setmode(self.BOARD)
-		self.gpio.setup(13, self.OUT)
 
 	def __del__(self):
-		self.cleanup()
+		# Nothing was claimed if the backend failed to load
+		if (hasattr(self, 'claims')):
+			self.cleanup()
+
+	def claim(self, channels, direction, pull_up_down = PUD_OFF, initial = None):
+		''' Claim a list of pins in one backend call '''
+		return self.setup(list(channels), direction, pull_up_down, initial)
 
 	# python function cleanup(channel=None)
-	def cleanup(self, *args):
-		return self.gpio.cleanup(*args)
+	def cleanup(self, channel = None):
+		# Without a channel, release every pin this object claimed (and no others)
+		if (channel is None):
+			channel = self.claims
+		elif (not isinstance(channel, (list, tuple))):
+			channel = [channel]
+
+		channel     = [ch for ch in channel if ch in self.claims]
+		self.claims = [ch for ch in self.claims if ch not in channel]
+		if (len(channel) != 0):
+			return self.gpio.cleanup(channel)
 
 	# python function setup(channel(s), direction, pull_up_down=PUD_OFF, initial=None)
-	def setup(self, *args):
-		return self.gpio.setup(*args)
+	def setup(self, channel, direction, pull_up_down = PUD_OFF, initial = None):
+		if (isinstance(channel, (list, tuple))): channels = list(channel)
+		else                                   : channels = [channel]
+
+		# A pin can only be claimed once
+		for ch in channels:
+			if (ch in self.claims):
+				raise RuntimeError("GPIO channel " + str(ch) + " is already claimed")
+
+		if (initial is None): result = self.gpio.setup(channel, direction, pull_up_down)
+		else                : result = self.gpio.setup(channel, direction, pull_up_down, initial)
+		self.claims.extend(channels)
+		return result
 
 	# python function output(channel(s), value(s))
 	def output(self, *args):
 		return self.gpio.output(*args)
 
+	# python function output(channel(s), value(s)) with a list of channels and a matching list of values, set in one backend call
+	def output_batch(self, channels, values):
+		return self.gpio.output(channels, values)
+
 	# python function value = input(channel)
 	def input(self, *args):
 		return self.gpio.input(*args)
@@ -108,3 +163,45 @@ class safeGPIO():
 	# python function setwarnings(state)
 	def setwarnings(self, *args):
 		return self.gpio.setwarnings(*args)
+
+#########################################################################
+#  Functions
+#########################################################################
+
+def register_backend(name, loader):
+	''' Register a backend by name. loader is only called (to import and create the backend) when the backend is first used. '''
+	BACKENDS[name] = loader
+
+def load_backend(name = None):
+	''' Return the named backend, importing it the first time. Without a name use the environment (SAFEGPIO_BACKEND), then BACKEND. '''
+
+	if (name is None):
+		name = os.environ.get(BACKEND_ENVIRONMENT) or BACKEND
+
+	if (name not in LOADED):
+		if (name not in BACKENDS):
+			raise ValueError("Unknown GPIO backend " + repr(name) + ", expected one of " + ", ".join(sorted(BACKENDS)))
+
+		# Say how to run without the hardware, rather than silently driving no pins
+		try:
+			LOADED[name] = BACKENDS[name]()
+		except ImportError as exc:
+			raise ImportError(str(exc) + " (GPIO backend " + repr(name) + ", set " + BACKEND_ENVIRONMENT + "=sim to simulate the pins)")
+
+	return LOADED[name]
+
+def _load_rpi():
+	import RPi.GPIO as GPIO
+	return GPIO
+
+def _load_mmap():
+	from mmapGPIO import MmapGPIO
+	return MmapGPIO()
+
+def _load_sim():
+	from simGPIO import SimGPIO
+	return SimGPIO()
+
+register_backend('rpi' , _load_rpi)
+register_backend('mmap', _load_mmap)
+register_backend('sim' , _load_sim)
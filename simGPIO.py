@@ -0,0 +1,149 @@
+from timeit import default_timer
+import time
+
+#########################################################################
+#  Usage Example
+#########################################################################
+
+# from safeGPIO import safeGPIO as GPIO
+# from simGPIO import SimGPIO
+
+# sim  = SimGPIO()
+# gpio = GPIO(sim)
+# gpio.setmode(GPIO.BOARD)
+# gpio.setup(11, GPIO.OUT)
+# gpio.output(11, 0)
+# gpio.output(11, 1)
+# print(sim.edges)                    # [(timestamp, 11, 0), (timestamp, 11, 1)]
+
+#########################################################################
+#  CLASSES
+#########################################################################
+
+class SimGPIO():
+	''' Simulated RPi.GPIO backend that keeps pin levels in memory, counts backend calls and records a timestamped list of pin edges '''
+
+	# Class variables (same values as RPi.GPIO)
+	HIGH     = 1
+	LOW      = 0
+	OUT      = 0
+	IN       = 1
+	HARD_PWM = 43
+	SERIAL   = 40
+	I2C      = 42
+	SPI      = 41
+	UNKNOWN  = -1
+	BOARD    = 10
+	BCM      = 11
+	PUD_OFF  = 20
+	PUD_UP   = 22
+	PUD_DOWN = 21
+	RISING   = 31
+	FALLING  = 32
+	BOTH     = 33
+	VERSION  = 'sim'
+
+	def __init__(self, record = True):
+		''' Set record to False to only count calls (for measuring driver overhead without the cost of recording) '''
+		self.record = record
+		self.mode   = None
+		self.clear()
+
+	def clear(self):
+		''' Forget pin state, edges and call counts '''
+		self.levels     = {}
+		self.directions = {}
+		self.edges      = []
+		self.calls      = 0
+
+	def take_edges(self):
+		''' Return the edges recorded so far and start a new recording '''
+		edges      = self.edges
+		self.edges = []
+		return edges
+
+	# python function cleanup(channel=None)
+	def cleanup(self, channel = None):
+		if (channel is None):
+			self.directions.clear()
+		else:
+			for ch in self._channels(channel):
+				self.directions.pop(ch, None)
+
+	# python function setup(channel(s), direction, pull_up_down=PUD_OFF, initial=None)
+	def setup(self, channel, direction, pull_up_down = PUD_OFF, initial = None):
+		for ch in self._channels(channel):
+			self.directions[ch] = direction
+
+			# Inputs follow the pull resistor, outputs the initial value (the P9813 lines have pullups)
+			if (initial is not None):
+				self.levels[ch] = initial
+			elif (ch not in self.levels):
+				self.levels[ch] = int(pull_up_down == self.PUD_UP)
+
+	# python function output(channel(s), value(s))
+	def output(self, channel, value):
+		self.calls += 1
+
+		channels = self._channels(channel)
+		if (isinstance(value, (list, tuple))): values = value
+		else                                 : values = [value] * len(channels)
+
+		if (len(channels) != len(values)):
+			raise RuntimeError("Number of channels != number of values")
+
+		# Record a timestamp only when a level actually changes
+		now = default_timer()
+		for ch, val in zip(channels, values):
+			val = int(bool(val))
+			if (self.levels.get(ch) != val):
+				self.levels[ch] = val
+				if (self.record):
+					self.edges.append((now, ch, val))
+
+	# python function value = input(channel)
+	def input(self, channel):
+		self.calls += 1
+		return self.levels.get(channel, self.LOW)
+
+	# python function setmode(mode)
+	def setmode(self, mode):
+		self.mode = mode
+
+	# python function getmode()
+	def getmode(self):
+		return self.mode
+
+	# python function add_event_callback(gpio, callback)
+	def add_event_callback(self, channel, callback):
+		pass
+
+	# python function add_event_detect(gpio, edge, callback=None, bouncetime=None)
+	def add_event_detect(self, channel, edge, callback = None, bouncetime = None):
+		pass
+
+	# python function remove_event_detect(gpio)
+	def remove_event_detect(self, channel):
+		pass
+
+	# python function value = event_detected(channel)
+	def event_detected(self, channel):
+		return False
+
+	# python function channel = wait_for_edge(channel, edge, bouncetime=None, timeout=None)
+	def wait_for_edge(self, channel, edge, bouncetime = None, timeout = None):
+		if (timeout is not None):
+			time.sleep(timeout / 1000.0)
+		return None
+
+	# python function value = gpio_function(channel)
+	def gpio_function(self, channel):
+		return self.directions.get(channel, self.IN)
+
+	# python function setwarnings(state)
+	def setwarnings(self, state):
+		pass
+
+	def _channels(self, channel):
+		if (isinstance(channel, (list, tuple))): return list(channel)
+		else                                   : return [channel]